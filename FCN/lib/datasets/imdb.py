@@ -104,11 +104,9 @@ class imdb(object):
     def append_flipped_images(self):
         num_images = self.num_images
         for i in xrange(num_images):
-            entry = {'image' : self.roidb[i]['image'],
-                     'depth' : self.roidb[i]['depth'],
-                     'label' : self.roidb[i]['label'],
-                     'meta_data' : self.roidb[i]['meta_data'],
-                     'flipped' : True}
+            # keep every key of the original entry, e.g. class_weights and video_id
+            entry = dict(self.roidb[i])
+            entry['flipped'] = True
             self.roidb.append(entry)
         self._image_index = self._image_index * 2
         print 'finish appending flipped images'
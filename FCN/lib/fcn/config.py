@@ -40,15 +40,31 @@ __C.TRAIN.MOMENTUM = 0.9
 __C.TRAIN.GAMMA = 0.1
 __C.TRAIN.STEPSIZE = 30000
 
+# learning rate policy: step, multistep, poly or cosine (see fcn/lr_schedule.py)
+__C.TRAIN.LR_POLICY = 'step'
+# iterations at which the multistep policy multiplies the learning rate by GAMMA
+__C.TRAIN.STEPVALUES = (30000,)
+# exponent of the poly policy
+__C.TRAIN.POWER = 0.9
+
 # Scales to compute real features
 __C.TRAIN.SCALES_BASE = (0.25, 0.5, 1.0, 2.0, 3.0)
 
 # Images to use per minibatch
 __C.TRAIN.IMS_PER_BATCH = 2
 
+# How the data layers sample minibatches from the roidb
+#   random: random permutations of the roidb
+#   bucket: all images of a minibatch have the same padded shape
+__C.TRAIN.SAMPLER = 'random'
+
 # Use horizontally-flipped images during training?
 __C.TRAIN.USE_FLIPPED = True
 
+# Flip each sample randomly when building a minibatch instead of appending
+# flipped copies to the roidb. USE_FLIPPED is ignored when this is set.
+__C.TRAIN.RANDOM_FLIP = False
+
 # Iterations between snapshots
 __C.TRAIN.SNAPSHOT_ITERS = 10000
 
@@ -57,8 +73,28 @@ __C.TRAIN.SNAPSHOT_ITERS = 10000
 __C.TRAIN.SNAPSHOT_PREFIX = 'caffenet_fast_rcnn'
 __C.TRAIN.SNAPSHOT_INFIX = ''
 
+# Write snapshots on a background thread from a copy of the parameters
+__C.TRAIN.SNAPSHOT_ASYNC = False
+
+# Number of most recent snapshots to keep, 0 keeps all of them
+__C.TRAIN.SNAPSHOT_KEEP = 0
+
 __C.TRAIN.DISPLAY = 20
 
+# Iterations between evaluations of all summaries, including the layer
+# histograms. The loss and the learning rate are written every iteration.
+__C.TRAIN.SUMMARY_ITERS = 100
+
+# Number of recent iterations whose loss and step time are kept in memory
+# and written to metrics.csv in the output directory
+__C.TRAIN.METRICS_RING = 10000
+
+# Number of threads building minibatches into an input queue, 0 feeds the
+# minibatches synchronously with feed_dict
+__C.TRAIN.QUEUE_THREADS = 0
+# Maximum number of minibatches waiting in the input queue
+__C.TRAIN.QUEUE_CAPACITY = 8
+
 
 #
 # Testing options
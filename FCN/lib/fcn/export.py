@@ -0,0 +1,166 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Export a trained FCN as a frozen inference graph.
+
+Testing builds the same graph as training: FCN8VGG loads the whole
+vgg16.npy, creates variables, weight decay losses and summaries for every
+layer, and the checkpoint is restored on top. The exported graph only
+contains the ops needed to compute pred_up from data:
+    - the variables are replaced by constants holding the trained values
+    - everything that pred_up does not depend on (summaries, weight decay
+      losses, the optimizer) is pruned
+    - ops whose inputs are all constants are evaluated once and replaced
+      by their result
+    - optionally the weights are stored as float16, which halves the size
+      of the file. They are cast back to float32 when they are read, so
+      the data placeholder, pred_up and the computation keep their types
+The result is one GraphDef file that load_inference_net() imports without
+constructing FCN8VGG or reading vgg16.npy.
+"""
+
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.framework import graph_util
+from tensorflow.python.framework import tensor_util
+from tensorflow.core.framework import types_pb2
+
+# ops with a single output that are evaluated at export time when all
+# their inputs are constants
+_FOLDABLE_OPS = set(['Identity', 'Cast', 'Reshape', 'Transpose', 'Mul', 'Add',
+                     'Sub', 'Pack', 'ExpandDims', 'Squeeze'])
+
+def export_inference_graph(network, checkpoint, num_classes, output_file, float16=False):
+    """Freeze the network restored from checkpoint into output_file."""
+    graph = tf.Graph()
+    with graph.as_default():
+        data = tf.placeholder(tf.float32, shape=[None, None, None, 3], name='data')
+        network.build(data, train=False, num_classes=num_classes)
+        tf.identity(network.pred_up, name='pred_up')
+        saver = tf.train.Saver()
+
+        with tf.Session() as sess:
+            saver.restore(sess, checkpoint)
+            graph_def = graph_util.convert_variables_to_constants(
+                sess, graph.as_graph_def(), ['pred_up'])
+
+    num_nodes = len(graph_def.node)
+    graph_def = _fold_constants(graph_def)
+    if float16:
+        graph_def = _convert_to_float16(graph_def)
+
+    data = graph_def.SerializeToString()
+    with open(output_file, 'wb') as f:
+        f.write(data)
+    print 'Exported {:d} ops ({:d} before folding) to {:s}, {:.1f}MB'.format(
+        len(graph_def.node), num_nodes, output_file, len(data) / float(1 << 20))
+
+
+def _fold_constants(graph_def):
+    """Replace foldable ops whose inputs are all constants by constants."""
+    constants = set(node.name for node in graph_def.node if node.op == 'Const')
+    folded = []
+    for node in graph_def.node:
+        if node.op in _FOLDABLE_OPS and node.input and \
+           all(name.lstrip('^').split(':')[0] in constants for name in node.input):
+            constants.add(node.name)
+            folded.append(node.name)
+    if not folded:
+        return graph_def
+
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.import_graph_def(graph_def, name='')
+        with tf.Session() as sess:
+            values = sess.run([name + ':0' for name in folded])
+
+    values = dict(zip(folded, values))
+    output = tf.GraphDef()
+    for node in graph_def.node:
+        if node.name in values:
+            const = output.node.add()
+            const.op = 'Const'
+            const.name = node.name
+            value = values[node.name]
+            const.attr['dtype'].type = tf.as_dtype(value.dtype).as_datatype_enum
+            const.attr['value'].tensor.CopyFrom(tensor_util.make_tensor_proto(value))
+        else:
+            output.node.add().CopyFrom(node)
+
+    # drop the constants that only fed the folded ops
+    return graph_util.extract_sub_graph(output, ['pred_up'])
+
+
+def _convert_to_float16(graph_def):
+    """Store the float32 weights of the graph as float16.
+
+    Every non-scalar float32 Const becomes a float16 Const followed by a
+    Cast to float32 that takes over its name, so the ops reading it are
+    unchanged. The other nodes, the data placeholder among them, keep
+    their float32 types.
+    """
+    output = tf.GraphDef()
+    for node in graph_def.node:
+        if node.op != 'Const' or node.attr['dtype'].type != types_pb2.DT_FLOAT:
+            output.node.add().CopyFrom(node)
+            continue
+        value = tensor_util.MakeNdarray(node.attr['value'].tensor)
+        if value.ndim == 0:
+            output.node.add().CopyFrom(node)
+            continue
+
+        const = output.node.add()
+        const.op = 'Const'
+        const.name = node.name + '_float16'
+        const.device = node.device
+        const.attr['dtype'].type = types_pb2.DT_HALF
+        const.attr['value'].tensor.CopyFrom(tensor_util.make_tensor_proto(value.astype(np.float16)))
+
+        cast = output.node.add()
+        cast.op = 'Cast'
+        cast.name = node.name
+        cast.device = node.device
+        cast.input.append(const.name)
+        cast.attr['SrcT'].type = types_pb2.DT_HALF
+        cast.attr['DstT'].type = types_pb2.DT_FLOAT
+    return output
+
+
+class InferenceNet(object):
+    """A frozen FCN with the data and pred_up tensors that fcn.test uses."""
+
+    def __init__(self, filename, device='/cpu:0'):
+        graph_def = tf.GraphDef()
+        with open(filename, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+
+        self.graph = tf.Graph()
+        with self.graph.as_default(), tf.device(device):
+            tf.import_graph_def(graph_def, name='')
+        self.data = self.graph.get_tensor_by_name('data:0')
+        self.pred_up = self.graph.get_tensor_by_name('pred_up:0')
+        self.sess = tf.Session(graph=self.graph, config=tf.ConfigProto(allow_soft_placement=True))
+
+
+def load_inference_net(filename, device='/cpu:0'):
+    """Load a graph written by export_inference_graph."""
+    t = time.time()
+    net = InferenceNet(filename, device)
+    print 'Loaded {:s} in {:.3f}s'.format(filename, time.time() - t)
+    return net
+
+
+def benchmark_inference_net(net, height, width, num_frames=20):
+    """Average time in seconds to segment one frame of the given size."""
+    blob = np.random.rand(1, height, width, 3).astype(np.float32)
+    # the first run allocates the buffers
+    net.sess.run(net.pred_up, feed_dict={net.data: blob})
+    t = time.time()
+    for _ in xrange(num_frames):
+        net.sess.run(net.pred_up, feed_dict={net.data: blob})
+    return (time.time() - t) / num_frames
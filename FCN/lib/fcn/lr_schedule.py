@@ -0,0 +1,45 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Learning rate schedules computed in the graph from the global step.
+
+The policies follow the Caffe solver:
+    step: base_lr * gamma ^ floor(iter / stepsize)
+    multistep: base_lr * gamma ^ (number of stepvalues <= iter)
+    poly: base_lr * (1 - iter / max_iters) ^ power
+    cosine: base_lr * (1 + cos(pi * iter / max_iters)) / 2
+"""
+
+import math
+import tensorflow as tf
+from fcn.config import cfg
+
+def get_learning_rate(global_step, max_iters):
+    """Return the learning rate tensor selected by cfg.TRAIN.LR_POLICY."""
+    base_lr = cfg.TRAIN.LEARNING_RATE
+    gamma = cfg.TRAIN.GAMMA
+    policy = cfg.TRAIN.LR_POLICY
+    step = tf.cast(global_step, tf.float32)
+
+    with tf.name_scope('learning_rate'):
+        if policy == 'step':
+            num_steps = tf.floor(step / float(cfg.TRAIN.STEPSIZE))
+            lr = base_lr * tf.pow(gamma, num_steps)
+        elif policy == 'multistep':
+            stepvalues = tf.constant(cfg.TRAIN.STEPVALUES, dtype=tf.float32)
+            num_steps = tf.reduce_sum(tf.cast(tf.greater_equal(step, stepvalues), tf.float32))
+            lr = base_lr * tf.pow(gamma, num_steps)
+        elif policy == 'poly':
+            progress = tf.minimum(step, float(max_iters)) / float(max_iters)
+            lr = base_lr * tf.pow(1.0 - progress, cfg.TRAIN.POWER)
+        elif policy == 'cosine':
+            progress = tf.minimum(step, float(max_iters)) / float(max_iters)
+            lr = base_lr * 0.5 * (1.0 + tf.cos(math.pi * progress))
+        else:
+            raise ValueError('Unknown learning rate policy: {}'.format(policy))
+
+    return lr
@@ -0,0 +1,75 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Training metrics for a FCN.
+
+Evaluating the merged summary op runs the histogram and sparsity summaries
+that FCN8VGG attaches to every layer and variable. The training loop only
+does that every cfg.TRAIN.SUMMARY_ITERS iterations. In between, the loss
+and the learning rate are written as a tf.Summary built on the host from
+the values the step fetched anyway, which adds no op to the graph.
+
+TrainingMetrics also keeps the losses and step times of the last
+cfg.TRAIN.METRICS_RING iterations in memory, which can be exported as CSV,
+and times full summary steps and scalar-only steps separately to report
+what the summaries cost.
+"""
+
+import numpy as np
+import tensorflow as tf
+from fcn.config import cfg
+
+class TrainingMetrics(object):
+    """Ring of recent training metrics and the cost of full summaries."""
+
+    FIELDS = ('iter', 'loss', 'lr', 'step_time', 'full_summary')
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._data = np.zeros((capacity, len(self.FIELDS)), dtype=np.float64)
+        self._count = 0
+        # total time and number of steps with and without full summaries
+        self._time = np.zeros((2,), dtype=np.float64)
+        self._calls = np.zeros((2,), dtype=np.int64)
+
+    def is_full_summary(self, iter):
+        """Whether the merged summaries are evaluated at this iteration."""
+        return (iter + 1) % cfg.TRAIN.SUMMARY_ITERS == 0
+
+    def scalar_summary(self, loss, lr):
+        """Summary of the loss and the learning rate built on the host."""
+        return tf.Summary(value=[tf.Summary.Value(tag='loss', simple_value=float(loss)),
+                                 tf.Summary.Value(tag='learning_rate', simple_value=float(lr))])
+
+    def add(self, iter, loss, lr, timer, full_summary):
+        """Record one iteration timed by timer."""
+        self._time[int(full_summary)] += timer.diff
+        self._calls[int(full_summary)] += 1
+        self._data[self._count % self._capacity] = (iter, loss, lr, timer.diff, full_summary)
+        self._count += 1
+
+    def recent(self):
+        """Recorded rows, oldest first."""
+        if self._count <= self._capacity:
+            return self._data[:self._count]
+        start = self._count % self._capacity
+        return np.vstack((self._data[start:], self._data[:start]))
+
+    def summary_cost(self):
+        """Average extra time in seconds of a step with full summaries,
+        or None before both kinds of steps were seen."""
+        if self._calls.min() == 0:
+            return None
+        scalar_time, full_time = self._time / self._calls
+        return full_time - scalar_time
+
+    def export_csv(self, filename):
+        """Write the recorded rows to a CSV file."""
+        np.savetxt(filename, self.recent(), delimiter=',', header=','.join(self.FIELDS),
+                   comments='', fmt=['%d', '%.6f', '%.8f', '%.6f', '%d'])
+        print 'Wrote training metrics to: {:s}'.format(filename)
+
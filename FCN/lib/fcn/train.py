@@ -8,10 +8,15 @@
 """Train a FCN"""
 
 from fcn.config import cfg
+from fcn.lr_schedule import get_learning_rate
+from fcn.metrics import TrainingMetrics
 from gt_data_layer.layer import GtDataLayer
+from gt_data_layer.input_pipeline import InputPipeline
 from utils.timer import Timer
+from utils.snapshot_writer import SnapshotWriter
 import numpy as np
 import os
+import time
 import tensorflow as tf
 import sys
 
@@ -29,12 +34,26 @@ class SolverWrapper(object):
         self.output_dir = output_dir
         self.pretrained_model = pretrained_model
 
+        # data layer
+        self.data_layer = GtDataLayer(self.roidb, self.imdb.num_classes)
+
+        # network input, either fed every iteration or read from the input queue
+        if cfg.TRAIN.QUEUE_THREADS > 0:
+            self.input_pipeline = InputPipeline(self.data_layer, cfg.TRAIN.QUEUE_THREADS, cfg.TRAIN.QUEUE_CAPACITY)
+            self.net.data, self.label = self.input_pipeline.dequeue()
+        else:
+            self.input_pipeline = None
+            self.net.data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
+            self.label = tf.placeholder(tf.int32, shape=[None, None, None])
+
         # build the network
-        self.net.data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
         self.net.build(self.net.data, train=True, num_classes=self.imdb.num_classes)
 
-        # For checkpoint
-        self.saver = tf.train.Saver()
+        # checkpoints, the saver is built with the optimizer in train_model
+        self.saver = None
+        self.snapshot_vars = None
+        self.snapshot_writer = SnapshotWriter(cfg.TRAIN.SNAPSHOT_KEEP, background=cfg.TRAIN.SNAPSHOT_ASYNC)
+        self._host_saver = None
 
 
     def snapshot(self, sess, iter):
@@ -52,59 +71,124 @@ class SolverWrapper(object):
                     '_iter_{:d}'.format(iter+1) + '.ckpt')
         filename = os.path.join(self.output_dir, filename)
 
-        self.saver.save(sess, filename)
-        print 'Wrote snapshot to: {:s}'.format(filename)
+        t = time.time()
+        if cfg.TRAIN.SNAPSHOT_ASYNC:
+            # copy the variables to host memory, the writer thread saves them
+            values = sess.run(self.snapshot_vars)
+            self.snapshot_writer.save(filename, self._write_checkpoint, values, self._update_checkpoint_state)
+        else:
+            self.snapshot_writer.save(filename, lambda path, sess: self.saver.save(sess, path), sess,
+                                      self._update_checkpoint_state)
+        print 'Snapshot blocked training for {:.1f}ms'.format((time.time() - t) * 1000)
+
+
+    def _update_checkpoint_state(self, filename, filenames):
+        """Write the checkpoint state file that tf.train.latest_checkpoint
+        reads; the one the saver writes stays in the temporary directory."""
+        tf.train.update_checkpoint_state(self.output_dir, filename, all_model_checkpoint_paths=filenames)
+
+
+    def _write_checkpoint(self, filename, values):
+        """Save variable values copied from the training session, using a
+        separate graph on the CPU so that the training graph is not touched.
+        The checkpoint has the same variable names as self.saver writes.
+        """
+        if self._host_saver is None:
+            self._host_graph = tf.Graph()
+            with self._host_graph.as_default(), tf.device('/cpu:0'):
+                self._host_inputs = []
+                host_vars = {}
+                for v in self.snapshot_vars:
+                    value = tf.placeholder(v.dtype.base_dtype, shape=v.get_shape())
+                    self._host_inputs.append(value)
+                    host_vars[v.op.name] = tf.Variable(value, trainable=False)
+                self._host_init = tf.initialize_all_variables()
+                self._host_saver = tf.train.Saver(host_vars)
+            self._host_sess = tf.Session(graph=self._host_graph)
+
+        self._host_sess.run(self._host_init, feed_dict=dict(zip(self._host_inputs, values)))
+        self._host_saver.save(self._host_sess, filename, write_meta_graph=False)
 
 
     def train_model(self, sess, max_iters):
         """Network training loop."""
 
-        # data layer
-        data_layer = GtDataLayer(self.roidb, self.imdb.num_classes)
-
         # classification loss
         cls_score = self.net.upscore32
-        label = tf.placeholder(tf.int32, shape=[None, None, None])
+        label = self.label
         loss = tf.reduce_mean(tf.nn.sparse_softmax_cross_entropy_with_logits(cls_score, label))
 
-        # add summary
+        # optimizer
+        global_step = tf.Variable(0, trainable=False, name='global_step')
+        lr = get_learning_rate(global_step, max_iters)
+        momentum = cfg.TRAIN.MOMENTUM
+        train_op = tf.train.MomentumOptimizer(lr, momentum).minimize(loss, global_step=global_step)
+
+        # add summary, with the tags of TrainingMetrics.scalar_summary
         tf.summary.scalar('loss', loss)
+        tf.summary.scalar('learning_rate', lr)
         merged = tf.summary.merge_all()
         train_writer = tf.summary.FileWriter(self.output_dir, sess.graph)
 
-        # optimizer
-        lr = tf.Variable(cfg.TRAIN.LEARNING_RATE, trainable=False)
-        momentum = cfg.TRAIN.MOMENTUM
-        train_op = tf.train.MomentumOptimizer(lr, momentum).minimize(loss)
+        # For checkpoint, including the global step and the momentum slots
+        self.saver = tf.train.Saver()
+        self.snapshot_vars = tf.all_variables()
 
         # intialize variables
         sess.run(tf.initialize_all_variables())
 
+        # no op may be added to the graph inside the training loop
+        sess.graph.finalize()
+
+        if self.input_pipeline is not None:
+            self.input_pipeline.start(sess)
+
         last_snapshot_iter = -1
         timer = Timer()
+        data_timer = Timer()
+        metrics = TrainingMetrics(cfg.TRAIN.METRICS_RING)
         for iter in range(max_iters):
-            # learning rate
-            if iter >= cfg.TRAIN.STEPSIZE:
-                sess.run(tf.assign(lr, cfg.TRAIN.LEARNING_RATE * cfg.TRAIN.GAMMA))
-            else:
-                sess.run(tf.assign(lr, cfg.TRAIN.LEARNING_RATE))
-
             # get one batch
-            blobs = data_layer.forward()
+            if self.input_pipeline is None:
+                data_timer.tic()
+                blobs = self.data_layer.forward()
+                feed_dict={self.net.data: blobs['data_depth'], label: blobs['labels']}
+                data_timer.toc()
+            else:
+                self.input_pipeline.check()
+                feed_dict = None
 
             # Make one SGD update
-            feed_dict={self.net.data: blobs['data_depth'], label: blobs['labels']}
-            
+            full_summary = metrics.is_full_summary(iter)
             timer.tic()
-            summary, loss_cls_value, _ = sess.run([merged, loss, train_op], feed_dict=feed_dict)
+            try:
+                if full_summary:
+                    summary, loss_cls_value, lr_value, _ = sess.run([merged, loss, lr, train_op], feed_dict=feed_dict)
+                else:
+                    loss_cls_value, lr_value, _ = sess.run([loss, lr, train_op], feed_dict=feed_dict)
+                    summary = metrics.scalar_summary(loss_cls_value, lr_value)
+            except tf.errors.OutOfRangeError:
+                # the input queue is closed when a producer thread fails
+                self.input_pipeline.check()
+                raise
             train_writer.add_summary(summary, iter)
             timer.toc()
+            metrics.add(iter, loss_cls_value, lr_value, timer, full_summary)
 
             print 'iter: %d / %d, loss_cls: %.4f, lr: %.8f, time: %.2f' %\
-                    (iter+1, max_iters, loss_cls_value, lr.eval(), timer.diff)
+                    (iter+1, max_iters, loss_cls_value, lr_value, timer.diff)
 
             if (iter+1) % (10 * cfg.TRAIN.DISPLAY) == 0:
                 print 'speed: {:.3f}s / iter'.format(timer.average_time)
+                summary_cost = metrics.summary_cost()
+                if summary_cost is not None:
+                    print 'summaries: {:.3f}s / full summary step'.format(summary_cost)
+                if self.input_pipeline is None:
+                    print 'data: {:.3f}s / iter (not overlapped with the step)'.format(data_timer.average_time)
+                else:
+                    print 'data: {:.3f}s / minibatch in {:d} threads, {:d} minibatches queued' \
+                        .format(self.input_pipeline.minibatch_time, cfg.TRAIN.QUEUE_THREADS,
+                                self.input_pipeline.size(sess))
 
             if (iter+1) % cfg.TRAIN.SNAPSHOT_ITERS == 0:
                 last_snapshot_iter = iter
@@ -112,11 +196,16 @@ class SolverWrapper(object):
 
         if last_snapshot_iter != iter:
             self.snapshot(sess, iter)
+        self.snapshot_writer.close()
+        metrics.export_csv(os.path.join(self.output_dir, 'metrics.csv'))
+
+        if self.input_pipeline is not None:
+            self.input_pipeline.stop(sess)
 
 
 def get_training_roidb(imdb):
     """Returns a roidb (Region of Interest database) for use in training."""
-    if cfg.TRAIN.USE_FLIPPED:
+    if cfg.TRAIN.USE_FLIPPED and not cfg.TRAIN.RANDOM_FLIP:
         print 'Appending horizontally-flipped training examples...'
         imdb.append_flipped_images()
         print 'done'
@@ -0,0 +1,98 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Queue-based input pipeline for training a FCN.
+
+Producer threads build minibatches with GtDataLayer.forward() and push them
+into a tf.FIFOQueue. The network reads its input from the dequeue op, so
+building the next minibatches overlaps with the training step instead of
+going through feed_dict every iteration.
+
+A producer thread that fails closes the queue, so that the dequeue of the
+training step raises OutOfRangeError instead of blocking, and check()
+raises the exception of the thread.
+"""
+
+import threading
+import tensorflow as tf
+from utils.timer import Timer
+
+class InputPipeline(object):
+    """Feed minibatches from a GtDataLayer into a FIFOQueue with producer threads."""
+
+    def __init__(self, data_layer, num_threads, capacity):
+        self._data_layer = data_layer
+        self._num_threads = num_threads
+
+        self._data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
+        self._label = tf.placeholder(tf.int32, shape=[None, None, None])
+        self._queue = tf.FIFOQueue(capacity, [tf.float32, tf.int32])
+        self._enqueue_op = self._queue.enqueue([self._data, self._label])
+        self._close_op = self._queue.close(cancel_pending_enqueues=True)
+        self._size_op = self._queue.size()
+
+        self._timers = [Timer() for _ in xrange(num_threads)]
+        self._threads = []
+        self._coord = None
+
+    def dequeue(self):
+        """Return the data and label tensors of the next minibatch."""
+        data, label = self._queue.dequeue()
+        data.set_shape([None, None, None, 3])
+        label.set_shape([None, None, None])
+        return data, label
+
+    def _produce(self, sess, timer):
+        try:
+            while not self._coord.should_stop():
+                timer.tic()
+                blobs = self._data_layer.forward()
+                timer.toc()
+                sess.run(self._enqueue_op, feed_dict={self._data: blobs['data_depth'],
+                                                      self._label: blobs['labels']})
+        except tf.errors.CancelledError:
+            pass
+        except Exception as e:
+            self._coord.request_stop(e)
+            # wake up the training step blocked on the dequeue
+            try:
+                sess.run(self._close_op)
+            except Exception:
+                pass
+
+    def start(self, sess):
+        """Start the producer threads."""
+        self._coord = tf.train.Coordinator()
+        for i in xrange(self._num_threads):
+            t = threading.Thread(target=self._produce, args=(sess, self._timers[i]))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def check(self):
+        """Raise the exception of a failed producer thread, if any."""
+        if self._coord.should_stop():
+            self._coord.raise_requested_exception()
+
+    def stop(self, sess):
+        """Stop the producer threads and close the queue."""
+        self._coord.request_stop()
+        sess.run(self._close_op)
+        self._coord.join(self._threads)
+        self._threads = []
+
+    def size(self, sess):
+        """Number of minibatches waiting in the queue."""
+        return sess.run(self._size_op)
+
+    @property
+    def minibatch_time(self):
+        """Average time to build one minibatch in a producer thread."""
+        calls = sum(t.calls for t in self._timers)
+        if calls == 0:
+            return 0.
+        return sum(t.total_time for t in self._timers) / calls
@@ -11,6 +11,8 @@
 from fcn.config import cfg
 from gt_data_layer.minibatch import get_minibatch
 import numpy as np
+import threading
+from utils.sampler import get_sampler, get_minibatch_db
 
 class GtDataLayer(object):
     """FCN data layer used for training."""
@@ -18,7 +20,9 @@ class GtDataLayer(object):
     def __init__(self, roidb, num_classes):
         """Set the roidb to be used by this layer during training."""
         self._roidb = roidb
+        self._sampler = get_sampler(roidb)
         self._num_classes = num_classes
+        self._lock = threading.Lock()
         self._shuffle_roidb_inds()
 
     def _shuffle_roidb_inds(self):
@@ -28,6 +32,9 @@ class GtDataLayer(object):
 
     def _get_next_minibatch_inds(self):
         """Return the roidb indices for the next minibatch."""
+        if self._sampler is not None:
+            return self._sampler.next_minibatch_inds()
+
         if self._cur + cfg.TRAIN.IMS_PER_BATCH >= len(self._roidb):
             self._shuffle_roidb_inds()
 
@@ -38,8 +45,10 @@ class GtDataLayer(object):
 
     def _get_next_minibatch(self):
         """Return the blobs to be used for the next minibatch."""
-        db_inds = self._get_next_minibatch_inds()
-        minibatch_db = [self._roidb[i] for i in db_inds]
+        # the minibatches may be built by several producer threads
+        with self._lock:
+            db_inds = self._get_next_minibatch_inds()
+        minibatch_db = get_minibatch_db(self._roidb, db_inds, cfg.TRAIN.RANDOM_FLIP)
         return get_minibatch(minibatch_db, self._num_classes)
             
     def forward(self):
@@ -9,6 +9,7 @@ import sys
 
 import numpy as np
 import tensorflow as tf
+from networks.mapped_weights import MappedWeights
 
 class FCN8VGG:
     def __init__(self, vgg16_npy_path=None):
@@ -20,13 +21,17 @@ class FCN8VGG:
             path = os.path.join(path, "vgg16.npy")
             vgg16_npy_path = path
             logging.info("Load npy file from '%s'.", vgg16_npy_path)
-        if not os.path.isfile(vgg16_npy_path):
+        if not os.path.exists(vgg16_npy_path):
             logging.error(("File '%s' not found. Download it from "
                            "https://dl.dropboxusercontent.com/u/"
                            "50333326/vgg16.npy"), vgg16_npy_path)
             sys.exit(1)
 
-        self.data_dict = np.load(vgg16_npy_path, encoding='latin1').item()
+        if os.path.isdir(vgg16_npy_path):
+            # converted by networks/mapped_weights.py, read layer by layer
+            self.data_dict = MappedWeights(vgg16_npy_path)
+        else:
+            self.data_dict = np.load(vgg16_npy_path, encoding='latin1').item()
         self.wd = 5e-4
         print("npy file loaded")
 
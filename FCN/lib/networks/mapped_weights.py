@@ -0,0 +1,74 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Memory-mapped VGG16 weights.
+
+vgg16.npy is a pickled dict {layer name: [weights, biases]}. Loading it
+unpickles all of the weights before the first layer is built, and the dict
+stays in memory as long as the network. convert_npy() writes every tensor
+of it into its own .npy file in a directory:
+    <layer name>_0.npy   weights
+    <layer name>_1.npy   biases
+MappedWeights reads such a directory. It can be used in place of the dict:
+indexing it memory-maps the tensors of one layer, so only the layers that
+are built are read from disk. The maps are opened once per layer and kept,
+and their clean pages can be dropped by the kernel once the layer has been
+copied into the graph.
+
+Convert a model with
+    python mapped_weights.py vgg16.npy vgg16
+and pass the directory to FCN8VGG instead of vgg16.npy.
+"""
+
+import os
+import numpy as np
+
+class MappedWeights(object):
+    """A directory of per-tensor .npy files indexed like the vgg16.npy dict."""
+
+    def __init__(self, path):
+        self._files = {}
+        for filename in os.listdir(path):
+            name, ext = os.path.splitext(filename)
+            if ext != '.npy':
+                continue
+            layer, index = name.rsplit('_', 1)
+            self._files.setdefault(layer, []).append((int(index), os.path.join(path, filename)))
+        for files in self._files.values():
+            files.sort()
+        self._tensors = {}
+
+    def __contains__(self, layer):
+        return layer in self._files
+
+    def __getitem__(self, layer):
+        # the network reads the weights and the biases of a layer separately
+        if layer not in self._tensors:
+            self._tensors[layer] = [np.load(filename, mmap_mode='r') for _, filename in self._files[layer]]
+        return self._tensors[layer]
+
+    def keys(self):
+        return self._files.keys()
+
+
+def convert_npy(npy_path, output_dir):
+    """Write the tensors of a vgg16.npy style dict into output_dir."""
+    data_dict = np.load(npy_path, encoding='latin1', allow_pickle=True).item()
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    for layer, tensors in data_dict.items():
+        for i, tensor in enumerate(tensors):
+            np.save(os.path.join(output_dir, '{}_{:d}.npy'.format(layer, i)), tensor)
+    print 'Wrote {:d} layers to {}'.format(len(data_dict), output_dir)
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) != 3:
+        print 'usage: {} vgg16.npy output_dir'.format(sys.argv[0])
+        sys.exit(1)
+    convert_npy(sys.argv[1], sys.argv[2])
@@ -0,0 +1,11 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Tests of the FCN modules. Run from FCN/lib with
+
+    python -m unittest discover -s tests -t .
+"""
@@ -0,0 +1,58 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import math
+import unittest
+import tensorflow as tf
+from fcn.config import cfg
+from fcn.lr_schedule import get_learning_rate
+
+class LearningRateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.train_cfg = dict(cfg.TRAIN)
+        cfg.TRAIN.LEARNING_RATE = 0.01
+        cfg.TRAIN.GAMMA = 0.1
+        cfg.TRAIN.STEPSIZE = 100
+        cfg.TRAIN.STEPVALUES = (100, 250)
+        cfg.TRAIN.POWER = 2.0
+
+    def tearDown(self):
+        cfg.TRAIN.update(self.train_cfg)
+
+    def _rates(self, policy, steps, max_iters=400):
+        cfg.TRAIN.LR_POLICY = policy
+        with tf.Graph().as_default():
+            global_step = tf.placeholder(tf.int32, shape=())
+            lr = get_learning_rate(global_step, max_iters)
+            with tf.Session() as sess:
+                return [sess.run(lr, feed_dict={global_step: step}) for step in steps]
+
+    def assertRates(self, rates, expected):
+        for rate, value in zip(rates, expected):
+            self.assertAlmostEqual(rate, value, places=7)
+
+    def test_step(self):
+        self.assertRates(self._rates('step', [0, 99, 100, 250]), [0.01, 0.01, 0.001, 0.0001])
+
+    def test_multistep(self):
+        self.assertRates(self._rates('multistep', [0, 99, 100, 249, 250, 399]),
+                         [0.01, 0.01, 0.001, 0.001, 0.0001, 0.0001])
+
+    def test_poly(self):
+        self.assertRates(self._rates('poly', [0, 200, 400, 500]), [0.01, 0.0025, 0.0, 0.0])
+
+    def test_cosine(self):
+        self.assertRates(self._rates('cosine', [0, 100, 200, 400]),
+                         [0.01, 0.005 * (1 + math.cos(math.pi / 4)), 0.005, 0.0])
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, self._rates, 'exp', [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Minibatch samplers for the training data layer.
+
+By default the data layer draws random permutations of the roidb. With
+cfg.TRAIN.SAMPLER set to bucket, every minibatch is drawn from images with
+the same padded shape, so that im_list_to_blob does not pad images to the
+largest height and width in the batch.
+"""
+
+import numpy as np
+import PIL.Image
+from fcn.config import cfg
+
+def padded_shape(height, width, factor):
+    """Shape of an image after pad_im(im, factor)."""
+    return (int(np.ceil(height / float(factor)) * factor),
+            int(np.ceil(width / float(factor)) * factor))
+
+
+def padding_fraction(shapes):
+    """Fraction of a blob built from images of these shapes that is padding."""
+    shapes = np.array(shapes, dtype=np.float64).reshape((-1, 2))
+    area = shapes[:, 0] * shapes[:, 1]
+    blob_area = len(shapes) * shapes[:, 0].max() * shapes[:, 1].max()
+    return 1.0 - area.sum() / blob_area
+
+
+def get_minibatch_db(roidb, db_inds, random_flip=False):
+    """Return the roidb entries of a minibatch.
+
+    With random_flip, the entries are shallow copies that are each flipped
+    with probability 0.5; get_minibatch flips the images with views.
+    """
+    minibatch_db = [roidb[i] for i in db_inds]
+    if random_flip:
+        minibatch_db = [dict(entry, flipped=(np.random.rand() < 0.5)) for entry in minibatch_db]
+    return minibatch_db
+
+
+class BucketSampler(object):
+    """Draw each minibatch from roidb entries with the same padded image shape."""
+
+    def __init__(self, roidb, ims_per_batch, factor=16):
+        self._ims_per_batch = ims_per_batch
+
+        # read the image sizes from the file headers
+        self._shapes = []
+        for entry in roidb:
+            width, height = PIL.Image.open(entry['image']).size
+            self._shapes.append(padded_shape(height, width, factor))
+
+        buckets = {}
+        for i, shape in enumerate(self._shapes):
+            buckets.setdefault(shape, []).append(i)
+        self._buckets = [np.array(inds) for inds in buckets.itervalues()]
+        self._shuffle_batches()
+
+        # padding of random batches, for comparison
+        num = len(self._shapes)
+        random_padding = np.mean([padding_fraction([self._shapes[i] for i in np.random.randint(num, size=ims_per_batch)])
+                                  for _ in xrange(1000)])
+        print 'bucket sampler: {:d} buckets, padding fraction {:.3f} (random batches {:.3f})' \
+            .format(len(self._buckets), self.padding_fraction(), random_padding)
+
+    def _shuffle_batches(self):
+        """Split every shuffled bucket into whole minibatches and shuffle the minibatches."""
+        n = self._ims_per_batch
+        batches = []
+        for inds in self._buckets:
+            perm = np.random.permutation(inds)
+            if len(perm) < n:
+                batches.append(perm)
+            for start in xrange(0, len(perm) - n + 1, n):
+                batches.append(perm[start:start + n])
+        self._batches = [batches[i] for i in np.random.permutation(len(batches))]
+        self._cur = 0
+
+    def padding_fraction(self):
+        """Average padding fraction of the minibatches of one epoch."""
+        return np.mean([padding_fraction([self._shapes[i] for i in inds]) for inds in self._batches])
+
+    def next_minibatch_inds(self):
+        """Return the roidb indices for the next minibatch."""
+        if self._cur >= len(self._batches):
+            self._shuffle_batches()
+
+        db_inds = self._batches[self._cur]
+        self._cur += 1
+        return db_inds
+
+
+def get_sampler(roidb):
+    """Return the sampler selected by cfg.TRAIN.SAMPLER, or None for random permutations."""
+    if cfg.TRAIN.SAMPLER == 'random':
+        return None
+    elif cfg.TRAIN.SAMPLER == 'bucket':
+        return BucketSampler(roidb, cfg.TRAIN.IMS_PER_BATCH)
+    else:
+        raise ValueError('Unknown sampler: {}'.format(cfg.TRAIN.SAMPLER))
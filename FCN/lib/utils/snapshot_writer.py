@@ -0,0 +1,111 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Write training snapshots without blocking the training loop.
+
+The solver copies the parameters into host memory and hands them to a
+SnapshotWriter together with a function that writes them to a file. In
+background mode the function runs on a writer thread, so the training loop
+only waits for the copy. At most one snapshot is pending at a time; if the
+writer falls behind, the next save waits for it.
+
+Every snapshot is first written into a temporary directory next to its
+final location and then renamed into place, so a crash while writing never
+leaves a truncated snapshot behind. Only the last cfg.TRAIN.SNAPSHOT_KEEP
+snapshots are kept, or all of them if it is 0. An error of the writer
+thread is raised by the next save() or by close().
+"""
+
+import os
+import shutil
+import sys
+import threading
+import Queue
+from collections import deque
+
+class SnapshotWriter(object):
+    """Write snapshots on a background thread with an atomic rename."""
+
+    def __init__(self, keep=0, background=True):
+        self._keep = keep
+        self._background = background
+        self._snapshots = deque()
+        self._error = None
+        if background:
+            self._queue = Queue.Queue(maxsize=1)
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def save(self, filename, write_fn, data, on_written=None):
+        """Write a snapshot to filename by calling write_fn(path, data).
+
+        write_fn may write several files named path + suffix, as a
+        TensorFlow saver does; other files it writes are dropped. Once the
+        snapshot is in place, on_written(filename, filenames) is called with
+        the filenames of all snapshots kept, oldest first.
+        """
+        self._raise_error()
+        if self._background:
+            self._queue.put((filename, write_fn, data, on_written))
+        else:
+            self._write(filename, write_fn, data, on_written)
+
+    def close(self):
+        """Wait for the pending snapshots to be written and raise the error
+        of any that failed."""
+        if self._background:
+            self._queue.put(None)
+            self._thread.join()
+            self._background = False
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            (error_type, error, tb), self._error = self._error, None
+            raise error_type, error, tb
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception:
+                # keep the first error, with its traceback
+                if self._error is None:
+                    self._error = sys.exc_info()
+
+    def _write(self, filename, write_fn, data, on_written=None):
+        output_dir, name = os.path.split(filename)
+        tmp_dir = os.path.join(output_dir, '.tmp_' + name)
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        write_fn(os.path.join(tmp_dir, name), data)
+
+        # rename the index file (or the single snapshot file) last, so that
+        # a snapshot which can be found is complete
+        files = [f for f in os.listdir(tmp_dir) if f.startswith(name)]
+        files.sort(key=lambda f: f == name or f.endswith('.index'))
+        paths = []
+        for f in files:
+            path = os.path.join(output_dir, f)
+            os.rename(os.path.join(tmp_dir, f), path)
+            paths.append(path)
+        shutil.rmtree(tmp_dir)
+        print 'Wrote snapshot to: {:s}'.format(filename)
+
+        self._snapshots.append((filename, paths))
+        while self._keep > 0 and len(self._snapshots) > self._keep:
+            for path in self._snapshots.popleft()[1]:
+                if os.path.exists(path):
+                    os.remove(path)
+        if on_written is not None:
+            on_written(filename, [f for f, _ in self._snapshots])
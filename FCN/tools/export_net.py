@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016 RSE at UW
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Export a trained FCN as a frozen inference graph."""
+
+import _init_paths
+from fcn.export import export_inference_graph, load_inference_net, benchmark_inference_net
+from fcn.config import cfg, cfg_from_file
+from datasets.factory import get_imdb
+from networks.factory import get_network
+import argparse
+import pprint
+import sys
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Export a FCN for inference')
+    parser.add_argument('--weights', dest='pretrained_model',
+                        help='vgg16.npy used to build the network',
+                        default=None, type=str)
+    parser.add_argument('--model', dest='model',
+                        help='checkpoint to export',
+                        default=None, type=str)
+    parser.add_argument('--output', dest='output',
+                        help='frozen graph file to write',
+                        default=None, type=str)
+    parser.add_argument('--cfg', dest='cfg_file',
+                        help='optional config file', default=None, type=str)
+    parser.add_argument('--imdb', dest='imdb_name',
+                        help='dataset the network was trained on',
+                        default='voc_2007_test', type=str)
+    parser.add_argument('--network', dest='network_name',
+                        help='name of the network',
+                        default=None, type=str)
+    parser.add_argument('--float16', dest='float16',
+                        help='store the weights in float16',
+                        action='store_true')
+    parser.add_argument('--benchmark', dest='benchmark',
+                        help='report the CPU latency per frame of this size, e.g. 480x640',
+                        default=None, type=str)
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    print('Called with args:')
+    print(args)
+
+    if args.cfg_file is not None:
+        cfg_from_file(args.cfg_file)
+
+    print('Using config:')
+    pprint.pprint(cfg)
+
+    imdb = get_imdb(args.imdb_name)
+    network = get_network(args.network_name, args.pretrained_model)
+    export_inference_graph(network, args.model, imdb.num_classes, args.output, float16=args.float16)
+
+    if args.benchmark is not None:
+        height, width = [int(x) for x in args.benchmark.split('x')]
+        net = load_inference_net(args.output)
+        print 'CPU latency: {:.1f}ms / frame'.format(benchmark_inference_net(net, height, width) * 1000)
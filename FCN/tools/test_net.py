@@ -11,6 +11,7 @@
 
 import _init_paths
 from fcn.test import test_net
+from fcn.export import load_inference_net
 from fcn.config import cfg, cfg_from_file
 from datasets.factory import get_imdb
 from networks.factory import get_network
@@ -33,7 +34,7 @@ def parse_args():
                         help='pretrained model',
                         default=None, type=str)
     parser.add_argument('--model', dest='model',
-                        help='model to test',
+                        help='model to test, a checkpoint or a frozen graph (.pb)',
                         default=None, type=str)
     parser.add_argument('--cfg', dest='cfg_file',
                         help='optional config file', default=None, type=str)
@@ -81,17 +82,22 @@ if __name__ == '__main__':
     device_name = '/gpu:{:d}'.format(args.gpu_id)
     print device_name
 
-    network = get_network(args.network_name, args.pretrained_model)
-    print 'Use network `{:s}` in training'.format(args.network_name)
-
-    # build the network
-    network.data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
-    network.build(network.data, train=False, num_classes=imdb.num_classes)
-
-    # start a session
-    saver = tf.train.Saver()
-    sess = tf.Session(config=tf.ConfigProto(allow_soft_placement=True))
-    saver.restore(sess, args.model)
-    print ('Loading model weights from {:s}').format(args.model)
+    if args.model.endswith('.pb'):
+        # frozen graph written by tools/export_net.py
+        network = load_inference_net(args.model)
+        sess = network.sess
+    else:
+        network = get_network(args.network_name, args.pretrained_model)
+        print 'Use network `{:s}` in training'.format(args.network_name)
+
+        # build the network
+        network.data = tf.placeholder(tf.float32, shape=[None, None, None, 3])
+        network.build(network.data, train=False, num_classes=imdb.num_classes)
+
+        # start a session
+        saver = tf.train.Saver()
+        sess = tf.Session(config=tf.ConfigProto(allow_soft_placement=True))
+        saver.restore(sess, args.model)
+        print ('Loading model weights from {:s}').format(args.model)
 
     test_net(sess, network, imdb, weights_filename)
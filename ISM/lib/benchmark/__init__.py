@@ -0,0 +1,6 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
@@ -0,0 +1,301 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""The benchmark cases: the data layers end to end and their hot paths.
+
+Every case runs on the CPU unless the run is started with a GPU; cases that
+need the GPU, Caffe or a missing extension are reported as skipped.
+"""
+
+import os
+import sys
+import shutil
+import numpy as np
+import cv2
+from ism.config import cfg
+from utils.depth_io import read_depth
+from utils.meta_data import load_meta_data
+from benchmark.suite import case, SkipCase
+from benchmark.fixtures import shapenet_class_colors
+
+def _quiet(fn):
+    """fn with its printing sent to /dev/null."""
+    def quiet():
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            return fn()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return quiet
+
+
+def _frame(context, i=0):
+    fixture = context.fixture
+    index = fixture.indexes[i]
+    im_depth = read_depth(fixture.path(index, '-depth.png'))
+    meta_data = load_meta_data(fixture.roidb()[i]['meta_data'])
+    return im_depth, meta_data
+
+
+def _require_gpu(context):
+    if not context.gpu:
+        raise SkipCase('needs a GPU, run with --gpu')
+
+
+# data layers
+
+@case('minibatch/gt_single_data_layer')
+def _gt_single_data_layer(context):
+    from gt_single_data_layer.minibatch import get_minibatch
+    from utils.voxelizer import Voxelizer
+    roidb = context.fixture.roidb()[:cfg.TRAIN.IMS_PER_BATCH]
+    voxelizer = Voxelizer(cfg.TRAIN.GRID_SIZE, context.fixture.num_classes)
+    return lambda: get_minibatch(roidb, voxelizer)
+
+
+@case('minibatch/gt_single_data_layer_augmented',
+      config={'TRAIN.VERTEX_REG': True, 'TRAIN.CHROMATIC': True, 'TRAIN.AFFINE': True})
+def _gt_single_data_layer_augmented(context):
+    from gt_single_data_layer.minibatch import get_minibatch, expand_vertex_targets
+    from utils.voxelizer import Voxelizer
+    roidb = context.fixture.roidb()[:cfg.TRAIN.IMS_PER_BATCH]
+    num_classes = context.fixture.num_classes
+    voxelizer = Voxelizer(cfg.TRAIN.GRID_SIZE, num_classes)
+
+    def fn():
+        blobs = get_minibatch(roidb, voxelizer)
+        # as the data layer expands them into its top blobs
+        num, _, height, width = blobs['data_vertex_targets'].shape
+        target_blob = np.zeros((num, 3 * num_classes, height, width), dtype=np.float32)
+        weight_blob = np.zeros_like(target_blob)
+        expand_vertex_targets(blobs['data_vertex_targets'], blobs['data_vertex_classes'], target_blob, weight_blob)
+    return fn
+
+
+@case('minibatch/gt_data_layer')
+def _gt_data_layer(context):
+    """gt_data_layer takes square images, as the shapenet renders are, so
+    the center square of the frames is cut out."""
+    from gt_data_layer.minibatch import get_minibatch
+    fixture = context.fixture
+    size = min(fixture.height, fixture.width)
+    y0 = (fixture.height - size) // 2
+    x0 = (fixture.width - size) // 2
+    roidb = fixture.roidb()[:1]
+    for entry in roidb:
+        for key in ('image', 'depth'):
+            path = entry[key].replace('.png', '-square.png')
+            im = cv2.imread(entry[key], cv2.IMREAD_UNCHANGED)
+            cv2.imwrite(path, im[y0:y0 + size, x0:x0 + size])
+            entry[key] = path
+        boxes = entry['boxes'].astype(np.int32) - np.array([x0, y0, x0, y0])
+        entry['boxes'] = np.clip(boxes, 0, size - 1).astype(np.uint16)
+    return lambda: get_minibatch(roidb, fixture.num_classes)
+
+
+@case('minibatch/gt_segmentation_layer')
+def _gt_segmentation_layer(context):
+    from gt_segmentation_layer.minibatch import get_minibatch
+    roidb = context.fixture.roidb()[:cfg.TRAIN.IMS_PER_BATCH]
+    for entry in roidb:
+        entry['label'] = entry['label_color']
+        entry['class_colors'] = shapenet_class_colors(context.fixture.num_classes)
+    return lambda: get_minibatch(roidb, context.fixture.num_classes)
+
+
+# backprojection and voxelization
+
+@case('backproject/voxelizer_camera')
+def _backproject_camera(context):
+    from utils.voxelizer import Voxelizer
+    im_depth, meta_data = _frame(context)
+    voxelizer = Voxelizer(cfg.TRAIN.GRID_SIZE, context.fixture.num_classes)
+    return lambda: voxelizer.backproject_camera(im_depth, meta_data)
+
+
+@case('backproject/voxelizer_world')
+def _backproject_world(context):
+    from utils.voxelizer import Voxelizer
+    im_depth, meta_data = _frame(context)
+    voxelizer = Voxelizer(cfg.TRAIN.GRID_SIZE, context.fixture.num_classes)
+    return lambda: voxelizer.backproject(im_depth, meta_data)
+
+
+@case('backproject/gt_data_layer')
+def _backproject_gt_data_layer(context):
+    from gt_data_layer.minibatch import backproject
+    im_depth, meta_data = _frame(context)
+    return lambda: backproject(im_depth, meta_data)
+
+
+@case('voxelize/voxelizer')
+def _voxelize(context):
+    from utils.voxelizer import Voxelizer
+    im_depth, meta_data = _frame(context)
+    voxelizer = Voxelizer(cfg.TRAIN.GRID_SIZE, context.fixture.num_classes)
+    points = voxelizer.backproject_camera(im_depth, meta_data)
+
+    def fn():
+        voxelizer.voxelized = False
+        voxelizer.voxelize(points)
+    return fn
+
+
+# label decoding
+
+@case('label/gt_single_data_layer_index')
+def _label_index(context):
+    from gt_single_data_layer.minibatch import _process_label_image
+    entry = context.fixture.roidb()[0]
+    im = cv2.imread(entry['label'], cv2.IMREAD_UNCHANGED)
+    return lambda: _process_label_image(im, entry['class_colors'], entry['class_weights'])
+
+
+@case('label/gt_single_data_layer_color')
+def _label_color(context):
+    from gt_single_data_layer.minibatch import _process_label_image
+    entry = context.fixture.roidb()[0]
+    im = cv2.imread(entry['label_color'], cv2.IMREAD_UNCHANGED)
+    class_colors = [tuple(255 * int(c) for c in color) for color in shapenet_class_colors(context.fixture.num_classes)]
+    return lambda: _process_label_image(im, class_colors, entry['class_weights'])
+
+
+@case('label/gt_segmentation_layer')
+def _label_segmentation(context):
+    from gt_segmentation_layer.minibatch import _process_label_image
+    entry = context.fixture.roidb()[0]
+    im = cv2.imread(entry['label_color'], cv2.IMREAD_UNCHANGED)
+    class_colors = shapenet_class_colors(context.fixture.num_classes)
+    return lambda: _process_label_image(im, class_colors)
+
+
+# normals
+
+@case('normals/cpu_normals')
+def _cpu_normals(context):
+    from normals.cpu_normals import cpu_normals
+    im_depth, meta_data = _frame(context)
+    depth = im_depth.astype(np.float32) / float(meta_data['factor_depth'])
+    K = meta_data['intrinsic_matrix']
+    return lambda: cpu_normals(depth, K[0, 0], K[1, 1], K[0, 2], K[1, 2], 20.0)
+
+
+@case('normals/gpu_normals')
+def _gpu_normals(context):
+    _require_gpu(context)
+    from normals.gpu_normals import gpu_normals
+    im_depth, meta_data = _frame(context)
+    depth = im_depth.astype(np.float32) / float(meta_data['factor_depth'])
+    K = meta_data['intrinsic_matrix']
+    return lambda: gpu_normals(depth, K[0, 0], K[1, 1], K[0, 2], K[1, 2], 20.0, cfg.GPU_ID)
+
+
+# NMS and proposals
+
+def _detections(num=6000, num_objects=20, seed=0):
+    """Boxes scattered around a few objects, as the proposals before NMS."""
+    rng = np.random.RandomState(seed)
+    centers = rng.uniform(50, 590, (num_objects, 2))
+    sizes = rng.uniform(30, 150, (num_objects, 2))
+    obj = rng.randint(0, num_objects, num)
+    ctr = centers[obj] + rng.normal(0, 10, (num, 2))
+    size = sizes[obj] * rng.uniform(0.8, 1.2, (num, 2))
+    dets = np.hstack((ctr - size / 2, ctr + size / 2, rng.rand(num, 1)))
+    return dets.astype(np.float32)
+
+
+@case('nms/py_cpu_nms')
+def _py_cpu_nms(context):
+    from nms.py_cpu_nms import py_cpu_nms
+    dets = _detections()
+    return lambda: py_cpu_nms(dets, 0.7)
+
+
+@case('nms/cpu_nms')
+def _cpu_nms(context):
+    from nms.cpu_nms import cpu_nms
+    dets = _detections()
+    return lambda: cpu_nms(dets, 0.7)
+
+
+@case('nms/gpu_nms')
+def _gpu_nms(context):
+    _require_gpu(context)
+    from nms.gpu_nms import gpu_nms
+    dets = _detections()
+    return lambda: gpu_nms(dets, 0.7, device_id=cfg.GPU_ID)
+
+
+def _rpn_outputs(context, feat_stride=16, seed=0):
+    from rpn_msr.generate_anchors import generate_anchors
+    anchors = generate_anchors(cfg.TRAIN.RPN_BASE_SIZE, cfg.TRAIN.RPN_ASPECTS, np.array(cfg.TRAIN.RPN_SCALES))
+    height = int(np.ceil(context.fixture.height / float(feat_stride)))
+    width = int(np.ceil(context.fixture.width / float(feat_stride)))
+    rng = np.random.RandomState(seed)
+    scores = rng.rand(1, anchors.shape[0], height, width).astype(np.float32)
+    bbox_deltas = (0.1 * rng.randn(1, 4 * anchors.shape[0], height, width)).astype(np.float32)
+    im_info = np.array([context.fixture.height, context.fixture.width, 1.0], dtype=np.float32)
+    return scores, bbox_deltas, im_info, anchors, feat_stride
+
+
+@case('proposals/py_cpu_nms')
+def _proposals_py(context):
+    from rpn_msr.proposals import generate_proposals
+    from nms.py_cpu_nms import py_cpu_nms
+    args = _rpn_outputs(context)
+    return lambda: generate_proposals(*(args + ('TEST', py_cpu_nms)))
+
+
+@case('proposals/nms_wrapper')
+def _proposals_wrapper(context):
+    from rpn_msr.proposals import generate_proposals
+    from ism.nms_wrapper import nms
+    args = _rpn_outputs(context)
+    return lambda: generate_proposals(*(args + ('TEST', nms)))
+
+
+# evaluation
+
+@case('evaluate/evaluate_segmentations')
+def _evaluate_segmentations(context):
+    import datasets
+    fixture = context.fixture
+    imdb = datasets.lov(fixture.image_set, fixture.root)
+    rng = np.random.RandomState(0)
+    segmentations = []
+    for index in imdb.image_index:
+        labels = cv2.imread(fixture.path(index, '-label.png'), cv2.IMREAD_UNCHANGED).astype(np.int64)
+        # 5% of the pixels wrong
+        wrong = rng.rand(*labels.shape) < 0.05
+        labels[wrong] = rng.randint(0, fixture.num_classes, wrong.sum())
+        segmentations.append({'labels': labels})
+    output_dir = os.path.join(fixture.root, 'output')
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    return _quiet(lambda: imdb.evaluate_segmentations(segmentations, output_dir))
+
+
+@case('pose/pose_estimate')
+def _pose_estimate(context):
+    from ism.test import pose_estimate
+    im_depth, meta_data = _frame(context)
+    if not np.any(im_depth > 0):
+        raise SkipCase('the first frame has no depth, the fixture is too small')
+    num_classes = context.fixture.num_classes
+    label = cv2.imread(context.fixture.path(context.fixture.indexes[0], '-label.png'), cv2.IMREAD_UNCHANGED)
+
+    # predictions on a square 60 x 60 map, the classes from the ground truth
+    size = 60
+    label = cv2.resize(label, dsize=(size, size), interpolation=cv2.INTER_NEAREST)
+    cls_prob = np.zeros((1, num_classes, size, size), dtype=np.float32)
+    for cls in xrange(num_classes):
+        cls_prob[0, cls] = label == cls
+    rng = np.random.RandomState(0)
+    center_pred = rng.uniform(-1, 1, (1, 3 * num_classes, size, size)).astype(np.float32)
+    return _quiet(lambda: pose_estimate(im_depth, meta_data, cls_prob, center_pred))
@@ -0,0 +1,192 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Synthetic RGB-D frames laid out like the LOV dataset.
+
+make_lov_fixture() ray casts spheres standing on a table plane and writes
+
+    <root>/<image_set>.txt                    '<video>/<frame>' per line
+    <root>/data/<video>/<frame>-color.png     BGRA, alpha 0 where there is no depth
+    <root>/data/<video>/<frame>-depth.png     uint16 depth, factor_depth 10000
+    <root>/data/<video>/<frame>-label.png     uint8 class index
+    <root>/data/<video>/<frame>-label-color.png  BGR label colors, for the
+                                              layers that decode color labels
+    <root>/data/<video>/<frame>-meta.mat      intrinsic_matrix, factor_depth,
+                                              rotation_translation_matrix,
+                                              projection_matrix, camera_location,
+                                              poses, cls_indexes, vertmap
+
+so that datasets.lov(image_set, root) reads it. The -meta.mat files need
+scipy; the -meta.bin files of utils.meta_data are written next to them, or
+instead of them without scipy, and hold the same arrays.
+"""
+
+import os
+import numpy as np
+import cv2
+from utils.meta_data import binary_path, meta_data_path, save_meta_data
+from utils.depth_io import write_depth
+
+FACTOR_DEPTH = 10000
+# the LOV class colors, one per class index
+CLASS_COLORS = [(255, 255, 255), (255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255),
+                (0, 255, 255), (128, 0, 0), (0, 128, 0), (0, 0, 128), (128, 128, 0), (128, 0, 128),
+                (0, 128, 128), (64, 0, 0), (0, 64, 0), (0, 0, 64), (64, 64, 0), (64, 0, 64),
+                (0, 64, 64), (192, 0, 0), (0, 192, 0), (0, 0, 192)]
+
+class Fixture(object):
+    """The frames of a fixture and the roidb entries the data layers take."""
+
+    def __init__(self, root, image_set, indexes, num_classes, height, width):
+        self.root = root
+        self.image_set = image_set
+        self.indexes = indexes
+        self.num_classes = num_classes
+        self.height = height
+        self.width = width
+
+    def path(self, index, suffix):
+        return os.path.join(self.root, 'data', index + suffix)
+
+    def roidb(self):
+        """Entries as datasets.lov builds them, with the box and class of the
+        first object for gt_data_layer and the color labels of the shapenet
+        layers."""
+        roidb = []
+        for index in self.indexes:
+            label = cv2.imread(self.path(index, '-label.png'), cv2.IMREAD_UNCHANGED)
+            cls = int(label.max())
+            y, x = np.nonzero(label == cls)
+            roidb.append({'image': self.path(index, '-color.png'),
+                          'depth': self.path(index, '-depth.png'),
+                          'label': self.path(index, '-label.png'),
+                          'label_color': self.path(index, '-label-color.png'),
+                          'meta_data': meta_data_path(self.path(index, '-meta.mat')),
+                          'video_id': index[:index.find('/')],
+                          'class_colors': CLASS_COLORS[:self.num_classes],
+                          'class_weights': [1] * self.num_classes,
+                          'boxes': np.array([[x.min(), y.min(), x.max(), y.max()]], dtype=np.uint16),
+                          'gt_classes': np.array([cls], dtype=np.int32),
+                          'flipped': False})
+        return roidb
+
+
+def _rotation(angles):
+    rx, ry, rz = angles
+    Rx = np.array([[1, 0, 0], [0, np.cos(rx), -np.sin(rx)], [0, np.sin(rx), np.cos(rx)]])
+    Ry = np.array([[np.cos(ry), 0, np.sin(ry)], [0, 1, 0], [-np.sin(ry), 0, np.cos(ry)]])
+    Rz = np.array([[np.cos(rz), -np.sin(rz), 0], [np.sin(rz), np.cos(rz), 0], [0, 0, 1]])
+    return np.dot(Rz, np.dot(Ry, Rx))
+
+
+def render_frame(K, height, width, num_classes, rng):
+    """Ray cast a table plane and one sphere per object class.
+
+    Returns the color, depth in meters, label, vertmap and the 3 x 4 x N
+    poses of the objects in the camera frame.
+    """
+    u, v = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+    rays = np.dot(np.dstack((u, v, np.ones_like(u))), np.linalg.inv(K).T)
+    rays /= np.linalg.norm(rays, axis=2)[:, :, np.newaxis]
+
+    # the table, 0.3m below the camera center, up to 3m away
+    table_y = 0.3
+    with np.errstate(divide='ignore'):
+        t = np.where(rays[:, :, 1] > 0, table_y / rays[:, :, 1], np.inf)
+    t[t * rays[:, :, 2] > 3.0] = np.inf
+    label = np.zeros((height, width), dtype=np.uint8)
+    vertmap = np.zeros((height, width, 3), dtype=np.float32)
+
+    poses = np.zeros((3, 4, num_classes - 1))
+    for cls in xrange(1, num_classes):
+        radius = rng.uniform(0.04, 0.1)
+        center = np.array([rng.uniform(-0.3, 0.3), table_y - radius, rng.uniform(0.7, 1.3)])
+        R = _rotation(rng.uniform(-np.pi, np.pi, 3))
+        poses[:, :3, cls - 1] = R
+        poses[:, 3, cls - 1] = center
+
+        # the nearer intersection of the rays and the sphere
+        b = np.dot(rays, center)
+        disc = b * b - np.dot(center, center) + radius * radius
+        hit = disc > 0
+        t_obj = np.where(hit, b - np.sqrt(np.maximum(disc, 0)), np.inf)
+        closer = t_obj < t
+        t[closer] = t_obj[closer]
+        label[closer] = cls
+        # the surface points in the object frame
+        points = rays[closer] * t_obj[closer][:, np.newaxis] - center
+        vertmap[closer] = np.dot(points, R)
+
+    valid = np.isfinite(t)
+    depth = np.where(valid, t * rays[:, :, 2], 0)
+
+    # shaded class colors with noise, white where nothing is hit
+    shade = np.clip(0.4 + 0.6 * np.abs(rays[:, :, 2]), 0, 1)
+    base = np.array([(60 + 25 * cls) % 256 for cls in xrange(num_classes)], dtype=np.float64)
+    color = np.empty((height, width, 4), dtype=np.uint8)
+    for c in xrange(3):
+        channel = np.roll(base, c)[label] * shade + rng.normal(0, 4, (height, width))
+        color[:, :, c] = np.clip(np.where(valid, channel, 255), 0, 255)
+    color[:, :, 3] = np.where(valid, 255, 0)
+    return color, depth, label, vertmap, poses
+
+
+def make_lov_fixture(root, num_frames=4, height=480, width=640, num_classes=4, image_set='train',
+                     binary_meta=True, seed=0):
+    """Write num_frames synthetic frames under root and return their Fixture."""
+    try:
+        import scipy.io
+    except ImportError:
+        scipy = None
+    rng = np.random.RandomState(seed)
+    # the LOV camera at 640 x 480, scaled so that frames of other sizes show
+    # the same objects and table
+    scale = min(height / 480.0, width / 640.0)
+    K = np.array([[1066.778 * scale, 0, width / 2.0 - 7.0 * scale],
+                  [0, 1067.487 * scale, height / 2.0 + 1.3 * scale],
+                  [0, 0, 1]])
+    # the world frame is on the table in front of the camera
+    RT = np.hstack((np.eye(3), np.array([[0.05], [0.3], [1.0]])))
+
+    indexes = []
+    video = '0000'
+    if not os.path.exists(os.path.join(root, 'data', video)):
+        os.makedirs(os.path.join(root, 'data', video))
+    for i in xrange(num_frames):
+        index = '{}/{:06d}'.format(video, i + 1)
+        prefix = os.path.join(root, 'data', index)
+        color, depth, label, vertmap, poses = render_frame(K, height, width, num_classes, rng)
+
+        cv2.imwrite(prefix + '-color.png', color)
+        write_depth(prefix + '-depth.png', np.round(depth * FACTOR_DEPTH))
+        cv2.imwrite(prefix + '-label.png', label)
+        # colors of 0 or 255 per channel, as the shapenet layers decode them
+        bits = np.array([[(cls >> c) & 1 for c in xrange(3)] for cls in xrange(num_classes)], dtype=np.uint8)
+        cv2.imwrite(prefix + '-label-color.png', 255 * bits[label][:, :, ::-1])
+
+        meta_data = {'intrinsic_matrix': K,
+                     'factor_depth': np.array([[FACTOR_DEPTH]], dtype=np.float64),
+                     'rotation_translation_matrix': RT,
+                     'projection_matrix': np.dot(K, RT),
+                     'camera_location': -np.dot(RT[:, :3].T, RT[:, 3]).reshape((1, 3)),
+                     'poses': poses,
+                     'cls_indexes': np.arange(1, num_classes, dtype=np.float64).reshape((-1, 1)),
+                     'vertmap': vertmap}
+        if scipy is not None:
+            scipy.io.savemat(prefix + '-meta.mat', meta_data, do_compression=False)
+        if binary_meta or scipy is None:
+            save_meta_data(binary_path(prefix + '-meta.mat'), meta_data)
+        indexes.append(index)
+
+    with open(os.path.join(root, image_set + '.txt'), 'w') as f:
+        f.write(''.join(index + '\n' for index in indexes))
+    return Fixture(root, image_set, indexes, num_classes, height, width)
+
+
+def shapenet_class_colors(num_classes):
+    """The label colors of -label-color.png as the shapenet layers give them, in [0, 1]."""
+    return [tuple(float((cls >> c) & 1) for c in xrange(3)) for cls in xrange(num_classes)]
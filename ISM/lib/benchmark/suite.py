@@ -0,0 +1,213 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Registry and runner of the benchmark cases.
+
+A case is registered with
+
+    @case('group/name', config={'TRAIN.VERTEX_REG': True})
+    def setup(context):
+        ...
+        return fn
+
+setup() prepares the inputs from context.fixture and returns the function
+that is timed. It raises SkipCase, or an ImportError for a missing
+extension or package, when the case cannot run here. The config entries
+are set in cfg for the setup and the timing and restored afterwards.
+
+With memory set, every case is set up again after all of them are timed,
+as recording memory changes how malloc works for the rest of the process.
+Its function runs once more inside a profiler scope named as the case,
+with the profiler recording memory, and the peak and allocated bytes of
+the case and of the scopes inside it are added to its result and checked
+against the budgets.
+"""
+
+import json
+import re
+import time
+import traceback
+import numpy as np
+from ism.config import cfg
+from utils import profiler
+
+_CASES = []
+
+class SkipCase(Exception):
+    pass
+
+
+class Case(object):
+    def __init__(self, name, setup, config):
+        self.name = name
+        self.setup = setup
+        self.config = config
+
+
+class Context(object):
+    """What the cases get: the fixture and the options of the run."""
+
+    def __init__(self, fixture, gpu=False):
+        self.fixture = fixture
+        self.gpu = gpu
+
+
+def case(name, config=None):
+    """Register the decorated setup function as the case called name."""
+    def register(setup):
+        _CASES.append(Case(name, setup, config or {}))
+        return setup
+    return register
+
+
+def cases(pattern=None):
+    """The registered cases, in order, whose names match pattern."""
+    return [c for c in _CASES if pattern is None or re.search(pattern, c.name)]
+
+
+def _override(config):
+    """Set the dotted cfg keys of config and return their old values."""
+    old = {}
+    for key, value in config.iteritems():
+        d = cfg
+        parts = key.split('.')
+        for part in parts[:-1]:
+            d = d[part]
+        old[key] = d[parts[-1]]
+        d[parts[-1]] = value
+    return old
+
+
+def run_case(c, context, repeats=5, warmup=1):
+    """Time one case; returns its result dict."""
+    np.random.seed(0)
+    old = _override(c.config)
+    try:
+        try:
+            fn = c.setup(context)
+        except (SkipCase, ImportError) as e:
+            return {'status': 'skipped', 'reason': '{}: {}'.format(type(e).__name__, e)}
+
+        for _ in xrange(warmup):
+            fn()
+        times = []
+        for _ in xrange(repeats):
+            t = time.time()
+            fn()
+            times.append(time.time() - t)
+    except Exception as e:
+        traceback.print_exc()
+        return {'status': 'failed', 'reason': '{}: {}'.format(type(e).__name__, e)}
+    finally:
+        _override(old)
+
+    times = np.array(times)
+    return {'status': 'ok',
+            'repeats': repeats,
+            'times': times.tolist(),
+            'min': times.min(),
+            'median': float(np.median(times)),
+            'mean': times.mean(),
+            'std': times.std()}
+
+
+def profile_case(c, context, budgets=(), warmup=1):
+    """Record the memory of one run of a case.
+
+    Returns the 'memory' and 'over_budget' entries of its result dict, or
+    a failed result.
+    """
+    np.random.seed(0)
+    old = _override(c.config)
+    try:
+        fn = c.setup(context)
+        for _ in xrange(warmup):
+            fn()
+        profiler.enable(memory=True)
+        try:
+            with profiler.scope(c.name):
+                fn()
+            stats = profiler.memory_stats()
+        finally:
+            profiler.disable()
+    except Exception as e:
+        traceback.print_exc()
+        return {'status': 'failed', 'reason': '{}: {}'.format(type(e).__name__, e)}
+    finally:
+        _override(old)
+
+    return {'memory': dict((path, {'peak': peak, 'allocated': allocated})
+                           for path, (peak, allocated) in stats.iteritems()),
+            'over_budget': profiler.budget_violations(budgets, stats)}
+
+
+def run(context, pattern=None, repeats=5, warmup=1, memory=False, budgets=()):
+    """Run the matching cases and return {name: result}."""
+    results = {}
+    for c in cases(pattern):
+        result = run_case(c, context, repeats, warmup)
+        results[c.name] = result
+        if result['status'] == 'ok':
+            print '{:50s} {:10.3f}ms median {:10.3f}ms min'.format(c.name, 1000 * result['median'], 1000 * result['min'])
+        else:
+            print '{:50s} {}: {}'.format(c.name, result['status'], result['reason'])
+
+    if memory:
+        for c in cases(pattern):
+            result = results[c.name]
+            if result['status'] != 'ok':
+                continue
+            result.update(profile_case(c, context, budgets, warmup))
+            if result['status'] != 'ok':
+                print '{:50s} {}: {}'.format(c.name, result['status'], result['reason'])
+                continue
+            case_memory = result['memory'][c.name]
+            print '{:50s} {:8.1f}MB peak {:8.1f}MB allocated'.format(
+                c.name, case_memory['peak'] / float(1 << 20), case_memory['allocated'] / float(1 << 20))
+            for violation in profiler.format_violations(result['over_budget']):
+                print '    ' + violation
+    return results
+
+
+def budget_violations(results):
+    """(case, stage path, peak MB, budget MB) of every stage over its budget."""
+    return [(name,) + tuple(violation) for name in sorted(results.keys())
+            for violation in results[name].get('over_budget', [])]
+
+
+def save_results(filename, results, meta):
+    with open(filename, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_results(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(base, new, threshold=0.1):
+    """Compare the median times of two result files.
+
+    Returns the report lines and the names of the cases that got slower by
+    more than the fraction threshold.
+    """
+    lines = ['{:50s} {:>12s} {:>12s} {:>8s}'.format('case', 'base ms', 'new ms', 'ratio')]
+    regressions = []
+    for name in sorted(set(base['results']) | set(new['results'])):
+        a = base['results'].get(name, {})
+        b = new['results'].get(name, {})
+        if a.get('status') != 'ok' or b.get('status') != 'ok':
+            lines.append('{:50s} {:>12s} {:>12s}'.format(name, a.get('status', '-'), b.get('status', '-')))
+            continue
+        ratio = b['median'] / a['median']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = ' slower'
+        lines.append('{:50s} {:12.3f} {:12.3f} {:8.2f}{}'.format(
+            name, 1000 * a['median'], 1000 * b['median'], ratio, flag))
+    return lines, regressions
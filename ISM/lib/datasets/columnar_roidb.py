@@ -0,0 +1,161 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Compact columnar storage of a roidb.
+
+A roidb is a list of dicts. For large datasets most of the memory goes
+into the per-entry dicts and path strings, while values such as the class
+colors are references to the same list in every entry. ColumnarRoidb stores
+each key as one column instead:
+    - values shared by all entries are stored once as constants
+    - strings are stored as one blob with an offset array, with the common
+      prefix of the column (usually the data path) stripped
+    - the flipped flags are stored as a bit vector
+    - all other values are kept in a list
+Flipped images are represented by a row index into the original entries,
+so appending them does not duplicate any column.
+
+Indexing returns a new dict for the entry, so the data layers can keep
+using roidb[i]['image']. Changing that dict does not change the roidb.
+Slicing returns a ColumnarRoidb that shares the columns.
+"""
+
+import os
+import numpy as np
+
+class _StringColumn(object):
+    """A column of strings stored as a prefix, a blob and offsets."""
+
+    def __init__(self, values):
+        self.prefix = os.path.commonprefix(values)
+        n = len(self.prefix)
+        suffixes = [v[n:] for v in values]
+        self.data = ''.join(suffixes)
+        self.offsets = np.zeros((len(values) + 1,), dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(v) for v in suffixes])
+
+    def __getitem__(self, i):
+        return self.prefix + self.data[self.offsets[i]:self.offsets[i+1]]
+
+
+class ColumnarRoidb(object):
+    """A roidb stored column by column."""
+
+    def __init__(self, entries):
+        num = len(entries)
+        assert num > 0, 'cannot build a columnar roidb from an empty roidb'
+        keys = entries[0].keys()
+
+        self._constants = {}
+        self._columns = {}
+        for key in keys:
+            if key == 'flipped':
+                continue
+            values = [entry[key] for entry in entries]
+            first = values[0]
+            if all(v is first for v in values):
+                self._constants[key] = first
+            elif all(isinstance(v, str) for v in values):
+                self._columns[key] = _StringColumn(values)
+            else:
+                self._columns[key] = values
+
+        # row i of the roidb is entry self._rows[i], flipped if bit i is set
+        self._rows = np.arange(num, dtype=np.int32)
+        flipped = np.array([entry['flipped'] for entry in entries], dtype=np.bool)
+        self._flipped = np.packbits(flipped)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._take(np.arange(len(self))[i])
+        if i < 0:
+            i += len(self)
+        row = self._rows[i]
+        entry = dict(self._constants)
+        for key, column in self._columns.iteritems():
+            entry[key] = column[row]
+        entry['flipped'] = self.is_flipped(i)
+        return entry
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def is_flipped(self, i):
+        return bool((self._flipped[i >> 3] >> (7 - (i & 7))) & 1)
+
+    def _take(self, inds):
+        """A roidb of the given rows that shares the columns with this one."""
+        roidb = object.__new__(ColumnarRoidb)
+        roidb._constants = self._constants
+        roidb._columns = self._columns
+        roidb._rows = self._rows[inds]
+        roidb._flipped = np.packbits(np.unpackbits(self._flipped)[inds])
+        return roidb
+
+    def append_flipped(self):
+        """Append a flipped copy of every row without copying the entries."""
+        num = len(self)
+        flipped = np.unpackbits(self._flipped)[:num]
+        self._rows = np.concatenate((self._rows, self._rows))
+        self._flipped = np.packbits(np.concatenate((flipped, np.ones((num,), dtype=np.uint8))))
+
+
+def _deep_sizeof(obj, seen=None):
+    """Rough size in bytes of an object and everything it references."""
+    import sys
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_sizeof(v, seen) for v in obj)
+    elif hasattr(obj, '__dict__'):
+        size += _deep_sizeof(obj.__dict__, seen)
+    return size
+
+
+if __name__ == '__main__':
+    # compare a 100k frame LOV-like roidb as a list of dicts and as columns
+    import time
+    import cPickle
+
+    data_path = '/path/to/Deep_ISM/ISM/data/LOV/data/'
+    class_colors = [(255, 255, 255)] * 22
+    class_weights = [1] * 22
+    num = 100000
+    roidb = []
+    for i in xrange(num):
+        index = '{:04d}/{:06d}'.format(i / 1000, i % 1000)
+        roidb.append({'image': data_path + index + '-color.png',
+                      'depth': data_path + index + '-depth.png',
+                      'label': data_path + index + '-label.png',
+                      'meta_data': data_path + index + '-meta.mat',
+                      'video_id': index[:4],
+                      'class_colors': class_colors,
+                      'class_weights': class_weights,
+                      'flipped': False})
+    columnar = ColumnarRoidb(roidb)
+
+    for name, db in [('list of dicts', roidb), ('columnar', columnar)]:
+        t = time.time()
+        s = cPickle.dumps(db, cPickle.HIGHEST_PROTOCOL)
+        t_dump = time.time() - t
+        t = time.time()
+        cPickle.loads(s)
+        t_load = time.time() - t
+        print '{}: memory {:.1f}MB, pickle {:.1f}MB, dump {:.3f}s, load {:.3f}s' \
+            .format(name, _deep_sizeof(db) / 1e6, len(s) / 1e6, t_dump, t_load)
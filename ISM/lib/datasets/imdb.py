@@ -10,12 +10,30 @@ import os.path as osp
 import PIL
 import numpy as np
 import scipy.sparse
+import cPickle
+import multiprocessing
 import datasets
+from datasets.columnar_roidb import ColumnarRoidb
 from ism.config import cfg
 
+# the imdb whose annotations are loaded by the roidb worker pool. It is set
+# before the pool forks so that workers do not need to pickle the imdb.
+_pool_imdb = None
+
+def _load_annotation(args):
+    """Worker function for building roidb entries in a process pool."""
+    load_fn, index = args
+    return getattr(_pool_imdb, load_fn)(index)
+
 class imdb(object):
     """Image database."""
 
+    # bump this when the layout of the cached roidb changes
+    ROIDB_CACHE_VERSION = 2
+
+    # whether the label images give per-class pixel counts, see class_histograms
+    HAS_CLASS_HISTOGRAMS = False
+
     def __init__(self, name):
         self._name = name
         self._num_classes = 0
@@ -79,6 +97,102 @@ class imdb(object):
     def default_roidb(self):
         raise NotImplementedError
 
+    def roidb_source_files(self, index):
+        """
+        Return the files a roidb entry is built from. The modification times
+        of these files, or of their directories, decide whether a cached
+        entry is stale.
+        """
+        raise NotImplementedError
+
+    def _roidb_stamps(self):
+        """
+        Return {index: stamp} for the image set. The stamp is the modification
+        times of the source files of the index. With cfg.ROIDB_DIR_STAMPS the
+        modification times of their directories are used instead, which
+        change when files are added, removed or replaced but not when a file
+        is rewritten in place; each directory is stat'ed once.
+        """
+        mtimes = {}
+        def mtime(path):
+            if path not in mtimes:
+                mtimes[path] = os.path.getmtime(path) if os.path.exists(path) else 0
+            return mtimes[path]
+
+        stamps = {}
+        for index in self.image_index:
+            paths = self.roidb_source_files(index)
+            if cfg.ROIDB_DIR_STAMPS:
+                paths = [os.path.dirname(path) for path in paths]
+            stamps[index] = tuple(mtime(path) for path in paths)
+        return stamps
+
+    def _parallel_load(self, load_fn, indexes):
+        """Run self.<load_fn>(index) for all indexes in a process pool."""
+        global _pool_imdb
+
+        num_workers = min(cfg.ROIDB_NUM_WORKERS, len(indexes))
+        if num_workers <= 1:
+            return [getattr(self, load_fn)(index) for index in indexes]
+
+        _pool_imdb = self
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            chunksize = max(1, len(indexes) / (4 * num_workers))
+            entries = pool.map(_load_annotation, [(load_fn, index) for index in indexes], chunksize)
+        finally:
+            pool.close()
+            pool.join()
+            _pool_imdb = None
+        return entries
+
+    def _cached_entries(self, what, cache_file, load_fn):
+        """
+        Return {index: self.<load_fn>(index)} for the image set.
+
+        The entries are cached together with the stamp of every index (see
+        _roidb_stamps). On later calls only the entries that are missing or
+        stale are rebuilt, in a process pool of cfg.ROIDB_NUM_WORKERS workers.
+        """
+        cache = None
+        if os.path.exists(cache_file):
+            with open(cache_file, 'rb') as fid:
+                cache = cPickle.load(fid)
+            if not isinstance(cache, dict) or cache.get('version') != self.ROIDB_CACHE_VERSION:
+                print '{} ignoring outdated {} cache {}'.format(self.name, what, cache_file)
+                cache = None
+        entries = {} if cache is None else cache['entries']
+
+        stamps = self._roidb_stamps()
+        stale = [index for index in stamps
+                 if index not in entries or entries[index][0] != stamps[index]]
+
+        if cache is not None and len(stale) == 0 and len(entries) == len(stamps):
+            print '{} {} loaded from {}'.format(self.name, what, cache_file)
+            return dict((index, entry) for index, (stamp, entry) in entries.iteritems())
+
+        print '{} building {:d} of {:d} {} entries'.format(self.name, len(stale), len(stamps), what)
+        for index, entry in zip(stale, self._parallel_load(load_fn, stale)):
+            entries[index] = (stamps[index], entry)
+
+        # drop the entries that are no longer in the image set
+        entries = dict((index, entries[index]) for index in stamps)
+        with open(cache_file, 'wb') as fid:
+            cPickle.dump({'version': self.ROIDB_CACHE_VERSION,
+                          'entries': entries}, fid, cPickle.HIGHEST_PROTOCOL)
+        print 'wrote {} to {}'.format(what, cache_file)
+
+        return dict((index, entry) for index, (stamp, entry) in entries.iteritems())
+
+    def cached_roidb(self, load_fn):
+        """
+        Build the roidb with self.<load_fn>(index) for every image index,
+        caching the entries in the data cache directory.
+        """
+        cache_file = os.path.join(self.cache_path, self.name + '_gt_roidb.pkl')
+        entries = self._cached_entries('gt roidb', cache_file, load_fn)
+        return [entries[index] for index in self.image_index]
+
     def evaluate_detections(self, all_boxes, output_dir=None):
         """
         all_boxes is a list of length number-of-classes.
@@ -101,15 +215,38 @@ class imdb(object):
         """
         raise NotImplementedError
 
+    def class_histograms(self):
+        """
+        Return a (num_images, num_classes) array with the number of pixels of
+        each class in the label image of every image index. The histograms
+        are cached like the roidb entries and rebuilt when they are stale.
+        Only imdbs with HAS_CLASS_HISTOGRAMS set implement _class_histogram.
+        """
+        cache_file = os.path.join(self.cache_path, self.name + '_class_histograms.pkl')
+        hists = self._cached_entries('class histograms', cache_file, '_class_histogram')
+        return np.array([hists[index] for index in self.image_index], dtype=np.int64)
+
+    def _class_histogram(self, index):
+        """Return the number of pixels of each class in the label image of an index."""
+        raise NotImplementedError
+
+    def compact_roidb(self):
+        """Store the roidb column by column to reduce its memory footprint."""
+        if not isinstance(self.roidb, ColumnarRoidb):
+            self._roidb = ColumnarRoidb(self.roidb)
+
     def append_flipped_images(self):
+        if isinstance(self.roidb, ColumnarRoidb):
+            self.roidb.append_flipped()
+            self._image_index = self._image_index * 2
+            print 'finish appending flipped images'
+            return
+
         num_images = self.num_images
         for i in xrange(num_images):
-            entry = {'image' : self.roidb[i]['image'],
-                     'depth' : self.roidb[i]['depth'],
-                     'label' : self.roidb[i]['label'],
-                     'meta_data' : self.roidb[i]['meta_data'],
-                     'class_colors' : self.roidb[i]['class_colors'],
-                     'flipped' : True}
+            # keep every key of the original entry, e.g. class_weights and video_id
+            entry = dict(self.roidb[i])
+            entry['flipped'] = True
             self.roidb.append(entry)
         self._image_index = self._image_index * 2
         print 'finish appending flipped images'
@@ -4,11 +4,14 @@ import os
 import datasets
 import datasets.lov
 import datasets.imdb
-import cPickle
 import numpy as np
+from utils.meta_data import meta_data_path
+from utils import profiler
 import cv2
 
 class lov(datasets.imdb):
+    HAS_CLASS_HISTOGRAMS = True
+
     def __init__(self, image_set, lov_path = None):
         datasets.imdb.__init__(self, 'lov_' + image_set)
         self._image_set = image_set
@@ -98,7 +101,7 @@ class lov(datasets.imdb):
         """
         Construct an metadata path from the image's "index" identifier.
         """
-        metadata_path = os.path.join(self._data_path, index + '-meta.mat')
+        metadata_path = meta_data_path(os.path.join(self._data_path, index + '-meta.mat'))
         assert os.path.exists(metadata_path), \
                 'Path does not exist: {}'.format(metadata_path)
         return metadata_path
@@ -122,24 +125,35 @@ class lov(datasets.imdb):
         return os.path.join(datasets.ROOT_DIR, 'data', 'LOV')
 
 
+    def _class_histogram(self, index):
+        """
+        Return the number of pixels of each class in the label image
+        """
+        im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
+        return np.bincount(im.ravel(), minlength=self.num_classes)[:self.num_classes]
+
+
     def compute_class_weights(self):
 
         print 'computing class weights'
         num_classes = self.num_classes
-        count = np.zeros((num_classes,), dtype=np.int64)
-        for index in self.image_index:
-            # label path
-            label_path = self.label_path_from_index(index)
-            im = cv2.imread(label_path, cv2.IMREAD_UNCHANGED)
-            for i in xrange(num_classes):
-                I = np.where(im == i)
-                count[i] += len(I[0])
+        count = self.class_histograms().sum(axis=0)
 
         for i in xrange(num_classes):
             self._class_weights[i] = min(float(count[0]) / float(count[i]), 10.0)
             print self._classes[i], self._class_weights[i]
 
 
+    def roidb_source_files(self, index):
+        """
+        Return the files the roidb entry of an index is built from.
+        """
+        return [os.path.join(self._data_path, index + '-color' + self._image_ext),
+                os.path.join(self._data_path, index + '-depth' + self._image_ext),
+                os.path.join(self._data_path, index + '-label' + self._image_ext),
+                os.path.join(self._data_path, index + '-meta.mat')]
+
+
     def gt_roidb(self):
         """
         Return the database of ground-truth regions of interest.
@@ -147,22 +161,15 @@ class lov(datasets.imdb):
         This function loads/saves from/to a cache file to speed up future calls.
         """
 
-        cache_file = os.path.join(self.cache_path, self.name + '_gt_roidb.pkl')
-        if os.path.exists(cache_file):
-            with open(cache_file, 'rb') as fid:
-                roidb = cPickle.load(fid)
-            print '{} gt roidb loaded from {}'.format(self.name, cache_file)
-            print 'class weights: ', roidb[0]['class_weights']
-            return roidb
-
         # self.compute_class_weights()
 
-        gt_roidb = [self._load_lov_annotation(index)
-                    for index in self.image_index]
+        gt_roidb = self.cached_roidb('_load_lov_annotation')
 
-        with open(cache_file, 'wb') as fid:
-            cPickle.dump(gt_roidb, fid, cPickle.HIGHEST_PROTOCOL)
-        print 'wrote gt roidb to {}'.format(cache_file)
+        # entries built in worker processes hold their own copies of the class constants
+        for entry in gt_roidb:
+            entry['class_colors'] = self._class_colors
+            entry['class_weights'] = self._class_weights
+        print 'class weights: ', self._class_weights
 
         return gt_roidb
 
@@ -253,38 +260,41 @@ class lov(datasets.imdb):
         if not os.path.exists(mat_dir):
             os.makedirs(mat_dir)
 
-        # for each image
-        for im_ind, index in enumerate(self.image_index):
-            # read ground truth labels
-            im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            gt_labels = im.astype(np.float32)
-
-            # predicated labels
-            sg_labels = segmentations[im_ind]['labels']
-
-            hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
-
-            '''
-            # label image
-            rgba = cv2.imread(self.image_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            image = rgba[:,:,:3]
-            alpha = rgba[:,:,3]
-            I = np.where(alpha == 0)
-            image[I[0], I[1], :] = 255
-            label_image = self.labels_to_image(image, sg_labels)
-
-            # save image
-            filename = os.path.join(image_dir, '%04d.png' % im_ind)
-            print filename
-            cv2.imwrite(filename, label_image)
-            '''
-            '''
-            # save matlab result
-            labels = {'labels': sg_labels}
-            filename = os.path.join(mat_dir, '%04d.mat' % im_ind)
-            print filename
-            scipy.io.savemat(filename, labels)
-            #'''
+        with profiler.scope('evaluate_segmentations'):
+            # for each image
+            for im_ind, index in enumerate(self.image_index):
+                # read ground truth labels
+                with profiler.scope('decode'):
+                    im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
+                    gt_labels = im.astype(np.float32)
+
+                # predicated labels
+                sg_labels = segmentations[im_ind]['labels']
+
+                with profiler.scope('histogram'):
+                    hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+
+                '''
+                # label image
+                rgba = cv2.imread(self.image_path_from_index(index), cv2.IMREAD_UNCHANGED)
+                image = rgba[:,:,:3]
+                alpha = rgba[:,:,3]
+                I = np.where(alpha == 0)
+                image[I[0], I[1], :] = 255
+                label_image = self.labels_to_image(image, sg_labels)
+
+                # save image
+                filename = os.path.join(image_dir, '%04d.png' % im_ind)
+                print filename
+                cv2.imwrite(filename, label_image)
+                '''
+                '''
+                # save matlab result
+                labels = {'labels': sg_labels}
+                filename = os.path.join(mat_dir, '%04d.mat' % im_ind)
+                print filename
+                scipy.io.savemat(filename, labels)
+                #'''
 
         # overall accuracy
         acc = np.diag(hist).sum() / hist.sum()
@@ -5,8 +5,8 @@ import datasets
 import datasets.rgbd_scenes
 import datasets.imdb
 import numpy as np
+from utils.meta_data import meta_data_path
 import subprocess
-import cPickle
 
 class rgbd_scenes(datasets.imdb):
     def __init__(self, image_set, rgbd_scenes_path=None):
@@ -69,7 +69,7 @@ class rgbd_scenes(datasets.imdb):
         Construct an metadata path from the image's "index" identifier.
         """
 
-        metadata_path = os.path.join(self._data_path, index + '-meta.mat')
+        metadata_path = meta_data_path(os.path.join(self._data_path, index + '-meta.mat'))
         return metadata_path
 
     def _load_image_set_index(self):
@@ -91,6 +91,15 @@ class rgbd_scenes(datasets.imdb):
         return os.path.join(datasets.ROOT_DIR, 'data', 'RGBD_Scenes', 'rgbd-scenes-v2')
 
 
+    def roidb_source_files(self, index):
+        """
+        Return the files the roidb entry of an index is built from.
+        """
+        return [os.path.join(self._data_path, index + '-color' + self._image_ext),
+                os.path.join(self._data_path, index + '-depth' + self._image_ext),
+                os.path.join(self._data_path, index + '-meta.mat')]
+
+
     def gt_roidb(self):
         """
         Return the database of ground-truth regions of interest.
@@ -98,21 +107,7 @@ class rgbd_scenes(datasets.imdb):
         This function loads/saves from/to a cache file to speed up future calls.
         """
 
-        cache_file = os.path.join(self.cache_path, self.name + '_gt_roidb.pkl')
-        if os.path.exists(cache_file):
-            with open(cache_file, 'rb') as fid:
-                roidb = cPickle.load(fid)
-            print '{} gt roidb loaded from {}'.format(self.name, cache_file)
-            return roidb
-
-        gt_roidb = [self._load_rgbd_scenes_annotation(index)
-                    for index in self.image_index]
-
-        with open(cache_file, 'wb') as fid:
-            cPickle.dump(gt_roidb, fid, cPickle.HIGHEST_PROTOCOL)
-        print 'wrote gt roidb to {}'.format(cache_file)
-
-        return gt_roidb
+        return self.cached_roidb('_load_rgbd_scenes_annotation')
 
 
     def _load_rgbd_scenes_annotation(self, index):
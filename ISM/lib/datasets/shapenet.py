@@ -5,8 +5,9 @@ import datasets
 import datasets.shapenet
 import datasets.imdb
 import numpy as np
+from utils.meta_data import meta_data_path
+from utils.depth_io import read_depth
 import subprocess
-import cPickle
 import cv2
 import PIL
 from utils.cython_bbox import bbox_overlaps
@@ -139,7 +140,7 @@ class shapenet(datasets.imdb):
         Construct an metadata path from the image's "index" identifier.
         """
 
-        metadata_path = os.path.join(self._data_path, index + '_meta.mat')
+        metadata_path = meta_data_path(os.path.join(self._data_path, index + '_meta.mat'))
         assert os.path.exists(metadata_path), \
                 'Path does not exist: {}'.format(metadata_path)
         return metadata_path
@@ -163,6 +164,15 @@ class shapenet(datasets.imdb):
         return os.path.join(datasets.ROOT_DIR, 'data', 'ShapeNet')
 
 
+    def roidb_source_files(self, index):
+        """
+        Return the files the roidb entry of an index is built from.
+        """
+        return [os.path.join(self._data_path, index + '_bkgd' + self._image_ext),
+                os.path.join(self._data_path, index + '_depth' + self._image_ext),
+                os.path.join(self._data_path, index + '_meta.mat')]
+
+
     def gt_roidb(self):
         """
         Return the database of ground-truth regions of interest.
@@ -170,15 +180,18 @@ class shapenet(datasets.imdb):
         This function loads/saves from/to a cache file to speed up future calls.
         """
 
-        cache_file = os.path.join(self.cache_path, self.name + '_gt_roidb.pkl')
-        if os.path.exists(cache_file):
-            with open(cache_file, 'rb') as fid:
-                roidb = cPickle.load(fid)
-            print '{} gt roidb loaded from {}'.format(self.name, cache_file)
-            return roidb
+        gt_roidb = self.cached_roidb('_load_shapenet_annotation')
 
-        gt_roidb = [self._load_shapenet_annotation(index)
-                    for index in self.image_index]
+        # statistics for computing recall, gathered here since the entries
+        # may have been built in worker processes
+        self._num_boxes_all[:] = 0
+        self._num_boxes_covered[:] = 0
+        for entry in gt_roidb:
+            gt_classes = entry['gt_classes']
+            covered = entry['boxes_covered']
+            for i in xrange(self.num_classes):
+                self._num_boxes_all[i] += len(np.where(gt_classes == i)[0])
+                self._num_boxes_covered[i] += len(np.where(gt_classes[covered] == i)[0])
 
         # print out recall
         for i in xrange(1, self.num_classes):
@@ -186,10 +199,6 @@ class shapenet(datasets.imdb):
             print '{}: Number of boxes covered {:d}'.format(self.classes[i], self._num_boxes_covered[i])
             print '{}: Recall {:f}'.format(self.classes[i], float(self._num_boxes_covered[i]) / float(self._num_boxes_all[i]))
 
-        with open(cache_file, 'wb') as fid:
-            cPickle.dump(gt_roidb, fid, cPickle.HIGHEST_PROTOCOL)
-        print 'wrote gt roidb to {}'.format(cache_file)
-
         return gt_roidb
 
 
@@ -217,7 +226,7 @@ class shapenet(datasets.imdb):
         gt_classes = np.zeros((num_objs), dtype=np.int32)
 
         # read depth image
-        im = cv2.imread(depth_path, cv2.IMREAD_UNCHANGED)
+        im = read_depth(depth_path)
         index_depth = np.where(im > 0)
         x1 = np.min(index_depth[1])
         y1 = np.min(index_depth[0])
@@ -275,22 +284,18 @@ class shapenet(datasets.imdb):
         overlaps_grid = bbox_overlaps(all_anchors.astype(np.float), gt_boxes.astype(np.float))
         
         # check how many gt boxes are covered by anchors
+        boxes_covered = np.zeros((num_objs), dtype=np.bool)
         if num_objs != 0:
             max_overlaps = overlaps_grid.max(axis = 0)
-            fg_inds = []
             for k in xrange(1, self.num_classes):
-                fg_inds.extend(np.where((gt_classes == k) & (max_overlaps >= cfg.TRAIN.FG_THRESH[k-1]))[0])
+                boxes_covered[(gt_classes == k) & (max_overlaps >= cfg.TRAIN.FG_THRESH[k-1])] = True
 
-            for i in xrange(self.num_classes):
-                self._num_boxes_all[i] += len(np.where(gt_classes == i)[0])
-                self._num_boxes_covered[i] += len(np.where(gt_classes[fg_inds] == i)[0])
-
-        
         return {'image': image_path,
                 'depth': depth_path,
                 'meta_data': metadata_path,
                 'boxes': boxes,
                 'gt_classes': gt_classes,
+                'boxes_covered': boxes_covered,
                 'flipped': False}
 
 
@@ -4,11 +4,14 @@ import os
 import datasets
 import datasets.shapenet_scene
 import datasets.imdb
-import cPickle
 import numpy as np
+from utils.meta_data import meta_data_path
+from utils import profiler
 import cv2
 
 class shapenet_scene(datasets.imdb):
+    HAS_CLASS_HISTOGRAMS = True
+
     def __init__(self, image_set, shapenet_scene_path = None):
         datasets.imdb.__init__(self, 'shapenet_scene_' + image_set)
         self._image_set = image_set
@@ -90,7 +93,7 @@ class shapenet_scene(datasets.imdb):
         Construct an metadata path from the image's "index" identifier.
         """
 
-        metadata_path = os.path.join(self._data_path, index + '_meta.mat')
+        metadata_path = meta_data_path(os.path.join(self._data_path, index + '_meta.mat'))
         assert os.path.exists(metadata_path), \
                 'Path does not exist: {}'.format(metadata_path)
         return metadata_path
@@ -114,6 +117,16 @@ class shapenet_scene(datasets.imdb):
         return os.path.join(datasets.ROOT_DIR, 'data', 'ShapeNetScene')
 
 
+    def roidb_source_files(self, index):
+        """
+        Return the files the roidb entry of an index is built from.
+        """
+        return [os.path.join(self._data_path, index + '_rgba' + self._image_ext),
+                os.path.join(self._data_path, index + '_depth' + self._image_ext),
+                os.path.join(self._data_path, index + '_label' + self._image_ext),
+                os.path.join(self._data_path, index + '_meta.mat')]
+
+
     def gt_roidb(self):
         """
         Return the database of ground-truth regions of interest.
@@ -121,19 +134,11 @@ class shapenet_scene(datasets.imdb):
         This function loads/saves from/to a cache file to speed up future calls.
         """
 
-        cache_file = os.path.join(self.cache_path, self.name + '_gt_roidb.pkl')
-        if os.path.exists(cache_file):
-            with open(cache_file, 'rb') as fid:
-                roidb = cPickle.load(fid)
-            print '{} gt roidb loaded from {}'.format(self.name, cache_file)
-            return roidb
+        gt_roidb = self.cached_roidb('_load_shapenet_scene_annotation')
 
-        gt_roidb = [self._load_shapenet_scene_annotation(index)
-                    for index in self.image_index]
-
-        with open(cache_file, 'wb') as fid:
-            cPickle.dump(gt_roidb, fid, cPickle.HIGHEST_PROTOCOL)
-        print 'wrote gt roidb to {}'.format(cache_file)
+        # entries built in worker processes hold their own copies of the class colors
+        for entry in gt_roidb:
+            entry['class_colors'] = self._class_colors
 
         return gt_roidb
 
@@ -181,22 +186,34 @@ class shapenet_scene(datasets.imdb):
         return label_index
 
 
+    def _class_histogram(self, index):
+        """
+        Return the number of pixels of each class in the label image
+        """
+        im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
+        labels = self._process_label_image(im).astype(np.int64)
+        return np.bincount(labels.ravel(), minlength=self.num_classes)[:self.num_classes]
+
+
     def evaluate_segmentations(self, segmentations, output_dir):
         print 'evaluating segmentations'
         # compute histogram
         n_cl = self.num_classes
         hist = np.zeros((n_cl, n_cl))
 
-        # for each image
-        for im_ind, index in enumerate(self.image_index):
-            # read ground truth labels
-            im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
-            gt_labels = self._process_label_image(im)
+        with profiler.scope('evaluate_segmentations'):
+            # for each image
+            for im_ind, index in enumerate(self.image_index):
+                # read ground truth labels
+                with profiler.scope('decode'):
+                    im = cv2.imread(self.label_path_from_index(index), cv2.IMREAD_UNCHANGED)
+                    gt_labels = self._process_label_image(im)
 
-            # predicated labels
-            sg_labels = segmentations[im_ind]['labels']
+                # predicated labels
+                sg_labels = segmentations[im_ind]['labels']
 
-            hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
+                with profiler.scope('histogram'):
+                    hist += self.fast_hist(gt_labels.flatten(), sg_labels.flatten(), n_cl)
 
         # overall accuracy
         acc = np.diag(hist).sum() / hist.sum()
@@ -14,6 +14,7 @@ import caffe
 from ism.config import cfg
 from gt_data_layer.minibatch import get_minibatch
 import numpy as np
+from utils.sampler import get_sampler, get_minibatch_db
 import yaml
 from multiprocessing import Process, Queue
 
@@ -27,6 +28,9 @@ class GtDataLayer(caffe.Layer):
 
     def _get_next_minibatch_inds(self):
         """Return the roidb indices for the next minibatch."""
+        if self._sampler is not None:
+            return self._sampler.next_minibatch_inds()
+
         if self._cur + cfg.TRAIN.IMS_PER_BATCH >= len(self._roidb):
             self._shuffle_roidb_inds()
 
@@ -38,13 +42,32 @@ class GtDataLayer(caffe.Layer):
     def _get_next_minibatch(self):
         """Return the blobs to be used for the next minibatch."""
         db_inds = self._get_next_minibatch_inds()
-        minibatch_db = [self._roidb[i] for i in db_inds]
+        self._db_inds = db_inds
+        minibatch_db = get_minibatch_db(self._roidb, db_inds, cfg.TRAIN.RANDOM_FLIP)
         return get_minibatch(minibatch_db, self._num_classes)
 
+    def set_loss_blobs(self, loss_blobs):
+        """Feed the losses in these blobs back to the sampler."""
+        self._loss_blobs = loss_blobs
+
+    def _update_losses(self):
+        """Feed the loss of the previous minibatch back to the sampler.
+
+        forward runs once for every micro-batch of a solver step, and the
+        loss blobs still hold the loss of the previous one, so with
+        ITER_SIZE > 1 every micro-batch gets its own loss.
+        """
+        if self._loss_blobs and self._db_inds is not None:
+            loss = sum(float(blob.data) for blob in self._loss_blobs)
+            self._sampler.update_losses(self._db_inds, loss)
+
     # this function is called in training the net
     def set_roidb(self, roidb):
         """Set the roidb to be used by this layer during training."""
         self._roidb = roidb
+        self._sampler = get_sampler(roidb, cfg.TRAIN)
+        self._loss_blobs = None
+        self._db_inds = None
         self._shuffle_roidb_inds()
 
     def setup(self, bottom, top):
@@ -92,6 +115,7 @@ class GtDataLayer(caffe.Layer):
             
     def forward(self, bottom, top):
         """Get blobs and copy them into this layer's top blob vector."""
+        self._update_losses()
         blobs = self._get_next_minibatch()
 
         for blob_name, blob in blobs.iteritems():
@@ -12,7 +12,8 @@ import numpy.random as npr
 import cv2
 from ism.config import cfg
 from utils.blob import prep_im_for_blob, im_list_to_blob
-import scipy.io
+from utils.meta_data import load_meta_data
+from utils.depth_io import read_depth
 
 def get_minibatch(roidb, num_classes):
     """Given a roidb, construct a minibatch sampled from it."""
@@ -73,7 +74,7 @@ def _get_image_blob(roidb, scale_ind):
         processed_ims.append(im)
 
         # depth
-        im_depth = cv2.imread(roidb[i]['depth'], cv2.IMREAD_UNCHANGED).astype(np.float32)
+        im_depth = read_depth(roidb[i]['depth']).astype(np.float32)
         im_depth = im_depth / im_depth.max() * 255
         im_depth = np.tile(im_depth[:,:,np.newaxis], (1,1,3))
         if roidb[i]['flipped']:
@@ -204,7 +205,7 @@ def _get_label_blob(roidb, im_scales, num_classes):
 
     for i in xrange(num_images):
         # read depth image
-        im = cv2.imread(roidb[i]['depth'], cv2.IMREAD_UNCHANGED)
+        im = read_depth(roidb[i]['depth'])
         if roidb[i]['flipped']:
             im = im[:, ::-1]
 
@@ -219,7 +220,7 @@ def _get_label_blob(roidb, im_scales, num_classes):
         im_cls = gt_class * im_mask
 
         # load meta data
-        meta_data = scipy.io.loadmat(roidb[i]['meta_data'])
+        meta_data = load_meta_data(roidb[i]['meta_data'])
 
         # compute target
         width = im_mask.shape[1]
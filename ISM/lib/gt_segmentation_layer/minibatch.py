@@ -13,6 +13,7 @@ import numpy.random as npr
 import cv2
 from ism.config import cfg
 from utils.blob import prep_im_for_blob, im_list_to_blob
+from utils.depth_io import read_depth
 import scipy.io
 from utils.cython_bbox import bbox_overlaps
 
@@ -66,7 +67,7 @@ def _get_image_blob(roidb, scale_ind):
         processed_ims.append(im)
 
         # depth
-        im_depth = cv2.imread(roidb[i]['depth'], cv2.IMREAD_UNCHANGED).astype(np.float32)
+        im_depth = read_depth(roidb[i]['depth']).astype(np.float32)
         im_depth = im_depth / im_depth.max() * 255
         im_depth = np.tile(im_depth[:,:,np.newaxis], (1,1,3))
         if roidb[i]['flipped']:
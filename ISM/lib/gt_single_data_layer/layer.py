@@ -10,8 +10,9 @@
 
 import caffe
 from ism.config import cfg
-from gt_single_data_layer.minibatch import get_minibatch
+from gt_single_data_layer.minibatch import get_minibatch, expand_vertex_targets
 import numpy as np
+from utils.sampler import get_sampler, get_minibatch_db
 import yaml
 from utils.voxelizer import Voxelizer
 
@@ -25,6 +26,9 @@ class GtSingleDataLayer(caffe.Layer):
 
     def _get_next_minibatch_inds(self):
         """Return the roidb indices for the next minibatch."""
+        if self._sampler is not None:
+            return self._sampler.next_minibatch_inds()
+
         if self._cur + cfg.TRAIN.IMS_PER_BATCH >= len(self._roidb):
             self._shuffle_roidb_inds()
 
@@ -36,13 +40,32 @@ class GtSingleDataLayer(caffe.Layer):
     def _get_next_minibatch(self):
         """Return the blobs to be used for the next minibatch."""
         db_inds = self._get_next_minibatch_inds()
-        minibatch_db = [self._roidb[i] for i in db_inds]
+        self._db_inds = db_inds
+        minibatch_db = get_minibatch_db(self._roidb, db_inds, cfg.TRAIN.RANDOM_FLIP)
         return get_minibatch(minibatch_db, self._voxelizer)
 
+    def set_loss_blobs(self, loss_blobs):
+        """Feed the losses in these blobs back to the sampler."""
+        self._loss_blobs = loss_blobs
+
+    def _update_losses(self):
+        """Feed the loss of the previous minibatch back to the sampler.
+
+        forward runs once for every micro-batch of a solver step, and the
+        loss blobs still hold the loss of the previous one, so with
+        ITER_SIZE > 1 every micro-batch gets its own loss.
+        """
+        if self._loss_blobs and self._db_inds is not None:
+            loss = sum(float(blob.data) for blob in self._loss_blobs)
+            self._sampler.update_losses(self._db_inds, loss)
+
     # this function is called in training the net
     def set_roidb(self, roidb):
         """Set the roidb to be used by this layer during training."""
         self._roidb = roidb
+        self._sampler = get_sampler(roidb, cfg.TRAIN)
+        self._loss_blobs = None
+        self._db_inds = None
         self._shuffle_roidb_inds()
 
     def setup(self, bottom, top):
@@ -87,8 +110,20 @@ class GtSingleDataLayer(caffe.Layer):
             
     def forward(self, bottom, top):
         """Get blobs and copy them into this layer's top blob vector."""
+        self._update_losses()
         blobs = self._get_next_minibatch()
 
+        if cfg.TRAIN.VERTEX_REG:
+            # expand the compact vertex targets directly into the tops
+            vertex_targets = blobs.pop('data_vertex_targets')
+            vertex_classes = blobs.pop('data_vertex_classes')
+            num, _, height, width = vertex_targets.shape
+            for blob_name in ['data_vertex_targets', 'data_vertex_weights']:
+                top[self._name_to_top_map[blob_name]].reshape(num, 3 * self._num_classes, height, width)
+            expand_vertex_targets(vertex_targets, vertex_classes,
+                                  top[self._name_to_top_map['data_vertex_targets']].data,
+                                  top[self._name_to_top_map['data_vertex_weights']].data)
+
         for blob_name, blob in blobs.iteritems():
             top_ind = self._name_to_top_map[blob_name]
             # Reshape net's input blobs
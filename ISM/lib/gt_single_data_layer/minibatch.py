@@ -14,44 +14,63 @@ import cv2
 from ism.config import cfg
 from utils.blob import im_list_to_blob, pad_im, chromatic_transform
 from utils.se3 import *
-import scipy.io
-from normals import gpu_normals
+from utils.meta_data import load_meta_data
+from utils.depth_io import read_depths
+from utils.color_augmentation import chromatic_transform_images
+from utils.geometric_augmentation import sample_affine, scale_affine, scaled_shape, warp_input, warp_nearest, warp_intrinsics
+from utils import profiler
+from ism.normals_wrapper import compute_normals
 
 def get_minibatch(roidb, voxelizer):
     """Given a roidb, construct a minibatch sampled from it."""
-    num_images = len(roidb)
+    with profiler.scope('minibatch'):
+        num_images = len(roidb)
+
+        # Get the input image blob, formatted for tensorflow
+        random_scale_ind = npr.randint(0, high=len(cfg.TRAIN.SCALES_BASE))
+        # the depth images are read once for both blobs
+        with profiler.scope('decode'):
+            ims_depth = read_depths([r['depth'] for r in roidb])
+        # all blobs are built from the padded images
+        ims_depth = [pad_im(im_depth, 16) for im_depth in ims_depth]
+
+        # one affine transform per image about the center of the padded image, shared by both blobs
+        if cfg.TRAIN.AFFINE:
+            transforms = [sample_affine(*im_depth.shape[:2]) for im_depth in ims_depth]
+        else:
+            transforms = [None] * num_images
 
-    # Get the input image blob, formatted for tensorflow
-    random_scale_ind = npr.randint(0, high=len(cfg.TRAIN.SCALES_BASE))
-    im_blob, im_depth_blob, im_normal_blob, im_scales = _get_image_blob(roidb, random_scale_ind)
+        im_blob, im_depth_blob, im_normal_blob, im_scales = _get_image_blob(roidb, ims_depth, transforms, random_scale_ind)
 
-    # build the label blob
-    depth_blob, label_blob, meta_data_blob, vertex_target_blob, vertex_weight_blob = _get_label_blob(roidb, voxelizer)
+        # build the label blob
+        depth_blob, label_blob, meta_data_blob, vertex_target_blob, vertex_class_blob = \
+            _get_label_blob(roidb, ims_depth, transforms, voxelizer)
 
-    # For debug visualizations
-    if cfg.TRAIN.VISUALIZE:
-        _vis_minibatch(im_blob, im_depth_blob, depth_blob, label_blob, vertex_target_blob, voxelizer.num_classes)
+        # For debug visualizations
+        if cfg.TRAIN.VISUALIZE:
+            _vis_minibatch(im_blob, im_depth_blob, depth_blob, label_blob, vertex_target_blob)
 
-    if cfg.TRAIN.VERTEX_REG:
-        blobs = {'data_image_color': im_blob,
-             'data_image_depth': im_depth_blob,
-             'data_image_normal': im_normal_blob,
-             'data_label': label_blob,
-             'data_depth': depth_blob,
-             'data_meta_data': meta_data_blob,
-             'data_vertex_targets': vertex_target_blob,
-             'data_vertex_weights': vertex_weight_blob}
-    else:
-        blobs = {'data_image_color': im_blob,
-             'data_image_depth': im_depth_blob,
-             'data_image_normal': im_normal_blob,
-             'data_label': label_blob,
-             'data_depth': depth_blob,
-             'data_meta_data': meta_data_blob}
+        if cfg.TRAIN.VERTEX_REG:
+            # compact vertex targets, expanded by the data layer with expand_vertex_targets
+            blobs = {'data_image_color': im_blob,
+                 'data_image_depth': im_depth_blob,
+                 'data_image_normal': im_normal_blob,
+                 'data_label': label_blob,
+                 'data_depth': depth_blob,
+                 'data_meta_data': meta_data_blob,
+                 'data_vertex_targets': vertex_target_blob,
+                 'data_vertex_classes': vertex_class_blob}
+        else:
+            blobs = {'data_image_color': im_blob,
+                 'data_image_depth': im_depth_blob,
+                 'data_image_normal': im_normal_blob,
+                 'data_label': label_blob,
+                 'data_depth': depth_blob,
+                 'data_meta_data': meta_data_blob}
 
-    return blobs
+        return blobs
 
-def _get_image_blob(roidb, scale_ind):
+def _get_image_blob(roidb, ims_depth, transforms, scale_ind):
     """Builds an input blob from the images in the roidb at the specified
     scales.
     """
@@ -60,9 +79,33 @@ def _get_image_blob(roidb, scale_ind):
     processed_ims_depth = []
     processed_ims_normal = []
     im_scales = []
+
+    # rgba
+    ims = []
+    for i in xrange(num_images):
+        with profiler.scope('decode'):
+            rgba = pad_im(cv2.imread(roidb[i]['image'], cv2.IMREAD_UNCHANGED), 16)
+        if rgba.shape[2] == 4:
+            im = np.copy(rgba[:,:,:3])
+            alpha = rgba[:,:,3]
+            I = np.where(alpha == 0)
+            im[I[0], I[1], :] = 255
+        else:
+            im = rgba
+        ims.append(im)
+
+    # chromatic transform
+    if cfg.TRAIN.CHROMATIC:
+        with profiler.scope('chromatic'):
+            if cfg.TRAIN.CHROMATIC_BATCH:
+                ims = chromatic_transform_images(ims)
+            else:
+                ims = [chromatic_transform(im) for im in ims]
+
     for i in xrange(num_images):
         # meta data
-        meta_data = scipy.io.loadmat(roidb[i]['meta_data'])
+        with profiler.scope('meta_data'):
+            meta_data = load_meta_data(roidb[i]['meta_data'])
         K = meta_data['intrinsic_matrix'].astype(np.float32, copy=True)
         fx = K[0, 0]
         fy = K[1, 1]
@@ -70,23 +113,18 @@ def _get_image_blob(roidb, scale_ind):
         cy = K[1, 2]
 
         # depth raw
-        im_depth_raw = pad_im(cv2.imread(roidb[i]['depth'], cv2.IMREAD_UNCHANGED), 16)
+        im_depth_raw = ims_depth[i]
         height = im_depth_raw.shape[0]
         width = im_depth_raw.shape[1]
+        im = ims[i]
 
-        # rgba
-        rgba = pad_im(cv2.imread(roidb[i]['image'], cv2.IMREAD_UNCHANGED), 16)
-        if rgba.shape[2] == 4:
-            im = np.copy(rgba[:,:,:3])
-            alpha = rgba[:,:,3]
-            I = np.where(alpha == 0)
-            im[I[0], I[1], :] = 255
-        else:
-            im = rgba
-
-        # chromatic transform
-        if cfg.TRAIN.CHROMATIC:
-            im = chromatic_transform(im)
+        im_scale = cfg.TRAIN.SCALES_BASE[scale_ind]
+        im_scales.append(im_scale)
+        A = transforms[i]
+        if A is not None:
+            # the scale is folded into the transform, every input is warped once
+            A = scale_affine(A, im_scale)
+            shape = scaled_shape(height, width, im_scale)
 
         # mask the color image according to depth
         if cfg.EXP_DIR == 'rgbd_scene':
@@ -95,44 +133,55 @@ def _get_image_blob(roidb, scale_ind):
 
         if roidb[i]['flipped']:
             im = im[:, ::-1, :]
-
-        im_orig = im.astype(np.float32, copy=True)
-        im_orig -= cfg.PIXEL_MEANS
-        im_scale = cfg.TRAIN.SCALES_BASE[scale_ind]
-        im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
-        im_scales.append(im_scale)
+        if A is not None:
+            with profiler.scope('warp'):
+                im = warp_input(im, A, shape, cfg.PIXEL_MEANS.ravel())
+        else:
+            with profiler.scope('resize'):
+                im_orig = im.astype(np.float32, copy=True)
+                im_orig -= cfg.PIXEL_MEANS
+                im = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         processed_ims.append(im)
 
         # depth
         im_depth = im_depth_raw.astype(np.float32, copy=True) / float(im_depth_raw.max()) * 255
-        im_depth = np.tile(im_depth[:,:,np.newaxis], (1,1,3))
-
         if roidb[i]['flipped']:
             im_depth = im_depth[:, ::-1]
-
-        im_orig = im_depth.astype(np.float32, copy=True)
-        im_orig -= cfg.PIXEL_MEANS
-        im_depth = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        if A is not None:
+            with profiler.scope('warp'):
+                im_depth = warp_input(im_depth, A, shape, nearest=True)
+        else:
+            with profiler.scope('resize'):
+                im_depth = np.tile(im_depth[:,:,np.newaxis], (1,1,3))
+                im_orig = im_depth.astype(np.float32, copy=True)
+                im_orig -= cfg.PIXEL_MEANS
+                im_depth = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         processed_ims_depth.append(im_depth)
 
         # normals
-        depth = im_depth_raw.astype(np.float32, copy=True) / float(meta_data['factor_depth'])
-        nmap = gpu_normals.gpu_normals(depth, fx, fy, cx, cy, 20.0, cfg.GPU_ID)
-        im_normal = 127.5 * nmap + 127.5
-        im_normal = im_normal.astype(np.uint8)
-        im_normal = im_normal[:, :, (2, 1, 0)]
+        with profiler.scope('normals'):
+            depth = im_depth_raw.astype(np.float32, copy=True) / float(meta_data['factor_depth'])
+            nmap = compute_normals(depth, fx, fy, cx, cy, 20.0)
+            im_normal = 127.5 * nmap + 127.5
+            im_normal = im_normal.astype(np.uint8)
+            im_normal = im_normal[:, :, (2, 1, 0)]
         if roidb[i]['flipped']:
             im_normal = im_normal[:, ::-1, :]
-
-        im_orig = im_normal.astype(np.float32, copy=True)
-        im_orig -= cfg.PIXEL_MEANS
-        im_normal = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
+        if A is not None:
+            with profiler.scope('warp'):
+                im_normal = warp_input(im_normal, A, shape, cfg.PIXEL_MEANS.ravel())
+        else:
+            with profiler.scope('resize'):
+                im_orig = im_normal.astype(np.float32, copy=True)
+                im_orig -= cfg.PIXEL_MEANS
+                im_normal = cv2.resize(im_orig, None, None, fx=im_scale, fy=im_scale, interpolation=cv2.INTER_LINEAR)
         processed_ims_normal.append(im_normal)
 
     # Create a blob to hold the input images
-    blob = im_list_to_blob(processed_ims, 3)
-    blob_depth = im_list_to_blob(processed_ims_depth, 3)
-    blob_normal = im_list_to_blob(processed_ims_normal, 3)
+    with profiler.scope('blob'):
+        blob = im_list_to_blob(processed_ims, 3)
+        blob_depth = im_list_to_blob(processed_ims_depth, 3)
+        blob_normal = im_list_to_blob(processed_ims_normal, 3)
 
     return blob, blob_depth, blob_normal, im_scales
 
@@ -162,7 +211,7 @@ def _process_label_image(label_image, class_colors, class_weights):
     return label_index
 
 
-def _get_label_blob(roidb, voxelizer):
+def _get_label_blob(roidb, ims_depth, transforms, voxelizer):
     """ build the label blob """
 
     num_images = len(roidb)
@@ -172,15 +221,20 @@ def _get_label_blob(roidb, voxelizer):
     processed_meta_data = []
     if cfg.TRAIN.VERTEX_REG:
         processed_vertex_targets = []
-        processed_vertex_weights = []
+        processed_vertex_classes = []
 
     for i in xrange(num_images):
         # load meta data
-        meta_data = scipy.io.loadmat(roidb[i]['meta_data'])
-        im_depth = pad_im(cv2.imread(roidb[i]['depth'], cv2.IMREAD_UNCHANGED), 16)
+        with profiler.scope('meta_data'):
+            meta_data = load_meta_data(roidb[i]['meta_data'])
+        im_depth = ims_depth[i]
+        A = transforms[i]
+        if A is not None:
+            meta_data['intrinsic_matrix'] = warp_intrinsics(meta_data['intrinsic_matrix'], A)
 
         # read label image
-        im = pad_im(cv2.imread(roidb[i]['label'], cv2.IMREAD_UNCHANGED), 16)
+        with profiler.scope('decode'):
+            im = pad_im(cv2.imread(roidb[i]['label'], cv2.IMREAD_UNCHANGED), 16)
         height = im.shape[0]
         width = im.shape[1]
         # mask the label image according to depth
@@ -195,28 +249,42 @@ def _get_label_blob(roidb, voxelizer):
                 im = im[:, ::-1]
             else:
                 im = im[:, ::-1, :]
-        im_cls = _process_label_image(im, roidb[i]['class_colors'], roidb[i]['class_weights'])
+        if A is not None:
+            with profiler.scope('warp'):
+                im = warp_nearest(im, A)
+        with profiler.scope('label'):
+            im_cls = _process_label_image(im, roidb[i]['class_colors'], roidb[i]['class_weights'])
         processed_label.append(im_cls)
 
         # vertex regression targets and weights
         if cfg.TRAIN.VERTEX_REG:
-            vertmap = meta_data['vertmap']
+            vertmap = pad_im(meta_data['vertmap'], 16)
             if roidb[i]['flipped']:
                 vertmap = vertmap[:, ::-1, :]
-            vertex_targets, vertex_weights = _get_vertex_regression_labels(im, vertmap, num_classes)
+            if A is not None:
+                with profiler.scope('warp'):
+                    vertmap = warp_nearest(vertmap, A)
+            # color label images use the class index matched from the colors
+            im_label = im if len(im.shape) == 2 else im_cls[:, :, 0]
+            with profiler.scope('vertex_targets'):
+                vertex_targets, vertex_classes = _get_vertex_regression_labels(im_label, vertmap, num_classes)
             processed_vertex_targets.append(vertex_targets)
-            processed_vertex_weights.append(vertex_weights)
+            processed_vertex_classes.append(vertex_classes)
 
         # depth
         if roidb[i]['flipped']:
             im_depth = im_depth[:, ::-1]
+        if A is not None:
+            with profiler.scope('warp'):
+                im_depth = warp_nearest(im_depth, A)
         depth = im_depth.astype(np.float32, copy=True) / float(meta_data['factor_depth'])
         processed_depth.append(depth)
 
         # voxelization
-        points = voxelizer.backproject_camera(im_depth, meta_data)
-        voxelizer.voxelized = False
-        voxelizer.voxelize(points)
+        with profiler.scope('voxelize'):
+            points = voxelizer.backproject_camera(im_depth, meta_data)
+            voxelizer.voxelized = False
+            voxelizer.voxelize(points)
         RT_world = meta_data['rotation_translation_matrix']
 
         # compute camera poses
@@ -254,35 +322,35 @@ def _get_label_blob(roidb, voxelizer):
         processed_meta_data.append(mdata)
 
     # construct the blobs
-    height = processed_depth[0].shape[0]
-    width = processed_depth[0].shape[1]
-    depth_blob = np.zeros((num_images, height, width, 1), dtype=np.float32)
-    label_blob = np.zeros((num_images, height, width, 1), dtype=np.float32)
-    meta_data_blob = np.zeros((num_images, 1, 1, 48), dtype=np.float32)
-    if cfg.TRAIN.VERTEX_REG:
-        vertex_target_blob = np.zeros((num_images, height, width, 3 * num_classes), dtype=np.float32)
-        vertex_weight_blob = np.zeros((num_images, height, width, 3 * num_classes), dtype=np.float32)
-    else:
-        vertex_target_blob = []
-        vertex_weight_blob = []
-
-    for i in xrange(num_images):
-        depth_blob[i,:,:,0] = processed_depth[i]
-        label_blob[i,:,:,:] = processed_label[i]
-        meta_data_blob[i,0,0,:] = processed_meta_data[i]
+    with profiler.scope('blob'):
+        height = processed_depth[0].shape[0]
+        width = processed_depth[0].shape[1]
+        depth_blob = np.zeros((num_images, height, width, 1), dtype=np.float32)
+        label_blob = np.zeros((num_images, height, width, 1), dtype=np.float32)
+        meta_data_blob = np.zeros((num_images, 1, 1, 48), dtype=np.float32)
         if cfg.TRAIN.VERTEX_REG:
-            vertex_target_blob[i,:,:,:] = processed_vertex_targets[i]
-            vertex_weight_blob[i,:,:,:] = processed_vertex_weights[i]
+            vertex_target_blob = np.zeros((num_images, height, width, 3), dtype=np.float32)
+            vertex_class_blob = np.zeros((num_images, height, width), dtype=np.int32)
+        else:
+            vertex_target_blob = []
+            vertex_class_blob = []
+
+        for i in xrange(num_images):
+            depth_blob[i,:,:,0] = processed_depth[i]
+            label_blob[i,:,:,:] = processed_label[i]
+            meta_data_blob[i,0,0,:] = processed_meta_data[i]
+            if cfg.TRAIN.VERTEX_REG:
+                vertex_target_blob[i,:,:,:] = processed_vertex_targets[i]
+                vertex_class_blob[i,:,:] = processed_vertex_classes[i]
+
+        channel_swap = (0, 3, 1, 2)
+        depth_blob = depth_blob.transpose(channel_swap)
+        label_blob = label_blob.transpose(channel_swap)
+        meta_data_blob = meta_data_blob.transpose(channel_swap)
+        if cfg.TRAIN.VERTEX_REG:
+            vertex_target_blob = vertex_target_blob.transpose(channel_swap)
 
-    channel_swap = (0, 3, 1, 2)
-    depth_blob = depth_blob.transpose(channel_swap)
-    label_blob = label_blob.transpose(channel_swap)
-    meta_data_blob = meta_data_blob.transpose(channel_swap)
-    if cfg.TRAIN.VERTEX_REG:
-        vertex_target_blob = vertex_target_blob.transpose(channel_swap)
-        vertex_weight_blob = vertex_weight_blob.transpose(channel_swap)
-    
-    return depth_blob, label_blob, meta_data_blob, vertex_target_blob, vertex_weight_blob
+    return depth_blob, label_blob, meta_data_blob, vertex_target_blob, vertex_class_blob
 
 
 # compute the voting label image in 2D
@@ -312,23 +380,39 @@ def _vote_centers(im_label, num_classes):
 
 
 def _get_vertex_regression_labels(im_label, vertmap, num_classes):
-    height = im_label.shape[0]
-    width = im_label.shape[1]
-    vertex_targets = np.zeros((height, width, 3*num_classes), dtype=np.float32)
-    vertex_weights = np.zeros(vertex_targets.shape, dtype=np.float32)
-    
-    for i in xrange(1, num_classes):
-        I = np.where(im_label == i)
-        if len(I[0]) > 0:
-            start = 3 * i
-            end = start + 3
-            vertex_targets[I[0], I[1], start:end] = cfg.TRAIN.VERTEX_W * vertmap[I[0], I[1], :]
-            vertex_weights[I[0], I[1], start:end] = 10.0
+    """Compact vertex regression targets of one image.
 
-    return vertex_targets, vertex_weights
+    Returns the (height, width, 3) targets and the (height, width) class of
+    every pixel, 0 for pixels without a target. The dense targets have
+    3 * num_classes channels, of which only the 3 channels of the pixel's
+    class are non-zero; expand_vertex_targets builds them from these.
+    """
+    valid = (im_label >= 1) & (im_label < num_classes)
+    vertex_classes = np.where(valid, im_label, 0).astype(np.int32)
+
+    vertex_targets = np.zeros(vertex_classes.shape + (3,), dtype=np.float32)
+    y, x = np.nonzero(vertex_classes)
+    vertex_targets[y, x, :] = cfg.TRAIN.VERTEX_W * vertmap[y, x, :]
+    return vertex_targets, vertex_classes
+
+
+def expand_vertex_targets(vertex_targets, vertex_classes, target_blob, weight_blob):
+    """Write the dense (N, 3 * num_classes, H, W) vertex targets and weights.
+
+    vertex_targets is the compact (N, 3, H, W) blob and vertex_classes the
+    (N, H, W) class blob of a minibatch. target_blob and weight_blob are
+    filled in place, usually the data of the top blobs of the data layer.
+    """
+    target_blob[...] = 0
+    weight_blob[...] = 0
+    n, y, x = np.nonzero(vertex_classes)
+    start = 3 * vertex_classes[n, y, x]
+    for c in xrange(3):
+        target_blob[n, start + c, y, x] = vertex_targets[n, c, y, x]
+        weight_blob[n, start + c, y, x] = 10.0
 
 
-def _vis_minibatch(im_blob, im_normal_blob, depth_blob, label_blob, vertex_target_blob, num_classes):
+def _vis_minibatch(im_blob, im_normal_blob, depth_blob, label_blob, vertex_target_blob):
     """Visualize a mini-batch for debugging."""
     import matplotlib.pyplot as plt
 
@@ -361,12 +445,7 @@ def _vis_minibatch(im_blob, im_normal_blob, depth_blob, label_blob, vertex_targe
         width = label.shape[1]
         l = label[:, :, 0]
         if cfg.TRAIN.VERTEX_REG:
-            vertex_target = vertex_target_blob[i, :, :, :]
-            vertmap = np.zeros((height, width, 3), dtype=np.float32)
-            for k in xrange(num_classes):
-                index = np.where(l == k)
-                if len(index[0]) > 0 and k > 0:
-                    vertmap[index[0], index[1], :] = vertex_target[index[0], index[1], 3*k:3*k+3]
+            vertmap = vertex_target_blob[i, :, :, :].transpose((1, 2, 0))
         fig.add_subplot(224)
         if cfg.TRAIN.VERTEX_REG:
             plt.imshow(vertmap)
@@ -6,5 +6,3 @@
 # --------------------------------------------------------
 
 from . import config
-from . import train
-from . import test
@@ -51,9 +51,26 @@ __C.TRAIN = edict()
 
 __C.TRAIN.VISUALIZE = False
 __C.TRAIN.VERTEX_REG = False
+# Scale of the vertex regression targets
+__C.TRAIN.VERTEX_W = 10.0
 __C.TRAIN.GRID_SIZE = 256
 __C.TRAIN.CHROMATIC = False
 
+# Apply the chromatic transform to the whole minibatch with lookup tables
+# (utils.color_augmentation) instead of image by image in float
+__C.TRAIN.CHROMATIC_BATCH = True
+
+# Geometric augmentation: one random affine transform per image, applied to
+# the inputs, the labels and the vertmap after the flips and folded into the
+# intrinsic matrix of the meta data
+__C.TRAIN.AFFINE = False
+# range of the scale factors
+__C.TRAIN.AFFINE_SCALES = (0.8, 1.2)
+# maximum rotation in degrees
+__C.TRAIN.AFFINE_ANGLE = 10.0
+# maximum translation as a fraction of the image size
+__C.TRAIN.AFFINE_SHIFT = 0.1
+
 # Scales to compute real features
 __C.TRAIN.SCALES_BASE = (0.25, 0.5, 1.0, 2.0, 3.0)
 
@@ -71,6 +88,30 @@ __C.TRAIN.ASPECTS = (1, 0.75, 0.5, 0.25)
 # Images to use per minibatch
 __C.TRAIN.IMS_PER_BATCH = 2
 
+# Number of minibatches whose gradients are accumulated before each update,
+# which gives an effective batch of ITER_SIZE * IMS_PER_BATCH images without
+# the memory of a larger minibatch. Overrides iter_size in the solver.
+__C.TRAIN.ITER_SIZE = 1
+
+# How the data layers sample minibatches from the roidb
+#   random: random permutations of the roidb
+#   bucket: all images of a minibatch have the same padded shape
+#   class_balanced: oversample frames with classes that appear in few frames
+#   hard_example: oversample frames with a high recent training loss
+__C.TRAIN.SAMPLER = 'random'
+
+# class_balanced: classes in fewer than this fraction of frames are oversampled
+__C.TRAIN.SAMPLER_REPEAT_THRESH = 0.1
+
+# hard_example: running average momentum of the per-frame losses, and the
+# fraction of the sampling probability that stays uniform
+__C.TRAIN.SAMPLER_LOSS_MOMENTUM = 0.7
+__C.TRAIN.SAMPLER_UNIFORM_FRACTION = 0.3
+
+# hard_example: number of loss updates, one per minibatch, after which the
+# sampling distribution is rebuilt from the running losses
+__C.TRAIN.SAMPLER_REBUILD_ITERS = 10
+
 # Minibatch size (number of regions of interest [ROIs])
 __C.TRAIN.BATCH_SIZE = 128
 
@@ -88,6 +129,13 @@ __C.TRAIN.BG_THRESH_LO = (0.1,)
 # Use horizontally-flipped images during training?
 __C.TRAIN.USE_FLIPPED = True
 
+# Flip each sample randomly when building a minibatch instead of appending
+# flipped copies to the roidb. USE_FLIPPED is ignored when this is set.
+__C.TRAIN.RANDOM_FLIP = False
+
+# Store the training roidb in columns instead of a list of dicts
+__C.TRAIN.COLUMNAR_ROIDB = False
+
 # Train bounding-box regressors
 __C.TRAIN.BBOX_REG = True
 
@@ -102,6 +150,12 @@ __C.TRAIN.SNAPSHOT_ITERS = 10000
 # infix to yield the path: <prefix>[_<infix>]_iters_XYZ.caffemodel
 __C.TRAIN.SNAPSHOT_INFIX = ''
 
+# Write snapshots on a background thread from a copy of the parameters
+__C.TRAIN.SNAPSHOT_ASYNC = False
+
+# Number of most recent snapshots to keep, 0 keeps all of them
+__C.TRAIN.SNAPSHOT_KEEP = 0
+
 # Use a prefetch thread in roi_data_layer.layer
 # So far I haven't found this useful; likely more engineering work is required
 __C.TRAIN.USE_PREFETCH = False
@@ -231,9 +285,33 @@ __C.EXP_DIR = 'default'
 # Use GPU implementation of non-maximum suppression
 __C.USE_GPU_NMS = True
 
+# Use GPU implementation of the normal maps of the depth images
+__C.USE_GPU_NORMALS = True
+
 # Default GPU device id
 __C.GPU_ID = 0
 
+# Number of worker processes used to build the roidb of a dataset
+__C.ROIDB_NUM_WORKERS = 8
+
+# Decide whether a cached roidb entry is stale from the modification times of
+# the directories of its source files instead of the files themselves. This
+# only stats each directory once, but misses files that are rewritten in
+# place, e.g. by cv2.imwrite or scipy.io.savemat, so it is off by default.
+__C.ROIDB_DIR_STAMPS = False
+
+# Record the time of the training and testing stages with utils.profiler and
+# write a per-stage histogram and a Chrome trace to the output directory
+__C.PROFILE = False
+
+# Also record the peak and allocated memory of the stages (Linux only)
+__C.PROFILE_MEMORY = False
+
+# Memory budgets of the stages in MB, as [stage, MB] pairs, e.g.
+# [['minibatch', 1024], ['minibatch/normals', 64]]; a stage whose peak exceeds
+# its budget is reported and fails a benchmark run with --memory
+__C.MEMORY_BUDGETS = []
+
 def get_output_dir(imdb, net):
     """Return the directory where experimental artifacts are placed.
 
@@ -0,0 +1,19 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+from ism.config import cfg
+from normals.cpu_normals import cpu_normals
+
+def compute_normals(depth, fx, fy, cx, cy, depth_cutoff):
+    """Dispatch to either CPU or GPU normal map implementations."""
+
+    if cfg.USE_GPU_NORMALS:
+        # the CUDA extension is only needed when it is used
+        from normals.gpu_normals import gpu_normals
+        return gpu_normals(depth, fx, fy, cx, cy, depth_cutoff, cfg.GPU_ID)
+    else:
+        return cpu_normals(depth, fx, fy, cx, cy, depth_cutoff)
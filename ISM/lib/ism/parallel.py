@@ -0,0 +1,353 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Data-parallel training with several Caffe solvers.
+
+train_net_parallel() forks one worker process per GPU, or num_workers
+processes in CPU mode. Every worker builds its own SolverWrapper on the
+shard roidb[rank::num_workers] of the roidb. Each worker runs
+solver.step(1) as usual. After the backward pass, the solver callback
+averages the parameter gradients of all workers before the solver applies
+the update, so the learning rate policy, momentum and weight decay work
+unchanged and every worker keeps identical weights.
+
+The gradients are averaged through a buffer in shared memory with one
+row per worker and one row for the mean. Every worker computes the mean
+of its own slice of the parameters. Rank 0 broadcasts its initial weights
+through the same buffer, and only rank 0 prints and writes snapshots.
+
+When a worker fails, the others stop at their next synchronization
+instead of waiting for it, the parent terminates those that do not exit,
+and train_net_parallel() raises.
+
+This needs a pycaffe with Solver.add_callback.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+import multiprocessing
+import numpy as np
+from ism.config import cfg
+
+class BarrierAborted(RuntimeError):
+    pass
+
+
+class _Barrier(object):
+    """A reusable barrier for num processes.
+
+    Every wait polls every poll seconds whether the barrier was aborted, by a
+    failed worker or by the parent, or whether the parent died, and raises
+    BarrierAborted then or after waiting timeout seconds.
+    """
+
+    def __init__(self, num, timeout=None, poll=1.0):
+        self._num = num
+        self._timeout = timeout
+        self._poll = poll
+        self._parent = os.getpid()
+        self._aborted = multiprocessing.RawValue('i', 0)
+        self._count = multiprocessing.Value('i', 0)
+        self._turnstile = multiprocessing.Semaphore(0)
+        self._turnstile2 = multiprocessing.Semaphore(1)
+
+    def abort(self):
+        """Make the current and all later waits raise BarrierAborted."""
+        self._aborted.value = 1
+
+    def _acquire(self, lock, deadline):
+        while not lock.acquire(True, self._poll):
+            if self._aborted.value:
+                raise BarrierAborted('another worker failed')
+            if os.getppid() != self._parent:
+                self.abort()
+                raise BarrierAborted('the parent process exited')
+            if deadline is not None and time.time() > deadline:
+                self.abort()
+                raise BarrierAborted('no progress of the other workers in {:.0f}s'.format(self._timeout))
+
+    def wait(self):
+        if self._aborted.value:
+            raise BarrierAborted('another worker failed')
+        deadline = time.time() + self._timeout if self._timeout is not None else None
+        lock = self._count.get_lock()
+
+        self._acquire(lock, deadline)
+        self._count.value += 1
+        if self._count.value == self._num:
+            self._acquire(self._turnstile2, deadline)
+            self._turnstile.release()
+        lock.release()
+        self._acquire(self._turnstile, deadline)
+        self._turnstile.release()
+
+        self._acquire(lock, deadline)
+        self._count.value -= 1
+        if self._count.value == 0:
+            self._acquire(self._turnstile, deadline)
+            self._turnstile2.release()
+        lock.release()
+        self._acquire(self._turnstile2, deadline)
+        self._turnstile2.release()
+
+
+class GradientAllReduce(object):
+    """Average arrays of the same size across processes through shared memory.
+
+    Create it before forking the workers; every worker then calls attach()
+    with its own rank and the parameter blobs of its net. The calls raise
+    BarrierAborted when another worker failed, or waited for the others
+    longer than timeout seconds.
+    """
+
+    def __init__(self, num_workers, timeout=None):
+        self._num_workers = num_workers
+        self._barrier = _Barrier(num_workers, timeout)
+        self._dir = tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        self._filename = os.path.join(self._dir, 'gradients')
+
+    def attach(self, rank, blobs):
+        """Map the shared buffer for the given parameter blobs."""
+        self._rank = rank
+        self._blobs = blobs
+        sizes = [blob.data.size for blob in blobs]
+        self._offsets = np.concatenate(([0], np.cumsum(sizes)))
+        size = int(self._offsets[-1])
+
+        # rank 0 creates the buffer, the other workers map it once it exists
+        if rank == 0:
+            self._buffer = np.memmap(self._filename, dtype=np.float32, mode='w+',
+                                     shape=(self._num_workers + 1, size))
+        self._barrier.wait()
+        if rank != 0:
+            self._buffer = np.memmap(self._filename, dtype=np.float32, mode='r+',
+                                     shape=(self._num_workers + 1, size))
+
+        # slice of the parameters this worker averages
+        bounds = np.linspace(0, size, self._num_workers + 1).astype(np.int64)
+        self._lo, self._hi = bounds[rank], bounds[rank + 1]
+
+    def _gather(self, row, field):
+        for blob, start, end in zip(self._blobs, self._offsets[:-1], self._offsets[1:]):
+            self._buffer[row, start:end] = getattr(blob, field).ravel()
+
+    def _scatter(self, row, field):
+        for blob, start, end in zip(self._blobs, self._offsets[:-1], self._offsets[1:]):
+            np.copyto(getattr(blob, field).reshape(-1), self._buffer[row, start:end])
+
+    def broadcast_data(self):
+        """Copy the parameters of rank 0 to all workers."""
+        if self._rank == 0:
+            self._gather(self._num_workers, 'data')
+        self._barrier.wait()
+        if self._rank != 0:
+            self._scatter(self._num_workers, 'data')
+        self._barrier.wait()
+
+    def average_diffs(self):
+        """Replace the parameter gradients of every worker by their mean."""
+        n = self._num_workers
+        if n == 1:
+            return
+        lo, hi = self._lo, self._hi
+        self._gather(self._rank, 'diff')
+        self._barrier.wait()
+        np.mean(self._buffer[:n, lo:hi], axis=0, out=self._buffer[n, lo:hi])
+        self._barrier.wait()
+        self._scatter(n, 'diff')
+
+    def abort(self):
+        """Stop all workers at their next synchronization."""
+        self._barrier.abort()
+
+    def close(self):
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def _param_blobs(net):
+    return [blob for blobs in net.params.itervalues() for blob in blobs]
+
+
+def _train(rank, num_workers, gpus, allreduce, solver_prototxt, roidb, output_dir,
+           pretrained_model, max_iters):
+    import caffe
+    from ism.train import SolverWrapper
+
+    np.random.seed(cfg.RNG_SEED + rank)
+    if gpus is None:
+        caffe.set_mode_cpu()
+    else:
+        caffe.set_mode_gpu()
+        caffe.set_device(gpus[rank])
+
+    sw = SolverWrapper(solver_prototxt, roidb[rank::num_workers], output_dir,
+                       pretrained_model=pretrained_model)
+    allreduce.attach(rank, _param_blobs(sw.solver.net))
+    allreduce.broadcast_data()
+    sw.solver.add_callback(lambda: None, allreduce.average_diffs)
+
+    t = time.time()
+    sw.train_model(max_iters, snapshot=(rank == 0))
+    if rank == 0:
+        num_images = max_iters * cfg.TRAIN.IMS_PER_BATCH * num_workers
+        print '{:d} workers: {:.2f} images / s'.format(num_workers, num_images / (time.time() - t))
+
+
+def _worker(rank, allreduce, target, args):
+    try:
+        target(rank, *args)
+    except BarrierAborted as e:
+        print 'worker {:d} stopped: {}'.format(rank, e)
+        sys.exit(1)
+    except:
+        # let the other workers stop instead of waiting for this one
+        allreduce.abort()
+        raise
+
+
+def _start(num_workers, allreduce, target, args):
+    workers = []
+    for rank in xrange(num_workers):
+        p = multiprocessing.Process(target=_worker, args=(rank, allreduce, target, args))
+        p.start()
+        workers.append(p)
+    return workers
+
+
+def _join(workers, allreduce, poll=1.0, grace=30.0):
+    """Wait for the workers and return the ranks that failed.
+
+    When a worker exits with an error the others are aborted at their next
+    synchronization, and terminated if they have not exited after grace
+    seconds.
+    """
+    try:
+        while True:
+            failed = [rank for rank, p in enumerate(workers) if p.exitcode not in (None, 0)]
+            running = [p for p in workers if p.exitcode is None]
+            if failed or not running:
+                break
+            running[0].join(poll)
+        if failed:
+            allreduce.abort()
+            deadline = time.time() + grace
+            for p in workers:
+                p.join(max(0, deadline - time.time()))
+    finally:
+        for p in workers:
+            if p.is_alive():
+                p.terminate()
+                p.join()
+    return failed
+
+
+def train_net_parallel(solver_prototxt, roidb, output_dir, pretrained_model=None, max_iters=40000,
+                       num_workers=1, gpus=None, timeout=600):
+    """Train a network with one solver per GPU in gpus, or num_workers CPU solvers.
+
+    A worker waiting longer than timeout seconds for the others to finish
+    an iteration stops the training.
+    """
+    if gpus is not None:
+        num_workers = len(gpus)
+    allreduce = GradientAllReduce(num_workers, timeout)
+    try:
+        workers = _start(num_workers, allreduce, _train,
+                         (num_workers, gpus, allreduce, solver_prototxt, roidb, output_dir,
+                          pretrained_model, max_iters))
+        failed = _join(workers, allreduce)
+    finally:
+        allreduce.close()
+    if failed:
+        raise RuntimeError('training workers {} failed'.format(failed))
+
+
+if __name__ == '__main__':
+    # 1 to 4 workers on a VGG16-sized net (~15M parameters per color or depth
+    # branch): the time of one gradient average through the shared buffer and
+    # through pipes to rank 0, which is what the buffer replaces, and the
+    # scaling efficiency of whole steps, with matrix products standing in for
+    # about 500ms of forward and backward passes per worker
+    class Blob(object):
+        def __init__(self, size):
+            self.data = np.random.rand(size).astype(np.float32)
+            self.diff = np.random.rand(size).astype(np.float32)
+
+    sizes = [1728, 36864, 73728, 147456, 294912, 589824, 589824, 1179648] + [2359296] * 5 + [64] * 26
+    sizes = sizes * 2
+    num_steps = 5
+
+    a = np.random.rand(512, 512).astype(np.float32)
+    t = time.time()
+    for _ in xrange(10):
+        np.dot(a, a)
+    num_products = int(0.5 / ((time.time() - t) / 10))
+
+    def compute():
+        for _ in xrange(num_products):
+            np.dot(a, a)
+
+    def pipe_average(rank, num_workers, blobs, conns):
+        diff = np.concatenate([blob.diff.ravel() for blob in blobs])
+        if rank == 0:
+            total = diff.copy()
+            for conn in conns:
+                total += np.frombuffer(conn.recv_bytes(), dtype=np.float32)
+            total /= num_workers
+            for conn in conns:
+                conn.send_bytes(total)
+        else:
+            conns[0].send_bytes(diff)
+            total = np.frombuffer(conns[0].recv_bytes(), dtype=np.float32)
+        offsets = np.cumsum([0] + [blob.diff.size for blob in blobs])
+        for blob, start, end in zip(blobs, offsets[:-1], offsets[1:]):
+            np.copyto(blob.diff, total[start:end])
+
+    def bench(rank, num_workers, allreduce, pipes, results):
+        blobs = [Blob(size) for size in sizes]
+        allreduce.attach(rank, blobs)
+        allreduce.broadcast_data()
+        # rank 0 holds one end of every pipe, the others the other end of theirs
+        rank_conns = [pipe[0] for pipe in pipes] if rank == 0 else [pipes[rank - 1][1]]
+        timings = []
+        for average in (allreduce.average_diffs,
+                        lambda: pipe_average(rank, num_workers, blobs, rank_conns)):
+            allreduce.broadcast_data()
+            t = time.time()
+            for _ in xrange(num_steps):
+                average()
+            timings.append((time.time() - t) / num_steps)
+        allreduce.broadcast_data()
+        t = time.time()
+        for _ in xrange(num_steps):
+            compute()
+            allreduce.average_diffs()
+        timings.append((time.time() - t) / num_steps)
+        if rank == 0:
+            results[:] = timings
+
+    print '{:d} cores, {:.1f}MB of gradients'.format(multiprocessing.cpu_count(), sum(sizes) * 4 / 1e6)
+    base = None
+    for num_workers in xrange(1, 5):
+        allreduce = GradientAllReduce(num_workers)
+        results = multiprocessing.Array('d', 3)
+        pipes = [multiprocessing.Pipe() for _ in xrange(num_workers - 1)]
+        workers = _start(num_workers, allreduce, bench, (num_workers, allreduce, pipes, results))
+        failed = _join(workers, allreduce)
+        allreduce.close()
+        if failed:
+            raise RuntimeError('benchmark workers {} failed'.format(failed))
+        t_shared, t_pipe, t_step = results[:]
+        throughput = num_workers / t_step
+        base = base or throughput
+        print '{:d} workers: average {:.1f}ms shared, {:.1f}ms pipes; step {:.0f}ms, ' \
+              '{:.2f} worker steps / s, scaling efficiency {:.0f}%'.format(
+                  num_workers, 1000 * t_shared, 1000 * t_pipe, 1000 * t_step, throughput,
+                  100 * throughput / (num_workers * base))
@@ -0,0 +1,195 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Weight surgery on Caffe nets.
+
+A surgery is done in two steps. A plan is built once from the names and
+shapes of the parameters: a list of (source blob, destination blob) pairs
+with the kind of copy each one needs. Applying the plan then copies every
+pair with one numpy call on the contiguous blob memory, instead of
+looking the layers up and assigning through .flat one blob at a time.
+
+Bilinear upsampling filters are cached by kernel size, since the
+deconvolution layers of a net usually share a few sizes.
+"""
+
+import time
+import numpy as np
+
+class SurgeryPlan(object):
+    """Copies between the parameter blobs of Caffe nets."""
+
+    def __init__(self):
+        self._copies = []
+
+    def __len__(self):
+        return len(self._copies)
+
+    def add(self, src, dst, description):
+        """Copy array src into array dst, coercing the shape if needed."""
+        self._copies.append((src, dst, description))
+
+    def apply(self, verbose=True):
+        """Run all the copies of the plan."""
+        for src, dst, description in self._copies:
+            if src.shape == dst.shape:
+                np.copyto(dst, src)
+            elif src.size == dst.size:
+                # e.g. a fully connected layer converted to a convolution
+                np.copyto(dst.reshape(-1), src.reshape(-1))
+            else:
+                dst.flat = src.flat
+            if verbose and description:
+                print description
+
+
+def depth_plan(net, suffix='_d'):
+    """Plan initializing every layer <name><suffix> from layer <name>."""
+    plan = SurgeryPlan()
+    for key, blobs in net.params.iteritems():
+        key_depth = key + suffix
+        if key_depth not in net.params:
+            continue
+        for i in xrange(min(2, len(blobs))):
+            plan.add(blobs[i].data, net.params[key_depth][i].data,
+                     'layer %s initialized from layer %s' % (key_depth, key) if i == 0 else None)
+    return plan
+
+
+def transplant_plan(new_net, net, suffix=''):
+    """
+    Plan transferring weights by copying matching parameters, coercing
+    parameters of incompatible shape, and dropping unmatched parameters.
+
+    The coercion is useful to convert fully connected layers to their
+    equivalent convolutional layers, since the weights are the same and only
+    the shapes are different.
+    """
+    plan = SurgeryPlan()
+    for p in net.params:
+        p_new = p + suffix
+        if p_new not in new_net.params:
+            print 'dropping', p
+            continue
+        for i in range(len(net.params[p])):
+            if i > (len(new_net.params[p_new]) - 1):
+                print 'dropping', p, i
+                break
+            src = net.params[p][i].data
+            dst = new_net.params[p_new][i].data
+            if src.shape != dst.shape:
+                description = 'coercing %s %d from %s to %s' % (p, i, src.shape, dst.shape)
+            else:
+                description = 'copying %s  ->  %s %d' % (p, p_new, i)
+            plan.add(src, dst, description)
+    return plan
+
+
+_upsample_filters = {}
+
+def upsample_filt(size):
+    """
+    Make a 2D bilinear kernel suitable for upsampling of the given (h, w) size.
+    The kernels are cached and must not be modified.
+    """
+    filt = _upsample_filters.get(size)
+    if filt is None:
+        factor = (size + 1) // 2
+        if size % 2 == 1:
+            center = factor - 1
+        else:
+            center = factor - 0.5
+        og = np.ogrid[:size, :size]
+        filt = (1 - abs(og[0] - center) / factor) * \
+               (1 - abs(og[1] - center) / factor)
+        filt.flags.writeable = False
+        _upsample_filters[size] = filt
+    return filt
+
+
+def interp(net, layers):
+    """
+    Set weights of each layer in layers to bilinear kernels for interpolation.
+    """
+    for l in layers:
+        data = net.params[l][0].data
+        m, k, h, w = data.shape
+        if m != k and k != 1:
+            raise ValueError('{}: input + output channels need to be the same or |output| == 1'.format(l))
+        if h != w:
+            raise ValueError('{}: filters need to be square'.format(l))
+        filt = upsample_filt(h)
+        if m == k:
+            # view of the (c, c) diagonal filters
+            np.einsum('iijk->ijk', data)[...] = filt
+        else:
+            data[:, 0] = filt
+
+
+if __name__ == '__main__':
+    # time the surgeries on a VGG16 net with depth twins of every layer
+    class Blob(object):
+        def __init__(self, shape):
+            self.data = np.random.rand(*shape).astype(np.float32)
+
+    shapes = [('conv1_1', (64, 3, 3, 3)), ('conv1_2', (64, 64, 3, 3)),
+              ('conv2_1', (128, 64, 3, 3)), ('conv2_2', (128, 128, 3, 3)),
+              ('conv3_1', (256, 128, 3, 3)), ('conv3_2', (256, 256, 3, 3)), ('conv3_3', (256, 256, 3, 3)),
+              ('conv4_1', (512, 256, 3, 3)), ('conv4_2', (512, 512, 3, 3)), ('conv4_3', (512, 512, 3, 3)),
+              ('conv5_1', (512, 512, 3, 3)), ('conv5_2', (512, 512, 3, 3)), ('conv5_3', (512, 512, 3, 3)),
+              ('fc6', (4096, 512, 7, 7)), ('fc7', (4096, 4096, 1, 1))]
+
+    class Net(object):
+        def __init__(self, shapes, suffixes):
+            self.params = {}
+            for name, shape in shapes:
+                for suffix in suffixes:
+                    self.params[name + suffix] = [Blob(shape), Blob((shape[0],))]
+            for i in xrange(3):
+                self.params['upscore%d' % i] = [Blob((22, 22, 16, 16))]
+
+    net = Net(shapes, ['', '_d'])
+    base_net = Net([(name, (shape[0], int(np.prod(shape[1:])))) for name, shape in shapes], [''])
+
+    t = time.time()
+    for key in net.params.keys():
+        key_depth = key + '_d'
+        if key_depth in net.params:
+            net.params[key_depth][0].data[...] = net.params[key][0].data
+            net.params[key_depth][1].data[...] = net.params[key][1].data
+    t_depth_loop = time.time() - t
+    t = time.time()
+    depth_plan(net).apply(verbose=False)
+    t_depth_plan = time.time() - t
+
+    t = time.time()
+    for p in base_net.params:
+        for i in range(len(base_net.params[p])):
+            net.params[p][i].data.flat = base_net.params[p][i].data.flat
+    t_flat = time.time() - t
+    t = time.time()
+    plan = transplant_plan(net, base_net)
+    plan.apply(verbose=False)
+    t_transplant = time.time() - t
+
+    layers = ['upscore%d' % i for i in xrange(3)]
+    t = time.time()
+    for l in layers:
+        m, k, h, w = net.params[l][0].data.shape
+        factor = (h + 1) // 2
+        center = factor - 0.5
+        og = np.ogrid[:h, :h]
+        filt = (1 - abs(og[0] - center) / factor) * (1 - abs(og[1] - center) / factor)
+        net.params[l][0].data[range(m), range(k), :, :] = filt
+    t_interp_loop = time.time() - t
+    t = time.time()
+    interp(net, layers)
+    t_interp = time.time() - t
+
+    print 'depth twins: {:.1f}ms per-layer loop, {:.1f}ms plan'.format(t_depth_loop * 1000, t_depth_plan * 1000)
+    print 'transplant: {:.1f}ms .flat, {:.1f}ms plan'.format(t_flat * 1000, t_transplant * 1000)
+    print 'interp: {:.2f}ms fancy indexing, {:.2f}ms cached filters'.format(t_interp_loop * 1000, t_interp * 1000)
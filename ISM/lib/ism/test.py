@@ -12,9 +12,10 @@ import argparse
 from utils.timer import Timer
 import numpy as np
 import cv2
-import caffe
 import cPickle
 from utils.blob import im_list_to_blob
+from utils.meta_data import load_meta_data
+from utils.depth_io import read_depth
 import os
 import math
 import scipy.io
@@ -405,7 +406,7 @@ def test_net(net, imdb):
     for i in xrange(num_images):
     # for i in perm:
         im = cv2.imread(imdb.image_path_at(i))
-        im_depth = cv2.imread(imdb.depth_path_at(i), cv2.IMREAD_UNCHANGED)
+        im_depth = read_depth(imdb.depth_path_at(i))
 
         # shift
         # rows = im.shape[0]
@@ -435,7 +436,7 @@ def test_net(net, imdb):
         meta_data_path = imdb.metadata_path_at(i)
         # compute object pose
         if os.path.exists(meta_data_path):
-            meta_data = scipy.io.loadmat(meta_data_path)
+            meta_data = load_meta_data(meta_data_path)
             points_rescale, points_transform = pose_estimate(im_depth, meta_data, seg_cls_prob, seg_view_pred)
         else:
             points_rescale = np.zeros((0, 0, 3), dtype=np.float32)
@@ -10,11 +10,12 @@
 from ism.config import cfg, get_output_dir
 import argparse
 from utils.timer import Timer
+from utils import profiler
 import numpy as np
 import cv2
-import caffe
 import cPickle
 from utils.blob import im_list_to_blob, pad_im
+from utils.depth_io import read_depth
 import os
 import math
 import scipy.io
@@ -76,17 +77,20 @@ def im_segment(net, im, im_depth, num_classes):
     """
 
     # compute image blob
-    im_blob, im_depth_blob, im_scale_factors = _get_image_blob(im, im_depth)
+    with profiler.scope('blob'):
+        im_blob, im_depth_blob, im_scale_factors = _get_image_blob(im, im_depth)
 
     # reshape network inputs
-    net.blobs['data_image'].reshape(*(im_blob.shape))
-    blobs_out = net.forward(data_image=im_blob.astype(np.float32, copy=False))
+    with profiler.scope('forward'):
+        net.blobs['data_image'].reshape(*(im_blob.shape))
+        blobs_out = net.forward(data_image=im_blob.astype(np.float32, copy=False))
 
     # get outputs
-    cls_prob = blobs_out['prob']
-    height = cls_prob.shape[2]
-    width = cls_prob.shape[3]
-    labels = np.argmax(cls_prob, axis = 1).reshape((height, width))
+    with profiler.scope('argmax'):
+        cls_prob = blobs_out['prob']
+        height = cls_prob.shape[2]
+        width = cls_prob.shape[3]
+        labels = np.argmax(cls_prob, axis = 1).reshape((height, width))
 
     return labels
 
@@ -126,12 +130,17 @@ def test_net(net, imdb):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
+    if cfg.PROFILE:
+        profiler.enable(cfg.PROFILE_MEMORY)
+
     seg_file = os.path.join(output_dir, 'segmentations.pkl')
     print imdb.name
     if os.path.exists(seg_file):
         with open(seg_file, 'rb') as fid:
             segmentations = cPickle.load(fid)
         imdb.evaluate_segmentations(segmentations, output_dir)
+        if cfg.PROFILE:
+            profiler.dump(output_dir, 'profile_test', cfg.MEMORY_BUDGETS)
         return
 
     """Test a Fast R-CNN network on an image database."""
@@ -148,7 +157,8 @@ def test_net(net, imdb):
 
     for i in perm:
         # read color image
-        rgba = pad_im(cv2.imread(imdb.image_path_at(i), cv2.IMREAD_UNCHANGED), 16)
+        with profiler.scope('decode'):
+            rgba = pad_im(cv2.imread(imdb.image_path_at(i), cv2.IMREAD_UNCHANGED), 16)
         if rgba.shape[2] == 4:
             im = np.copy(rgba[:,:,:3])
             alpha = rgba[:,:,3]
@@ -158,14 +168,17 @@ def test_net(net, imdb):
             im = rgba
 
         # read depth image
-        im_depth = cv2.imread(imdb.depth_path_at(i), cv2.IMREAD_UNCHANGED)
+        with profiler.scope('decode'):
+            im_depth = read_depth(imdb.depth_path_at(i))
 
         _t['im_segment'].tic()
-        labels = im_segment(net, im, im_depth, imdb.num_classes)
+        with profiler.scope('im_segment'):
+            labels = im_segment(net, im, im_depth, imdb.num_classes)
         _t['im_segment'].toc()
 
         # build the label image
-        im_label = imdb.labels_to_image(im, labels)
+        with profiler.scope('label_image'):
+            im_label = imdb.labels_to_image(im, labels)
 
         _t['misc'].tic()
         seg = {'labels': labels}
@@ -173,13 +186,14 @@ def test_net(net, imdb):
         _t['misc'].toc()
 
         # read label image
-        labels_gt = pad_im(cv2.imread(imdb.label_path_at(i), cv2.IMREAD_UNCHANGED), 16)
-        if len(labels_gt.shape) == 2:
-            im_label_gt = imdb.labels_to_image(im, labels_gt)
-        else:
-            im_label_gt = np.copy(labels_gt[:,:,:3])
-            im_label_gt[:,:,0] = labels_gt[:,:,2]
-            im_label_gt[:,:,2] = labels_gt[:,:,0]
+        with profiler.scope('label_image'):
+            labels_gt = pad_im(cv2.imread(imdb.label_path_at(i), cv2.IMREAD_UNCHANGED), 16)
+            if len(labels_gt.shape) == 2:
+                im_label_gt = imdb.labels_to_image(im, labels_gt)
+            else:
+                im_label_gt = np.copy(labels_gt[:,:,:3])
+                im_label_gt[:,:,0] = labels_gt[:,:,2]
+                im_label_gt[:,:,2] = labels_gt[:,:,0]
 
         if cfg.TEST.VISUALIZE:
             vis_segmentations(im, im_depth, im_label, im_label_gt, imdb._class_colors)
@@ -192,3 +206,5 @@ def test_net(net, imdb):
 
     # evaluation
     imdb.evaluate_segmentations(segmentations, output_dir)
+    if cfg.PROFILE:
+        profiler.dump(output_dir, 'profile_test', cfg.MEMORY_BUDGETS)
@@ -9,9 +9,14 @@
 
 import caffe
 from ism.config import cfg
+from ism import surgery
 from utils.timer import Timer
+from utils import profiler
+from utils.snapshot_writer import SnapshotWriter
 import numpy as np
 import os
+import tempfile
+import time
 
 from caffe.proto import caffe_pb2
 import google.protobuf as pb2
@@ -27,7 +32,25 @@ class SolverWrapper(object):
         """Initialize the SolverWrapper."""
         self.output_dir = output_dir
 
-        self.solver = caffe.SGDSolver(solver_prototxt)
+        self.solver_param = caffe_pb2.SolverParameter()
+        with open(solver_prototxt, 'rt') as f:
+            pb2.text_format.Merge(f.read(), self.solver_param)
+
+        if cfg.TRAIN.ITER_SIZE > 1:
+            # Caffe accumulates the gradients of iter_size forward/backward
+            # passes and divides them by iter_size before the update, so the
+            # learning rate matches a minibatch of the effective batch size
+            self.solver_param.iter_size = cfg.TRAIN.ITER_SIZE
+            with tempfile.NamedTemporaryFile(suffix='.prototxt', delete=False) as f:
+                f.write(pb2.text_format.MessageToString(self.solver_param))
+            self.solver = caffe.SGDSolver(f.name)
+            os.remove(f.name)
+        else:
+            self.solver = caffe.SGDSolver(solver_prototxt)
+        print 'Effective batch size: {:d} images ({:d} x {:d})'.format(
+            cfg.TRAIN.ITER_SIZE * cfg.TRAIN.IMS_PER_BATCH, cfg.TRAIN.ITER_SIZE, cfg.TRAIN.IMS_PER_BATCH)
+
+        t = time.time()
         if pretrained_model is not None:
             print ('Loading pretrained model '
                    'weights from {:s}').format(pretrained_model)
@@ -36,79 +59,48 @@ class SolverWrapper(object):
             # self.transplant(self.solver.net, base_net)
             # del base_net
 
-            for key, value in self.solver.net.params.iteritems():
-                key_depth = key + '_d'
-                if self.solver.net.params.has_key(key_depth):
-                    self.solver.net.params[key_depth][0].data[...] = self.solver.net.params[key][0].data
-                    self.solver.net.params[key_depth][1].data[...] = self.solver.net.params[key][1].data
-                    print 'layer %s initialized from layer %s' % (key_depth, key)
-        
+            # initialize the depth layers from their color twins
+            surgery.depth_plan(self.solver.net).apply()
+
         # surgeries
         interp_layers = [k for k in self.solver.net.params.keys() if 'up' in k]
         self.interp(self.solver.net, interp_layers)
-
-        self.solver_param = caffe_pb2.SolverParameter()
-        with open(solver_prototxt, 'rt') as f:
-            pb2.text_format.Merge(f.read(), self.solver_param)
+        print 'Net setup took {:.3f}s'.format(time.time() - t)
 
         self.solver.net.layers[0].set_roidb(roidb)
+        if cfg.TRAIN.SAMPLER == 'hard_example':
+            # the data layer reads the loss of every micro-batch in its forward
+            net = self.solver.net
+            if not hasattr(net.layers[0], 'set_loss_blobs'):
+                raise ValueError('TRAIN.SAMPLER hard_example needs a data layer that takes the loss '
+                                 'blobs, which {} does not'.format(type(net.layers[0]).__name__))
+            net.layers[0].set_loss_blobs([net.blobs[name] for name in net.outputs])
+
+        # the layers of the caffemodels written on the snapshot thread
+        self.net_param = _net_parameter(self.solver_param, self.solver.net)
+        self.snapshot_writer = SnapshotWriter(cfg.TRAIN.SNAPSHOT_KEEP, background=cfg.TRAIN.SNAPSHOT_ASYNC)
 
     def transplant(self, new_net, net, suffix=''):
         """
         Transfer weights by copying matching parameters, coercing parameters of
         incompatible shape, and dropping unmatched parameters.
 
-        The coercion is useful to convert fully connected layers to their
-        equivalent convolutional layers, since the weights are the same and only
-        the shapes are different.  In particular, equivalent fully connected and
-        convolution layers have shapes O x I and O x I x H x W respectively for O
-        outputs channels, I input channels, H kernel height, and W kernel width.
-
         Both  `net` to `new_net` arguments must be instantiated `caffe.Net`s.
+        See ism.surgery.transplant_plan.
         """
-
-        for p in net.params:
-            p_new = p + suffix
-            if p_new not in new_net.params:
-                print 'dropping', p
-                continue
-            for i in range(len(net.params[p])):
-                if i > (len(new_net.params[p_new]) - 1):
-                    print 'dropping', p, i
-                    break
-                if net.params[p][i].data.shape != new_net.params[p_new][i].data.shape:
-                    print 'coercing', p, i, 'from', net.params[p][i].data.shape, 'to', new_net.params[p_new][i].data.shape
-                else:
-                    print 'copying', p, ' -> ', p_new, i
-                new_net.params[p_new][i].data.flat = net.params[p][i].data.flat
+        surgery.transplant_plan(new_net, net, suffix).apply()
 
     def upsample_filt(self, size):
         """
         Make a 2D bilinear kernel suitable for upsampling of the given (h, w) size.
         """
-        factor = (size + 1) // 2
-        if size % 2 == 1:
-            center = factor - 1
-        else:
-            center = factor - 0.5
-        og = np.ogrid[:size, :size]
-        return (1 - abs(og[0] - center) / factor) * \
-               (1 - abs(og[1] - center) / factor)
+        return surgery.upsample_filt(size)
 
     def interp(self, net, layers):
         """
         Set weights of each layer in layers to bilinear kernels for interpolation.
         """
-        for l in layers:
-            m, k, h, w = net.params[l][0].data.shape
-            if m != k and k != 1:
-                print 'input + output channels need to be the same or |output| == 1'
-                raise
-            if h != w:
-                print 'filters need to be square'
-                raise
-            filt = self.upsample_filt(h)
-            net.params[l][0].data[range(m), range(k), :, :] = filt
+        surgery.interp(net, layers)
 
     def snapshot(self):
         """Take a snapshot of the network after unnormalizing the learned
@@ -125,31 +117,116 @@ class SolverWrapper(object):
                     '_iter_{:d}'.format(self.solver.iter) + '.caffemodel')
         filename = os.path.join(self.output_dir, filename)
 
-        net.save(str(filename))
-        print 'Wrote snapshot to: {:s}'.format(filename)
+        t = time.time()
+        if cfg.TRAIN.SNAPSHOT_ASYNC:
+            # copy the parameters to host memory, the writer thread serializes them
+            params = [(name, [blob.data.copy() for blob in blobs]) for name, blobs in net.params.iteritems()]
+            self.snapshot_writer.save(filename, lambda path, params: _write_caffemodel(path, params, self.net_param),
+                                      params)
+        else:
+            self.snapshot_writer.save(filename, lambda path, net: net.save(str(path)), net)
+        print 'Snapshot blocked training for {:.1f}ms'.format((time.time() - t) * 1000)
 
-    def train_model(self, max_iters):
-        """Network training loop."""
+    def train_model(self, max_iters, snapshot=True):
+        """Network training loop. Snapshots are only written if snapshot is set."""
         last_snapshot_iter = -1
         timer = Timer()
+        if cfg.PROFILE:
+            profiler.enable(cfg.PROFILE_MEMORY)
         while self.solver.iter < max_iters:
-            # Make one SGD update
-            timer.tic()
-            self.solver.step(1)
-            timer.toc()
-            if self.solver.iter % (10 * self.solver_param.display) == 0:
-                print 'speed: {:.3f}s / iter'.format(timer.average_time)
-
-            if self.solver.iter % cfg.TRAIN.SNAPSHOT_ITERS == 0:
-                last_snapshot_iter = self.solver.iter
-                self.snapshot()
-
-        if last_snapshot_iter != self.solver.iter:
+            with profiler.scope('iteration'):
+                # Make one SGD update
+                timer.tic()
+                with profiler.scope('solver_step'):
+                    self.solver.step(1)
+                timer.toc()
+
+                if snapshot and self.solver.iter % (10 * self.solver_param.display) == 0:
+                    print 'speed: {:.3f}s / iter'.format(timer.average_time)
+
+                if snapshot and self.solver.iter % cfg.TRAIN.SNAPSHOT_ITERS == 0:
+                    last_snapshot_iter = self.solver.iter
+                    with profiler.scope('snapshot'):
+                        self.snapshot()
+
+        if snapshot and last_snapshot_iter != self.solver.iter:
             self.snapshot()
+        self.snapshot_writer.close()
+        if cfg.PROFILE:
+            profiler.dump(self.output_dir, 'profile_train', cfg.MEMORY_BUDGETS)
+
+def _net_parameter(solver_param, net):
+    """The NetParameter of the training net of a solver, without weights,
+    keeping only the layers that net has."""
+    net_param = caffe_pb2.NetParameter()
+    if solver_param.HasField('train_net_param'):
+        net_param.CopyFrom(solver_param.train_net_param)
+    elif solver_param.HasField('net_param'):
+        net_param.CopyFrom(solver_param.net_param)
+    else:
+        with open(solver_param.train_net or solver_param.net, 'rt') as f:
+            pb2.text_format.Merge(f.read(), net_param)
+    names = set(net._layer_names)
+    layers = caffe_pb2.NetParameter()
+    layers.CopyFrom(net_param)
+    del layers.layer[:]
+    layers.layer.extend(layer for layer in net_param.layer if layer.name in names)
+    return layers
+
+
+# number of values _write_caffemodel converts to Python floats at a time
+_CAFFEMODEL_CHUNK = 1 << 20
+
+def _write_caffemodel(filename, params, net_param):
+    """Write parameters copied from a net as a caffemodel that
+    Net.copy_from can load.
+
+    The layers are those of net_param, with the weights of params, a list
+    of (layer name, arrays) pairs, added as their blobs.
+    """
+    model = caffe_pb2.NetParameter()
+    model.CopyFrom(net_param)
+    layers = dict((layer.name, layer) for layer in model.layer)
+    for name, arrays in params:
+        layer = layers.get(name)
+        if layer is None:
+            layer = model.layer.add(name=name)
+        for array in arrays:
+            blob = layer.blobs.add()
+            blob.shape.dim.extend(array.shape)
+            # extending from lists is faster than from the array elements, and
+            # chunks bound the memory of the Python floats and the time the
+            # writer thread holds the GIL
+            values = array.ravel()
+            for start in xrange(0, len(values), _CAFFEMODEL_CHUNK):
+                blob.data.extend(values[start:start + _CAFFEMODEL_CHUNK].tolist())
+    with open(filename, 'wb') as f:
+        f.write(model.SerializeToString())
+
+def check_training_config(imdb):
+    """Raise a ValueError for options the imdb cannot be trained with."""
+    if cfg.TRAIN.SAMPLER == 'class_balanced' and not imdb.HAS_CLASS_HISTOGRAMS:
+        raise ValueError(('TRAIN.SAMPLER class_balanced needs the class histograms of '
+                          'the label images, which imdb {} does not provide. Use another '
+                          'sampler or implement {}._class_histogram.').format(imdb.name, type(imdb).__name__))
 
 def get_training_roidb(imdb):
     """Returns a roidb (Region of Interest database) for use in training."""
-    if cfg.TRAIN.USE_FLIPPED:
+    # before the roidb is built, which can take long
+    check_training_config(imdb)
+
+    if cfg.TRAIN.SAMPLER == 'class_balanced':
+        print 'Computing class histograms...'
+        for entry, hist in zip(imdb.roidb, imdb.class_histograms()):
+            entry['class_histogram'] = hist
+        print 'done'
+
+    if cfg.TRAIN.COLUMNAR_ROIDB:
+        print 'Converting the roidb to columns...'
+        imdb.compact_roidb()
+        print 'done'
+
+    if cfg.TRAIN.USE_FLIPPED and not cfg.TRAIN.RANDOM_FLIP:
         print 'Appending horizontally-flipped training examples...'
         imdb.append_flipped_images()
         print 'done'
@@ -0,0 +1,37 @@
+# --------------------------------------------------------
+# FCN
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import numpy as np
+
+def cpu_normals(depth, fx, fy, cx, cy, depthCutoff):
+    """NumPy version of gpu_normals, computing the same normal map.
+
+    As in compute_normals.cu, the vertex of pixel (u, v) is backprojected
+    with u, the row, against cx and fx, and the normal is the normalized
+    cross product of the differences to the vertices below and to the
+    right. Pixels without depth, beyond depthCutoff or on the last row or
+    column are NaN.
+    """
+    depth = np.asarray(depth, dtype=np.float32)
+    height, width = depth.shape
+    u, v = np.mgrid[:height, :width].astype(np.float32)
+
+    vmap = np.empty((height, width, 3), dtype=np.float32)
+    vmap[:, :, 0] = depth * (u - np.float32(cx)) * np.float32(1.0 / fx)
+    vmap[:, :, 1] = depth * (v - np.float32(cy)) * np.float32(1.0 / fy)
+    vmap[:, :, 2] = depth
+    vmap[(depth == 0) | (depth >= depthCutoff)] = np.nan
+
+    nmap = np.empty((height, width, 3), dtype=np.float32)
+    nmap.fill(np.nan)
+    v00 = vmap[:-1, :-1]
+    r = np.cross(vmap[1:, :-1] - v00, vmap[:-1, 1:] - v00)
+    norm = np.sqrt(np.sum(r * r, axis=2, keepdims=True))
+    # Eigen leaves a zero vector as it is
+    with np.errstate(invalid='ignore', divide='ignore'):
+        nmap[:-1, :-1] = np.where(norm > 0, r / norm, r)
+    return nmap
@@ -0,0 +1,11 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Tests of the pure Python modules. Run from ISM/lib with
+
+    python -m unittest discover -s tests -t .
+"""
@@ -0,0 +1,75 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import caffe
+from caffe.proto import caffe_pb2
+from ism.train import _net_parameter, _write_caffemodel
+
+NET = """name: 'tiny'
+input: 'data'
+input_shape { dim: 1 dim: 3 dim: 8 dim: 8 }
+layer { name: 'conv1' type: 'Convolution' bottom: 'data' top: 'conv1'
+        convolution_param { num_output: 4 kernel_size: 3 weight_filler { type: 'gaussian' std: 0.1 }
+                            bias_filler { type: 'constant' value: 0.5 } } }
+layer { name: 'relu1' type: 'ReLU' bottom: 'conv1' top: 'conv1' }
+layer { name: 'fc' type: 'InnerProduct' bottom: 'conv1' top: 'fc'
+        inner_product_param { num_output: 2 weight_filler { type: 'gaussian' std: 0.1 } } }
+"""
+
+class CaffemodelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.prototxt = os.path.join(self.dir, 'net.prototxt')
+        with open(self.prototxt, 'w') as f:
+            f.write(NET)
+        self.net = caffe.Net(self.prototxt, caffe.TEST)
+        self.solver_param = caffe_pb2.SolverParameter(net=self.prototxt)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _load(self, filename):
+        model = caffe_pb2.NetParameter()
+        with open(filename, 'rb') as f:
+            model.ParseFromString(f.read())
+        return model
+
+    def test_matches_net_save(self):
+        saved = os.path.join(self.dir, 'saved.caffemodel')
+        written = os.path.join(self.dir, 'written.caffemodel')
+        self.net.save(saved)
+        params = [(name, [blob.data.copy() for blob in blobs]) for name, blobs in self.net.params.iteritems()]
+        _write_caffemodel(written, params, _net_parameter(self.solver_param, self.net))
+
+        expected = dict((layer.name, layer) for layer in self._load(saved).layer if layer.blobs)
+        layers = dict((layer.name, layer) for layer in self._load(written).layer if layer.blobs)
+        self.assertEqual(sorted(layers.keys()), sorted(expected.keys()))
+        for name, layer in layers.iteritems():
+            self.assertEqual(layer.type, expected[name].type)
+            self.assertEqual(layer.convolution_param, expected[name].convolution_param)
+            for blob, expected_blob in zip(layer.blobs, expected[name].blobs):
+                self.assertEqual(list(blob.shape.dim), list(expected_blob.shape.dim))
+                np.testing.assert_array_equal(blob.data, expected_blob.data)
+
+    def test_copy_from(self):
+        written = os.path.join(self.dir, 'written.caffemodel')
+        params = [(name, [blob.data.copy() for blob in blobs]) for name, blobs in self.net.params.iteritems()]
+        _write_caffemodel(written, params, _net_parameter(self.solver_param, self.net))
+        net = caffe.Net(self.prototxt, written, caffe.TEST)
+        for name, arrays in params:
+            for blob, array in zip(net.params[name], arrays):
+                np.testing.assert_array_equal(blob.data, array)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import unittest
+import numpy as np
+from utils.blob import chromatic_transform
+from utils.color_augmentation import chromatic_luts, chromatic_transform_batch, chromatic_transform_images
+
+class ColorAugmentationTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def _offsets(self, num):
+        d_h = (np.random.rand(num) - 0.5) * 0.2 * 180
+        d_l = (np.random.rand(num) - 0.5) * 0.2 * 256
+        d_s = (np.random.rand(num) - 0.5) * 0.2 * 256
+        return d_h, d_l, d_s
+
+    def test_luts(self):
+        luts = chromatic_luts([10.5, -10.5], [20.0, -20.0], [-30.0, 30.0])
+        self.assertEqual(luts.shape, (2, 256, 1, 3))
+        # the hue wraps around at 180, the lightness and saturation are clipped
+        self.assertEqual(luts[0, 175, 0, 0], 5)
+        self.assertEqual(luts[1, 5, 0, 0], 174)
+        self.assertEqual(luts[0, 250, 0, 1], 255)
+        self.assertEqual(luts[1, 10, 0, 1], 0)
+        self.assertEqual(luts[0, 10, 0, 2], 0)
+
+    def test_batch_matches_chromatic_transform(self):
+        num = 4
+        ims = np.random.randint(0, 256, (num, 24, 32, 3)).astype(np.uint8)
+        d_h, d_l, d_s = self._offsets(num)
+        expected = [chromatic_transform(ims[i], d_h[i:i + 1], d_s[i:i + 1], d_l[i:i + 1]) for i in xrange(num)]
+        result = chromatic_transform_batch(ims.copy(), d_h, d_l, d_s)
+        for i in xrange(num):
+            np.testing.assert_array_equal(result[i], expected[i])
+
+    def test_batch_is_in_place(self):
+        ims = np.random.randint(0, 256, (2, 8, 8, 3)).astype(np.uint8)
+        self.assertIs(chromatic_transform_batch(ims), ims)
+
+    def test_images_of_different_sizes(self):
+        ims = [np.random.randint(0, 256, shape).astype(np.uint8) for shape in [(8, 8, 3), (16, 8, 3)]]
+        result = chromatic_transform_images([im.copy() for im in ims])
+        self.assertEqual([im.shape for im in result], [im.shape for im in ims])
+
+
+if __name__ == '__main__':
+    unittest.main()
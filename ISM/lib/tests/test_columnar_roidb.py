@@ -0,0 +1,70 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import cPickle
+import unittest
+from datasets.columnar_roidb import ColumnarRoidb
+
+def _entries(num):
+    class_colors = [(255, 255, 255), (255, 0, 0)]
+    entries = []
+    for i in xrange(num):
+        entries.append({'image': '/data/LOV/{:06d}-color.png'.format(i),
+                        'video_id': '{:04d}'.format(i / 3),
+                        'class_colors': class_colors,
+                        'flipped': i % 2 == 1})
+    return entries
+
+
+class ColumnarRoidbTest(unittest.TestCase):
+
+    def test_entries_round_trip(self):
+        entries = _entries(10)
+        roidb = ColumnarRoidb(entries)
+        self.assertEqual(len(roidb), 10)
+        self.assertEqual(list(roidb), entries)
+        self.assertEqual(roidb[-1], entries[-1])
+
+    def test_shared_values_are_constants(self):
+        roidb = ColumnarRoidb(_entries(4))
+        self.assertIn('class_colors', roidb._constants)
+        self.assertEqual(roidb._columns['image'].prefix, '/data/LOV/00000')
+
+    def test_changing_an_entry_does_not_change_the_roidb(self):
+        roidb = ColumnarRoidb(_entries(3))
+        entry = roidb[0]
+        entry['image'] = 'other.png'
+        self.assertEqual(roidb[0]['image'], '/data/LOV/000000-color.png')
+
+    def test_append_flipped(self):
+        entries = _entries(9)
+        roidb = ColumnarRoidb(entries)
+        roidb.append_flipped()
+        self.assertEqual(len(roidb), 18)
+        for i in xrange(9):
+            self.assertEqual(roidb[i], entries[i])
+            flipped = dict(entries[i], flipped=True)
+            self.assertEqual(roidb[9 + i], flipped)
+
+    def test_slice_shares_the_columns(self):
+        entries = _entries(12)
+        roidb = ColumnarRoidb(entries)
+        part = roidb[3:10:2]
+        self.assertIsInstance(part, ColumnarRoidb)
+        self.assertIs(part._columns, roidb._columns)
+        self.assertEqual(list(part), entries[3:10:2])
+
+    def test_pickle(self):
+        entries = _entries(5)
+        roidb = ColumnarRoidb(entries)
+        roidb.append_flipped()
+        loaded = cPickle.loads(cPickle.dumps(roidb, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(list(loaded), list(roidb))
+
+
+if __name__ == '__main__':
+    unittest.main()
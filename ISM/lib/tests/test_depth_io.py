@@ -0,0 +1,62 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from utils.depth_io import write_depth, read_depth, read_depths, ZDEPTH_ROWS
+
+class DepthIOTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.dir = tempfile.mkdtemp()
+        # the height is not a multiple of the zdepth chunks, and the jumps
+        # between 0 and 65535 make the deltas wrap around
+        self.depth = np.random.randint(0, 65536, size=(ZDEPTH_ROWS + 5, 37)).astype(np.uint16)
+        self.depth[:, :4] = [0, 65535, 0, 65535]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        for ext in ['.png', '.npy', '.zdepth']:
+            filename = os.path.join(self.dir, 'depth' + ext)
+            write_depth(filename, self.depth)
+            depth = read_depth(filename)
+            self.assertEqual(depth.dtype, np.uint16, ext)
+            np.testing.assert_array_equal(depth, self.depth)
+
+    def test_levels(self):
+        for level in [0, 9]:
+            filename = os.path.join(self.dir, 'depth{:d}.zdepth'.format(level))
+            write_depth(filename, self.depth, level)
+            np.testing.assert_array_equal(read_depth(filename), self.depth)
+
+    def test_read_depths_keeps_the_order(self):
+        filenames = []
+        for i in xrange(6):
+            filenames.append(os.path.join(self.dir, '{:d}.zdepth'.format(i)))
+            write_depth(filenames[-1], self.depth + i)
+        depths = read_depths(filenames, num_threads=3)
+        for i, depth in enumerate(depths):
+            np.testing.assert_array_equal(depth, self.depth + i)
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, write_depth, os.path.join(self.dir, 'depth.jpg'), self.depth)
+
+    def test_not_a_zdepth_file(self):
+        filename = os.path.join(self.dir, 'depth.zdepth')
+        with open(filename, 'wb') as f:
+            f.write('\0' * 64)
+        self.assertRaises(ValueError, read_depth, filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
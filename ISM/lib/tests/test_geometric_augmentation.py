@@ -0,0 +1,86 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import unittest
+import numpy as np
+import cv2
+from ism.config import cfg
+from utils.geometric_augmentation import sample_affine, scale_affine, scaled_shape, \
+    warp_image, warp_nearest, warp_input, warp_intrinsics
+
+def _smooth_image(height, width):
+    y, x = np.mgrid[:height, :width].astype(np.float64)
+    im = np.dstack((100 + 50 * np.sin(x / 7.0), 100 + 50 * np.cos(y / 5.0), 100 + 0.5 * (x + y)))
+    return im.astype(np.uint8)
+
+
+class GeometricAugmentationTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_sample_affine(self):
+        for _ in xrange(10):
+            A = sample_affine(48, 64)
+            scale = np.sqrt(np.linalg.det(A[:, :2]))
+            self.assertTrue(cfg.TRAIN.AFFINE_SCALES[0] <= scale <= cfg.TRAIN.AFFINE_SCALES[1])
+
+    def test_warp_intrinsics(self):
+        K = np.array([[500.0, 0, 320], [0, 500, 240], [0, 0, 1]])
+        A = cv2.getRotationMatrix2D((320, 240), 8, 1.1)
+        A[:, 2] += [5, -3]
+        X = np.array([0.1, -0.2, 0.9])
+        x = np.dot(K, X)
+        x = x[:2] / x[2]
+        x_warped = np.dot(warp_intrinsics(K, A), X)
+        np.testing.assert_allclose(x_warped[:2] / x_warped[2], np.dot(A, np.append(x, 1)))
+
+    def test_warp_nearest_keeps_the_labels(self):
+        labels = np.random.randint(1, 5, (48, 64)).astype(np.int32)
+        A = cv2.getRotationMatrix2D((32, 24), 13, 1.2)
+        warped = warp_nearest(labels, A)
+        self.assertEqual(warped.shape, labels.shape)
+        self.assertTrue(set(np.unique(warped)) <= set(range(5)))
+        np.testing.assert_array_equal(warp_nearest(labels, np.eye(2, 3)), labels)
+
+    def test_scale_affine_matches_resize(self):
+        im = _smooth_image(48, 64)
+        for scale in [0.5, 2.0]:
+            shape = scaled_shape(48, 64, scale)
+            expected = cv2.resize(im, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+            result = warp_image(im, scale_affine(np.eye(2, 3), scale), shape=shape)
+            self.assertEqual(result.shape, expected.shape)
+            # away from the border, which warpAffine fills and resize replicates
+            diff = np.abs(result.astype(np.int32) - expected)[2:-2, 2:-2]
+            self.assertLessEqual(diff.max(), 1)
+
+    def test_warp_input_matches_warp_then_subtract(self):
+        im = _smooth_image(48, 64)
+        A = cv2.getRotationMatrix2D((32, 24), 10, 1.1)
+        for scale in [0.5, 2.0]:
+            A_scaled = scale_affine(A, scale)
+            shape = scaled_shape(48, 64, scale)
+            expected = warp_image(im, A_scaled, shape=shape).astype(np.float32) - cfg.PIXEL_MEANS
+            result = warp_input(im, A_scaled, shape)
+            self.assertEqual(result.dtype, np.float32)
+            self.assertEqual(result.shape, shape + (3,))
+            # the uint8 warp rounds, the float warp does not
+            np.testing.assert_allclose(result, expected, atol=1.0)
+
+    def test_warp_input_single_channel(self):
+        depth = np.random.randint(0, 256, (48, 64)).astype(np.uint8)
+        A = np.array([[1.0, 0, 10], [0, 1, 0]])
+        for scale in [0.5, 2.0]:
+            shape = scaled_shape(48, 64, scale)
+            result = warp_input(depth, scale_affine(A, scale), shape, nearest=True)
+            self.assertEqual(result.shape, shape + (3,))
+            # the columns shifted in from outside the image are 0 before the means
+            np.testing.assert_allclose(result[:, 0], np.tile(-cfg.PIXEL_MEANS.reshape((1, 3)), (shape[0], 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
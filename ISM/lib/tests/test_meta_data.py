@@ -0,0 +1,80 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import scipy.io
+from utils.meta_data import save_meta_data, load_meta_data, binary_path, meta_data_path
+
+def _meta_data():
+    return {'intrinsic_matrix': np.array([[1066.8, 0, 313.0], [0, 1067.5, 241.3], [0, 0, 1]]),
+            'rotation_translation_matrix': np.random.rand(3, 4),
+            'factor_depth': np.array([[10000.0]]),
+            'poses': np.random.rand(3, 4, 3),
+            'cls_indexes': np.array([[1], [4], [9]], dtype=np.uint8),
+            'vertmap': np.random.rand(6, 8, 3).astype(np.float32)}
+
+
+class MetaDataTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.dir = tempfile.mkdtemp()
+        self.mat_file = os.path.join(self.dir, '000001-meta.mat')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def assertMetaDataEqual(self, a, b):
+        self.assertEqual(sorted(a.keys()), sorted(b.keys()))
+        for key in a:
+            self.assertEqual(a[key].shape, b[key].shape, key)
+            self.assertEqual(a[key].dtype, b[key].dtype, key)
+            np.testing.assert_array_equal(a[key], b[key])
+
+    def test_round_trip(self):
+        meta_data = _meta_data()
+        filename = binary_path(self.mat_file)
+        self.assertEqual(save_meta_data(filename, meta_data), [])
+        loaded = load_meta_data(filename)
+        self.assertMetaDataEqual(loaded, meta_data)
+        self.assertFalse(loaded['vertmap'].flags.writeable)
+
+    def test_single_pose(self):
+        meta_data = {'poses': np.random.rand(3, 4)}
+        save_meta_data(binary_path(self.mat_file), meta_data)
+        loaded = load_meta_data(binary_path(self.mat_file))
+        np.testing.assert_array_equal(loaded['poses'], meta_data['poses'][:, :, np.newaxis])
+
+    def test_non_numeric_arrays_are_skipped(self):
+        meta_data = {'factor_depth': np.array([[1000.0]]), 'name': np.array(['scene'])}
+        self.assertEqual(save_meta_data(binary_path(self.mat_file), meta_data), ['name'])
+        self.assertEqual(load_meta_data(binary_path(self.mat_file)).keys(), ['factor_depth'])
+
+    def test_matches_loadmat(self):
+        scipy.io.savemat(self.mat_file, _meta_data())
+        self.assertEqual(meta_data_path(self.mat_file), self.mat_file)
+        from_mat = load_meta_data(self.mat_file)
+
+        save_meta_data(binary_path(self.mat_file), from_mat)
+        self.assertEqual(meta_data_path(self.mat_file), binary_path(self.mat_file))
+        from_bin = load_meta_data(self.mat_file)
+        from_mat = dict((key, value) for key, value in from_mat.iteritems() if not key.startswith('__'))
+        self.assertMetaDataEqual(from_bin, from_mat)
+
+    def test_not_a_meta_data_file(self):
+        filename = binary_path(self.mat_file)
+        with open(filename, 'wb') as f:
+            f.write('\0' * 64)
+        self.assertRaises(ValueError, load_meta_data, filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
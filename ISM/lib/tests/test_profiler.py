@@ -0,0 +1,57 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import os
+import unittest
+import numpy as np
+from utils import profiler
+
+MB = 1 << 20
+
+class BudgetTest(unittest.TestCase):
+
+    def test_longest_matching_stage(self):
+        budgets = [['minibatch', 100], ['minibatch/normals', 10], ['normals', 1000]]
+        stats = {'iteration/minibatch': (150 * MB, 0),
+                 'iteration/minibatch/normals': (20 * MB, 0),
+                 'test/normals': (20 * MB, 0),
+                 'iteration/forward': (500 * MB, 0)}
+        self.assertEqual(profiler.budget_violations(budgets, stats),
+                         [('iteration/minibatch', 150.0, 100), ('iteration/minibatch/normals', 20.0, 10)])
+
+    def test_stage_names_match_whole_scopes(self):
+        stats = {'iteration/gt_minibatch': (150 * MB, 0)}
+        self.assertEqual(profiler.budget_violations([['minibatch', 100]], stats), [])
+
+    def test_format_violations(self):
+        lines = profiler.format_violations([('iteration/minibatch', 150.0, 100)])
+        self.assertEqual(lines, ['iteration/minibatch peak 150.0MB over its budget of 100.0MB'])
+
+
+@unittest.skipUnless(os.path.exists('/proc/self/clear_refs'), 'memory is recorded on Linux only')
+class MemoryTest(unittest.TestCase):
+
+    def tearDown(self):
+        profiler.disable()
+
+    def test_peak_of_a_stage(self):
+        profiler.enable(memory=True)
+        with profiler.scope('outer'):
+            with profiler.scope('allocate'):
+                a = np.ones((64 * MB,), dtype=np.uint8)
+                del a
+        stats = profiler.memory_stats()
+        self.assertEqual(sorted(stats.keys()), ['outer', 'outer/allocate'])
+        self.assertGreater(stats['outer/allocate'][0], 60 * MB)
+        # the array is freed inside the scope
+        self.assertLess(stats['outer/allocate'][1], 4 * MB)
+        self.assertEqual(len(profiler.budget_violations([['allocate', 32]])), 1)
+        self.assertEqual(profiler.budget_violations([['allocate', 128]]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+from ism.config import cfg
+from datasets.imdb import imdb
+
+class _FileImdb(imdb):
+    """An imdb whose roidb entries are the contents of one file per index."""
+
+    def __init__(self, dirname):
+        imdb.__init__(self, 'files')
+        self._dir = dirname
+        self._image_index = ['a', 'b', 'c']
+        self.loaded = []
+
+    @property
+    def cache_path(self):
+        return self._dir
+
+    def roidb_source_files(self, index):
+        return [os.path.join(self._dir, index + '.txt')]
+
+    def _load_entry(self, index):
+        self.loaded.append(index)
+        with open(self.roidb_source_files(index)[0]) as f:
+            return {'text': f.read()}
+
+
+class RoidbCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for index in ['a', 'b', 'c']:
+            self._write(index, index, 1000)
+        self.num_workers = cfg.ROIDB_NUM_WORKERS
+        cfg.ROIDB_NUM_WORKERS = 1
+
+    def tearDown(self):
+        cfg.ROIDB_NUM_WORKERS = self.num_workers
+        cfg.ROIDB_DIR_STAMPS = False
+        shutil.rmtree(self.dir)
+
+    def _write(self, index, text, mtime):
+        filename = os.path.join(self.dir, index + '.txt')
+        with open(filename, 'w') as f:
+            f.write(text)
+        os.utime(filename, (mtime, mtime))
+        os.utime(self.dir, (1000, 1000))
+
+    def test_only_stale_entries_are_rebuilt(self):
+        db = _FileImdb(self.dir)
+        self.assertEqual(db.cached_roidb('_load_entry'), [{'text': 'a'}, {'text': 'b'}, {'text': 'c'}])
+
+        # rewritten in place: the directory keeps its modification time
+        self._write('b', 'new', 2000)
+        db = _FileImdb(self.dir)
+        self.assertEqual(db.cached_roidb('_load_entry'), [{'text': 'a'}, {'text': 'new'}, {'text': 'c'}])
+        self.assertEqual(db.loaded, ['b'])
+
+        db = _FileImdb(self.dir)
+        db.cached_roidb('_load_entry')
+        self.assertEqual(db.loaded, [])
+
+    def test_directory_stamps_miss_files_rewritten_in_place(self):
+        cfg.ROIDB_DIR_STAMPS = True
+        _FileImdb(self.dir).cached_roidb('_load_entry')
+        self._write('b', 'new', 2000)
+        db = _FileImdb(self.dir)
+        self.assertEqual(db.cached_roidb('_load_entry')[1], {'text': 'b'})
+        self.assertEqual(db.loaded, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import PIL.Image
+from easydict import EasyDict as edict
+from utils.sampler import get_minibatch_db, padded_shape, padding_fraction, BucketSampler, \
+    ClassBalancedSampler, HardExampleSampler, get_sampler
+
+class MinibatchDbTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.roidb = [{'image': '{:d}.png'.format(i), 'flipped': False} for i in xrange(10)]
+
+    def test_entries_in_order(self):
+        minibatch_db = get_minibatch_db(self.roidb, [3, 1, 7])
+        self.assertEqual([entry['image'] for entry in minibatch_db], ['3.png', '1.png', '7.png'])
+        self.assertIs(minibatch_db[0], self.roidb[3])
+
+    def test_random_flip_copies_the_entries(self):
+        flips = []
+        for _ in xrange(100):
+            minibatch_db = get_minibatch_db(self.roidb, [0, 5], random_flip=True)
+            self.assertEqual([entry['image'] for entry in minibatch_db], ['0.png', '5.png'])
+            flips.extend(entry['flipped'] for entry in minibatch_db)
+        self.assertTrue(0.3 < np.mean(flips) < 0.7)
+        self.assertFalse(any(entry['flipped'] for entry in self.roidb))
+
+
+class PaddingTest(unittest.TestCase):
+
+    def test_padded_shape(self):
+        self.assertEqual(padded_shape(480, 640, 16), (480, 640))
+        self.assertEqual(padded_shape(481, 630, 16), (496, 640))
+
+    def test_padding_fraction(self):
+        self.assertEqual(padding_fraction([(32, 32), (32, 32)]), 0.0)
+        self.assertAlmostEqual(padding_fraction([(32, 32), (16, 32)]), 0.25)
+
+
+class BucketSamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.dir = tempfile.mkdtemp()
+        self.roidb = []
+        for i, (height, width) in enumerate([(48, 64)] * 5 + [(40, 60)] * 4 + [(64, 48)] * 3):
+            filename = os.path.join(self.dir, '{:d}.png'.format(i))
+            PIL.Image.new('RGB', (width, height)).save(filename)
+            self.roidb.append({'image': filename, 'flipped': False})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_batches_have_one_padded_shape(self):
+        sampler = BucketSampler(self.roidb, 2)
+        self.assertEqual(sampler.padding_fraction(), 0.0)
+        for _ in xrange(20):
+            db_inds = sampler.next_minibatch_inds()
+            self.assertTrue(1 <= len(db_inds) <= 2)
+            self.assertEqual(len(set(sampler._shapes[i] for i in db_inds)), 1)
+
+    def test_epoch_visits_whole_batches(self):
+        sampler = BucketSampler(self.roidb, 2)
+        inds = np.concatenate([sampler.next_minibatch_inds() for _ in xrange(len(sampler._batches))])
+        # 40x60 pads to 48x64, so the buckets hold 9 and 3 images and one
+        # image of each is left out of the epoch
+        self.assertEqual(len(inds), 10)
+        self.assertEqual(len(set(inds)), 10)
+
+
+class ClassBalancedSamplerTest(unittest.TestCase):
+
+    def test_rare_class_is_oversampled(self):
+        np.random.seed(0)
+        # class 1 is in every frame, class 2 only in frame 0
+        class_histograms = np.zeros((100, 3), dtype=np.int64)
+        class_histograms[:, 1] = 100
+        class_histograms[0, 2] = 10
+        sampler = ClassBalancedSampler(class_histograms, 4, thresh=0.25)
+        inds = np.concatenate([sampler.next_minibatch_inds() for _ in xrange(2000)])
+        self.assertTrue(inds.min() >= 0 and inds.max() < 100)
+        # frame 0 has the repeat factor sqrt(0.25 / 0.01) = 5
+        self.assertAlmostEqual(np.mean(inds == 0), 5 / 104.0, delta=0.01)
+
+
+class HardExampleSamplerTest(unittest.TestCase):
+
+    def test_running_losses(self):
+        sampler = HardExampleSampler(4, 2, momentum=0.5, uniform_fraction=0.0)
+        sampler.update_losses(np.array([0, 1]), 2.0)
+        sampler.update_losses(np.array([1, 2]), 4.0)
+        np.testing.assert_allclose(sampler._losses, [2.0, 3.0, 4.0, 0.0])
+        # frame 3 is not seen yet and weighs as the mean of the others
+        np.testing.assert_allclose(np.diff(np.concatenate(([0], sampler._cdf))), np.array([2, 3, 4, 3]) / 12.0)
+
+    def test_uniform_fraction(self):
+        sampler = HardExampleSampler(4, 2, momentum=0.0, uniform_fraction=0.5)
+        sampler.update_losses(np.array([0, 1, 2, 3]), 0.0)
+        sampler.update_losses(np.array([0]), 1.0)
+        np.testing.assert_allclose(np.diff(np.concatenate(([0], sampler._cdf))), [0.625, 0.125, 0.125, 0.125])
+
+    def test_rebuild_iters(self):
+        sampler = HardExampleSampler(4, 2, momentum=0.0, uniform_fraction=0.0, rebuild_iters=2)
+        uniform = sampler._cdf.copy()
+        sampler.update_losses(np.array([0]), 1.0)
+        np.testing.assert_array_equal(sampler._cdf, uniform)
+        sampler.update_losses(np.array([1]), 3.0)
+        np.testing.assert_allclose(sampler._cdf, [0.125, 0.5, 0.75, 1.0])
+
+
+class GetSamplerTest(unittest.TestCase):
+
+    def test_selects_the_sampler(self):
+        train_cfg = edict({'SAMPLER': 'random', 'IMS_PER_BATCH': 2, 'SAMPLER_REPEAT_THRESH': 0.1,
+                           'SAMPLER_LOSS_MOMENTUM': 0.9, 'SAMPLER_UNIFORM_FRACTION': 0.2,
+                           'SAMPLER_REBUILD_ITERS': 10})
+        roidb = [{'class_histogram': np.array([0, i % 2, 1])} for i in xrange(6)]
+        self.assertIsNone(get_sampler(roidb, train_cfg))
+        train_cfg.SAMPLER = 'class_balanced'
+        self.assertIsInstance(get_sampler(roidb, train_cfg), ClassBalancedSampler)
+        train_cfg.SAMPLER = 'hard_example'
+        self.assertIsInstance(get_sampler(roidb, train_cfg), HardExampleSampler)
+        train_cfg.SAMPLER = 'other'
+        self.assertRaises(ValueError, get_sampler, roidb, train_cfg)
+
+
+if __name__ == '__main__':
+    unittest.main()
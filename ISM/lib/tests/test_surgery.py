@@ -0,0 +1,75 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+import unittest
+import numpy as np
+from ism.surgery import SurgeryPlan, depth_plan, transplant_plan, upsample_filt, interp
+
+class Blob(object):
+    def __init__(self, shape):
+        self.data = np.random.rand(*shape).astype(np.float32)
+
+
+class Net(object):
+    def __init__(self, shapes):
+        self.params = dict((name, [Blob(shape) for shape in blob_shapes]) for name, blob_shapes in shapes)
+
+
+class SurgeryTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_plan_copies_and_coerces(self):
+        src = np.arange(12, dtype=np.float32)
+        plan = SurgeryPlan()
+        same = np.zeros((12,), dtype=np.float32)
+        reshaped = np.zeros((3, 2, 2), dtype=np.float32)
+        plan.add(src, same, None)
+        plan.add(src, reshaped, None)
+        self.assertEqual(len(plan), 2)
+        plan.apply(verbose=False)
+        np.testing.assert_array_equal(same, src)
+        np.testing.assert_array_equal(reshaped.reshape(-1), src)
+
+    def test_depth_plan(self):
+        net = Net([('conv1', [(4, 3, 3, 3), (4,)]), ('conv1_d', [(4, 3, 3, 3), (4,)]),
+                   ('conv2', [(8, 4, 3, 3), (8,)])])
+        plan = depth_plan(net)
+        self.assertEqual(len(plan), 2)
+        plan.apply(verbose=False)
+        for i in xrange(2):
+            np.testing.assert_array_equal(net.params['conv1_d'][i].data, net.params['conv1'][i].data)
+
+    def test_transplant_plan(self):
+        # fc6 becomes a convolution and fc8 is dropped
+        net = Net([('fc6', [(16, 12), (16,)]), ('fc8', [(5, 16), (5,)])])
+        new_net = Net([('fc6', [(16, 3, 2, 2), (16,)])])
+        transplant_plan(new_net, net).apply(verbose=False)
+        np.testing.assert_array_equal(new_net.params['fc6'][0].data.reshape((16, 12)), net.params['fc6'][0].data)
+        np.testing.assert_array_equal(new_net.params['fc6'][1].data, net.params['fc6'][1].data)
+
+    def test_upsample_filt(self):
+        np.testing.assert_allclose(upsample_filt(4)[0], [0.0625, 0.1875, 0.1875, 0.0625])
+        self.assertIs(upsample_filt(4), upsample_filt(4))
+        self.assertEqual(upsample_filt(3)[1, 1], 1.0)
+
+    def test_interp(self):
+        net = Net([('upscore', [(3, 3, 4, 4)]), ('upscore_single', [(3, 1, 4, 4)])])
+        data = net.params['upscore'][0].data
+        off_diagonal = data[0, 1].copy()
+        interp(net, ['upscore', 'upscore_single'])
+        for i in xrange(3):
+            np.testing.assert_allclose(data[i, i], upsample_filt(4))
+        # only the diagonal filters are set
+        np.testing.assert_array_equal(data[0, 1], off_diagonal)
+        np.testing.assert_allclose(net.params['upscore_single'][0].data[:, 0], np.tile(upsample_filt(4), (3, 1, 1)))
+        self.assertRaises(ValueError, interp, Net([('up', [(3, 2, 4, 4)])]), ['up'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Chromatic augmentation of a batch of color images.
+
+Computes the same images as utils.blob.chromatic_transform: a random hue,
+lightness and saturation offset per image in HLS space. The hue wraps
+around at 180, and the lightness and saturation are clipped to [0, 255].
+Every channel of a uint8 image has only 256 values, so the offsets are
+applied as one 256-entry lookup table per image, in place on the uint8
+data. The HLS conversions run once on the whole batch.
+"""
+
+import numpy as np
+import cv2
+
+def chromatic_luts(d_h, d_l, d_s):
+    """The (N, 256, 1, 3) uint8 lookup tables of the per-image offsets."""
+    values = np.arange(256, dtype=np.float64)
+    luts = np.empty((len(d_h), 256, 1, 3), dtype=np.uint8)
+    luts[:, :, 0, 0] = np.mod(values + np.reshape(d_h, (-1, 1)), 180)
+    luts[:, :, 0, 1] = np.clip(values + np.reshape(d_l, (-1, 1)), 0, 255)
+    luts[:, :, 0, 2] = np.clip(values + np.reshape(d_s, (-1, 1)), 0, 255)
+    return luts
+
+
+def chromatic_transform_batch(ims, d_h=None, d_l=None, d_s=None):
+    """
+    Add random hue, lightness and saturation offsets to an (N, H, W, 3)
+    uint8 batch of BGR images, in place. The offsets range from -0.1 to 0.1
+    of the channel ranges unless given, one per image.
+    """
+    num = ims.shape[0]
+    if d_h is None:
+        d_h = (np.random.rand(num) - 0.5) * 0.2 * 180
+    if d_l is None:
+        d_l = (np.random.rand(num) - 0.5) * 0.2 * 256
+    if d_s is None:
+        d_s = (np.random.rand(num) - 0.5) * 0.2 * 256
+    luts = chromatic_luts(d_h, d_l, d_s)
+
+    # the batch as one tall image for the conversions
+    height, width = ims.shape[1], ims.shape[2]
+    tall = ims.reshape((num * height, width, 3))
+    cv2.cvtColor(tall, cv2.COLOR_BGR2HLS, dst=tall)
+    for i in xrange(num):
+        im = tall[i * height:(i + 1) * height]
+        cv2.LUT(im, luts[i], dst=im)
+    cv2.cvtColor(tall, cv2.COLOR_HLS2BGR, dst=tall)
+    return ims
+
+
+def chromatic_transform_images(ims):
+    """Apply the chromatic transform to a list of images, batched where they have the same size."""
+    if len(set(im.shape for im in ims)) == 1:
+        return list(chromatic_transform_batch(np.stack(ims)))
+    return [chromatic_transform_batch(np.ascontiguousarray(im[np.newaxis]))[0] for im in ims]
+
+
+if __name__ == '__main__':
+    # compare with utils.blob.chromatic_transform on a batch of 640x480 images
+    import time
+    from utils.blob import chromatic_transform
+
+    num, height, width = 2, 480, 640
+    np.random.seed(0)
+    ims = np.random.randint(0, 256, (num, height, width, 3)).astype(np.uint8)
+    d_h = (np.random.rand(num) - 0.5) * 0.2 * 180
+    d_l = (np.random.rand(num) - 0.5) * 0.2 * 256
+    d_s = (np.random.rand(num) - 0.5) * 0.2 * 256
+
+    expected = [chromatic_transform(ims[i], d_h[i:i + 1], d_s[i:i + 1], d_l[i:i + 1]) for i in xrange(num)]
+    result = chromatic_transform_batch(ims.copy(), d_h, d_l, d_s)
+    print 'max difference {:d}'.format(max(int(np.abs(result[i].astype(np.int32) - expected[i]).max()) for i in xrange(num)))
+
+    for num in (2, 8, 32):
+        batch = np.random.randint(0, 256, (num, height, width, 3)).astype(np.uint8)
+        repeats = max(1, 64 // num)
+        t = time.time()
+        for _ in xrange(repeats):
+            for i in xrange(num):
+                chromatic_transform(batch[i])
+        t_image = (time.time() - t) / (repeats * num)
+        t = time.time()
+        for _ in xrange(repeats):
+            chromatic_transform_batch(batch)
+        t_batch = (time.time() - t) / (repeats * num)
+        print 'batch of {:d}: {:.0f} images / s per image, {:.0f} images / s batched'.format(
+            num, 1 / t_image, 1 / t_batch)
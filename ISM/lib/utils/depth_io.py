@@ -0,0 +1,175 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Reading and writing uint16 depth images.
+
+The codec is chosen by the file extension:
+    .png     16-bit greyscale PNG, written by OpenCV with a tunable zlib
+             level, or by pypng where OpenCV is missing (e.g. in Blender)
+    .npy     the raw array
+    .zdepth  the rows delta-coded and compressed with zlib in chunks of
+             ZDEPTH_ROWS rows
+
+Neighbouring depth values are close, so the deltas compress much better
+than the values themselves; PNG does the same with its row filters. zlib
+and the OpenCV decoders release the GIL, so read_depths() reads a list of
+files with a pool of threads.
+
+This module also runs under Python 3, for the renderers.
+"""
+
+import os
+import struct
+import zlib
+import numpy as np
+from multiprocessing.pool import ThreadPool
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# zlib level of the PNG and zdepth files, 0 (none) to 9 (smallest)
+DEFAULT_LEVEL = 1
+# rows per zlib chunk of a zdepth file
+ZDEPTH_ROWS = 64
+ZDEPTH_MAGIC = b'ZDEPTH\0\0'
+_ZDEPTH_HEADER = struct.Struct('<8s4I')
+
+def _encode_zdepth(depth, level):
+    height, width = depth.shape
+    chunks = []
+    for start in range(0, height, ZDEPTH_ROWS):
+        rows = depth[start:start + ZDEPTH_ROWS]
+        delta = rows.copy()
+        delta[:, 1:] -= rows[:, :-1]
+        chunks.append(zlib.compress(delta.tobytes(), level))
+    header = _ZDEPTH_HEADER.pack(ZDEPTH_MAGIC, height, width, ZDEPTH_ROWS, len(chunks))
+    sizes = struct.pack('<%dI' % len(chunks), *[len(chunk) for chunk in chunks])
+    return b''.join([header, sizes] + chunks)
+
+
+def _decode_zdepth(data, filename):
+    magic, height, width, chunk_rows, num_chunks = _ZDEPTH_HEADER.unpack_from(data)
+    if magic != ZDEPTH_MAGIC:
+        raise ValueError('{} is not a zdepth file'.format(filename))
+    sizes = struct.unpack_from('<%dI' % num_chunks, data, _ZDEPTH_HEADER.size)
+    depth = np.empty((height, width), dtype=np.uint16)
+    offset = _ZDEPTH_HEADER.size + 4 * num_chunks
+    for i, size in enumerate(sizes):
+        delta = np.frombuffer(zlib.decompress(data[offset:offset + size]), dtype='<u2')
+        rows = depth[i * chunk_rows:(i + 1) * chunk_rows]
+        # the sums wrap around like the deltas did
+        np.cumsum(delta.reshape(rows.shape), axis=1, dtype=np.uint16, out=rows)
+        offset += size
+    return depth
+
+
+def write_depth(filename, depth, level=DEFAULT_LEVEL):
+    """Write a uint16 depth image with the codec of the file extension."""
+    depth = np.ascontiguousarray(depth, dtype=np.uint16)
+    ext = os.path.splitext(filename)[1]
+    if ext == '.png':
+        if cv2 is not None:
+            if not cv2.imwrite(filename, depth, [cv2.IMWRITE_PNG_COMPRESSION, level]):
+                raise IOError('cannot write {}'.format(filename))
+        else:
+            import png
+            with open(filename, 'wb') as f:
+                png.Writer(depth.shape[1], depth.shape[0], greyscale=True, alpha=False, bitdepth=16,
+                           compression=level).write(f, depth)
+    elif ext == '.npy':
+        np.save(filename, depth)
+    elif ext == '.zdepth':
+        with open(filename, 'wb') as f:
+            f.write(_encode_zdepth(depth, level))
+    else:
+        raise ValueError('unknown depth image format: {}'.format(filename))
+
+
+def read_depth(filename):
+    """Read a uint16 depth image written in any of the formats."""
+    ext = os.path.splitext(filename)[1]
+    if ext == '.npy':
+        return np.load(filename)
+    if ext == '.zdepth':
+        with open(filename, 'rb') as f:
+            return _decode_zdepth(f.read(), filename)
+    if cv2 is not None:
+        depth = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+        if depth is None:
+            raise IOError('cannot read {}'.format(filename))
+        return depth
+    import png
+    width, height, rows, info = png.Reader(filename=filename).read()
+    return np.vstack(rows).astype(np.uint16)
+
+
+_pool = None
+
+def read_depths(filenames, num_threads=4):
+    """Read a list of depth images with a pool of threads."""
+    global _pool
+    if len(filenames) <= 1 or num_threads <= 1:
+        return [read_depth(filename) for filename in filenames]
+    if _pool is None:
+        _pool = ThreadPool(num_threads)
+    return _pool.map(read_depth, filenames)
+
+
+if __name__ == '__main__':
+    # write and read 640x480 depth images in every format
+    import tempfile
+    import shutil
+    import time
+
+    def rendered_depth(height=480, width=640):
+        """A table top with spheres as rendered, 0 where nothing is hit."""
+        y, x = np.mgrid[:height, :width].astype(np.float64)
+        depth = 0.8 + 0.9 * y / height + 0.1 * x / width
+        depth[:height // 6] = 0
+        np.random.seed(0)
+        for _ in range(8):
+            cx, cy, r = np.random.uniform(60, width - 60), np.random.uniform(160, height - 40), np.random.uniform(20, 60)
+            d2 = (x - cx) ** 2 + (y - cy) ** 2
+            inside = d2 < r * r
+            depth[inside] -= 0.0005 * np.sqrt(r * r - d2[inside])
+        return (depth * 10000).astype(np.uint16)
+
+    def sensor_depth():
+        """The rendered depth with 1mm noise and holes, as from a depth camera."""
+        depth = rendered_depth().astype(np.float64)
+        depth += np.random.randn(*depth.shape) * 10
+        depth[np.random.rand(*depth.shape) < 0.02] = 0
+        return np.clip(depth, 0, 65535).astype(np.uint16)
+
+    codecs = [('.png', 0), ('.png', 1), ('.png', 3), ('.png', 9), ('.npy', 0), ('.zdepth', 1), ('.zdepth', 6)]
+    num_frames = 50
+    dirname = tempfile.mkdtemp()
+    try:
+        for name, depth in (('rendered', rendered_depth()), ('sensor', sensor_depth())):
+            print('{} depth, {:d} frames'.format(name, num_frames))
+            for ext, level in codecs:
+                filenames = [os.path.join(dirname, '%04d%s' % (i, ext)) for i in range(num_frames)]
+                t = time.time()
+                for filename in filenames:
+                    write_depth(filename, depth, level)
+                t_write = (time.time() - t) / num_frames
+                t = time.time()
+                for filename in filenames:
+                    assert np.array_equal(read_depth(filename), depth)
+                t_read = (time.time() - t) / num_frames
+                t = time.time()
+                read_depths(filenames, 4)
+                t_bulk = (time.time() - t) / num_frames
+                size = sum(os.path.getsize(filename) for filename in filenames) / float(num_frames)
+                print('  {:8s} level {:d}: write {:6.2f}ms, read {:6.2f}ms, threaded read {:6.2f}ms, {:7.1f}KB'.format(
+                    ext, level, t_write * 1000, t_read * 1000, t_bulk * 1000, size / 1024))
+                for filename in filenames:
+                    os.remove(filename)
+    finally:
+        shutil.rmtree(dirname)
@@ -0,0 +1,159 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Geometric augmentation that keeps the inputs and the labels aligned.
+
+One random affine transform A (scale, rotation and translation about the
+image center) is sampled per image and applied to every modality with one
+cv2.warpAffine: bilinear for color and normals, nearest neighbor for
+depth, labels and vertmaps, so depth edges and classes are never blended.
+
+Warping an image by A is the same as imaging the scene with the intrinsic
+matrix [A; 0 0 1] * K, with the camera frame unchanged. Depth values,
+normals and vertmap coordinates therefore stay as they are, and only the
+intrinsic matrix is updated with warp_intrinsics.
+
+The input images of the network are also scaled by TRAIN.SCALES_BASE.
+scale_affine folds that scale into A, and warp_input warps them once,
+straight to their scaled shape, instead of warping and then resizing them.
+"""
+
+import numpy as np
+import cv2
+from ism.config import cfg
+
+def sample_affine(height, width):
+    """Sample a 2x3 affine transform from the TRAIN.AFFINE_* ranges."""
+    scale = np.random.uniform(*cfg.TRAIN.AFFINE_SCALES)
+    angle = np.random.uniform(-cfg.TRAIN.AFFINE_ANGLE, cfg.TRAIN.AFFINE_ANGLE)
+    A = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, scale)
+    A[0, 2] += np.random.uniform(-cfg.TRAIN.AFFINE_SHIFT, cfg.TRAIN.AFFINE_SHIFT) * width
+    A[1, 2] += np.random.uniform(-cfg.TRAIN.AFFINE_SHIFT, cfg.TRAIN.AFFINE_SHIFT) * height
+    return A
+
+
+def scale_affine(A, scale):
+    """A followed by the resize of cv2.resize with fx = fy = scale."""
+    # cv2.resize scales about pixel centers: x' = scale * (x + 0.5) - 0.5
+    S = np.array([[scale, 0, 0.5 * (scale - 1)],
+                  [0, scale, 0.5 * (scale - 1)],
+                  [0, 0, 1]])
+    return np.dot(S, np.vstack((A, [0, 0, 1])))[:2]
+
+
+def scaled_shape(height, width, scale):
+    """Height and width of an image resized by cv2.resize with fx = fy = scale."""
+    return int(round(height * scale)), int(round(width * scale))
+
+
+def warp_image(im, A, border_value=0, shape=None):
+    """Warp a color or normal image bilinearly, to shape (height, width) if given."""
+    im = np.ascontiguousarray(im)
+    height, width = im.shape[:2] if shape is None else shape
+    return cv2.warpAffine(im, A, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=border_value)
+
+
+def warp_nearest(im, A, shape=None):
+    """Warp a depth, label or vertex image without mixing values, 0 outside."""
+    im = np.ascontiguousarray(im)
+    height, width = im.shape[:2] if shape is None else shape
+    return cv2.warpAffine(im, A, (width, height), flags=cv2.INTER_NEAREST,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def warp_input(im, A, shape, border_value=0, nearest=False):
+    """Warp an input image of the network to shape (height, width) and
+    subtract cfg.PIXEL_MEANS. Returns a float32 image with 3 channels.
+
+    A single channel image is repeated into the 3 channels. border_value is
+    the value outside of the image before the means are subtracted. The
+    means are subtracted on the side of the warp with fewer pixels.
+    """
+    flags = cv2.INTER_NEAREST if nearest else cv2.INTER_LINEAR
+    dsize = (shape[1], shape[0])
+    if shape[0] * shape[1] <= im.shape[0] * im.shape[1]:
+        im = cv2.warpAffine(np.ascontiguousarray(im), A, dsize, flags=flags,
+                            borderMode=cv2.BORDER_CONSTANT, borderValue=border_value)
+        if im.ndim == 2:
+            im = np.tile(im[:, :, np.newaxis], (1, 1, 3))
+        im = im.astype(np.float32, copy=True)
+        im -= cfg.PIXEL_MEANS
+    else:
+        if im.ndim == 2:
+            im = np.tile(im[:, :, np.newaxis], (1, 1, 3))
+        im = im.astype(np.float32, copy=True)
+        im -= cfg.PIXEL_MEANS
+        border = (border_value - cfg.PIXEL_MEANS.ravel()).tolist()
+        im = cv2.warpAffine(im, A, dsize, flags=flags,
+                            borderMode=cv2.BORDER_CONSTANT, borderValue=border)
+    return im
+
+
+def warp_intrinsics(K, A):
+    """The intrinsic matrix of the images warped by A."""
+    return np.dot(np.vstack((A, [0, 0, 1])), K)
+
+
+if __name__ == '__main__':
+    # samples / s of the network inputs of one 640x480 sample: a warp followed
+    # by a resize, against one warp with the scale folded in
+    import time
+
+    height, width = 480, 640
+    np.random.seed(0)
+    im = np.random.randint(0, 256, (height, width, 3)).astype(np.uint8)
+    im_normal = np.random.randint(0, 256, (height, width, 3)).astype(np.uint8)
+    im_depth = np.random.randint(0, 256, (height, width)).astype(np.float32)
+    K = np.array([[1066.8, 0, 313.0], [0, 1067.5, 241.3], [0, 0, 1]])
+    border = cfg.PIXEL_MEANS.ravel().tolist()
+
+    # a point projected with K lands where its warped pixel is projected with the new K
+    A = sample_affine(height, width)
+    X = np.array([0.1, -0.05, 0.8])
+    x = np.dot(K, X)
+    x_warped = np.dot(warp_intrinsics(K, A), X)
+    print 'projection error {:.2e} pixels'.format(np.abs(np.dot(A, np.append(x[:2] / x[2], 1)) - x_warped[:2] / x_warped[2]).max())
+
+    # the folded warp matches the warp and the resize
+    scale = 0.5
+    smooth = cv2.GaussianBlur(im, (0, 0), 4)
+    two_steps = cv2.resize(warp_image(smooth, A, border).astype(np.float32), None, None,
+                           fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+    one_step = warp_image(smooth, scale_affine(A, scale), border, scaled_shape(height, width, scale)).astype(np.float32)
+    inside = warp_nearest(np.ones((height, width), np.float32), scale_affine(A, scale), two_steps.shape[:2]) > 0
+    print 'folded warp: {} vs {}, mean difference {:.2f} gray levels'.format(
+        one_step.shape, two_steps.shape, np.abs(one_step - two_steps)[inside].mean())
+
+    def prep(im):
+        # mean subtraction as in the data layers
+        im = im.astype(np.float32, copy=True)
+        im -= cfg.PIXEL_MEANS
+        return im
+
+    num = 200
+    for scale in (0.5, 1.0, 2.0):
+        t = time.time()
+        for _ in xrange(num):
+            A = sample_affine(height, width)
+            for image in (im, im_normal):
+                cv2.resize(prep(warp_image(image, A, border)), None, None,
+                           fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+            depth = prep(np.tile(warp_nearest(im_depth, A)[:, :, np.newaxis], (1, 1, 3)))
+            cv2.resize(depth, None, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        t_two_steps = (time.time() - t) / num
+
+        t = time.time()
+        for _ in xrange(num):
+            A = scale_affine(sample_affine(height, width), scale)
+            shape = scaled_shape(height, width, scale)
+            for image in (im, im_normal):
+                warp_input(image, A, shape, cfg.PIXEL_MEANS.ravel())
+            warp_input(im_depth, A, shape, nearest=True)
+        t_one_step = (time.time() - t) / num
+        print 'scale {:.1f}: warp and resize {:.0f} samples / s, folded warp {:.0f} samples / s'.format(
+            scale, 1 / t_two_steps, 1 / t_one_step)
@@ -0,0 +1,162 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Binary per-frame meta data.
+
+The -meta.mat files of the datasets are MATLAB v5 files. Parsing them with
+scipy.io.loadmat costs far more than the few matrices they hold, and a
+vertmap makes it worse. A -meta.bin file next to the .mat holds the same
+arrays in a layout that is memory-mapped and sliced without parsing:
+
+    magic       8 bytes 'ISMMETA\\0'
+    version     uint32
+    fields      uint32 bitmask of the fixed fields present
+    num_poses   uint32
+    num_arrays  uint32
+    fixed       34 float64: intrinsic_matrix (3x3), rotation_translation_matrix
+                (3x4), projection_matrix (3x4), factor_depth
+    poses       num_poses x 3 x 4 float64
+    table       num_arrays entries of name, dtype, ndim, shape[4], offset
+    data        the optional arrays, each aligned to ALIGNMENT bytes
+
+All numbers are little endian. load_meta_data() returns the dict that
+scipy.io.loadmat returns for the same frame: factor_depth is a 1x1 array
+and poses is 3 x 4 x num_poses. The arrays are read-only views into the
+mapped file.
+"""
+
+import os
+import struct
+import numpy as np
+
+MAGIC = 'ISMMETA\0'
+VERSION = 1
+ALIGNMENT = 64
+
+# fixed fields in the header, with their shape in the returned dict
+_FIXED = [('intrinsic_matrix', (3, 3)),
+          ('rotation_translation_matrix', (3, 4)),
+          ('projection_matrix', (3, 4)),
+          ('factor_depth', (1, 1))]
+_FIXED_SIZE = sum(int(np.prod(shape)) for _, shape in _FIXED)
+_POSES = 1 << len(_FIXED)
+
+_HEADER = struct.Struct('<8s4I')
+_ENTRY = struct.Struct('<32s8s2I4QQ')
+_MAX_DIMS = 4
+
+def binary_path(filename):
+    """The -meta.bin file of a -meta.mat file."""
+    return os.path.splitext(filename)[0] + '.bin'
+
+
+def meta_data_path(filename):
+    """The -meta.bin file of a -meta.mat file if it exists, the .mat file otherwise."""
+    path = binary_path(filename)
+    return path if os.path.exists(path) else filename
+
+
+def save_meta_data(filename, meta_data):
+    """Write the arrays of a meta data dict to a binary meta data file.
+
+    Arrays that are not numeric, such as MATLAB structs, are skipped and
+    their names returned.
+    """
+    meta_data = dict((key, value) for key, value in meta_data.iteritems() if not key.startswith('__'))
+
+    fields = 0
+    fixed = np.zeros((_FIXED_SIZE,), dtype='<f8')
+    start = 0
+    for i, (key, shape) in enumerate(_FIXED):
+        size = int(np.prod(shape))
+        if key in meta_data:
+            fixed[start:start + size] = np.asarray(meta_data.pop(key), dtype=np.float64).ravel()
+            fields |= 1 << i
+        start += size
+
+    poses = np.zeros((0, 3, 4), dtype='<f8')
+    if 'poses' in meta_data:
+        poses = np.asarray(meta_data.pop('poses'), dtype='<f8')
+        # 3 x 4 x num_poses in the .mat files
+        if poses.ndim == 2:
+            poses = poses[:, :, np.newaxis]
+        poses = np.ascontiguousarray(poses.transpose((2, 0, 1)))
+        fields |= _POSES
+
+    arrays = []
+    skipped = []
+    for key in sorted(meta_data.keys()):
+        value = np.asarray(meta_data[key])
+        if value.dtype.kind not in 'biuf' or value.ndim > _MAX_DIMS or len(key) > 32:
+            skipped.append(key)
+            continue
+        arrays.append((key, value.astype(value.dtype.newbyteorder('<'), copy=False)))
+
+    # offsets of the arrays after the header, the poses and the table
+    offset = _HEADER.size + fixed.nbytes + poses.nbytes + len(arrays) * _ENTRY.size
+    table = []
+    for key, value in arrays:
+        offset = (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        shape = tuple(value.shape) + (0,) * (_MAX_DIMS - value.ndim)
+        table.append(_ENTRY.pack(key, value.dtype.str, value.ndim, 0, *(shape + (offset,))))
+        offset += value.nbytes
+
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, fields, len(poses), len(arrays)))
+        f.write(fixed.tostring())
+        f.write(poses.tostring())
+        f.write(''.join(table))
+        for (key, value), entry in zip(arrays, table):
+            f.seek(_ENTRY.unpack(entry)[-1])
+            f.write(np.ascontiguousarray(value).tostring())
+    return skipped
+
+
+def _load_binary(filename):
+    buf = np.memmap(filename, dtype=np.uint8, mode='r')
+    magic, version, fields, num_poses, num_arrays = _HEADER.unpack(buf[:_HEADER.size].tostring())
+    if magic != MAGIC:
+        raise ValueError('{} is not a binary meta data file'.format(filename))
+    if version != VERSION:
+        raise ValueError('{}: unsupported meta data version {:d}'.format(filename, version))
+
+    meta_data = {}
+    offset = _HEADER.size
+    fixed = buf[offset:offset + _FIXED_SIZE * 8].view('<f8')
+    start = 0
+    for i, (key, shape) in enumerate(_FIXED):
+        size = int(np.prod(shape))
+        if fields & (1 << i):
+            meta_data[key] = fixed[start:start + size].reshape(shape)
+        start += size
+    offset += _FIXED_SIZE * 8
+
+    if fields & _POSES:
+        poses = buf[offset:offset + num_poses * 96].view('<f8').reshape((num_poses, 3, 4))
+        meta_data['poses'] = poses.transpose((1, 2, 0))
+    offset += num_poses * 96
+
+    for i in xrange(num_arrays):
+        entry = _ENTRY.unpack(buf[offset:offset + _ENTRY.size].tostring())
+        offset += _ENTRY.size
+        key, dtype, ndim = entry[0].rstrip('\0'), np.dtype(entry[1].rstrip('\0')), entry[2]
+        shape = entry[4:4 + ndim]
+        start = entry[-1]
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        meta_data[key] = buf[start:start + nbytes].view(dtype).reshape(shape)
+    return meta_data
+
+
+def load_meta_data(filename):
+    """Load a meta data file, from its -meta.bin file if there is one."""
+    if not filename.endswith('.bin'):
+        path = binary_path(filename)
+        if not os.path.exists(path):
+            import scipy.io
+            return scipy.io.loadmat(filename)
+        filename = path
+    return _load_binary(filename)
@@ -0,0 +1,378 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Named, nested profiling scopes.
+
+    from utils import profiler
+    with profiler.scope('decode'):
+        ...
+
+Scopes opened inside each other are recorded under their path, e.g.
+'iteration/solver_step/minibatch/decode'. While the profiler is disabled,
+scope() returns a shared object whose __enter__ and __exit__ do nothing.
+
+Every scope adds its duration to a logarithmic histogram of its path and, up to
+MAX_EVENTS, an event for the Chrome trace viewer (chrome://tracing). The
+records are guarded by a lock and the scope stacks are per thread. A
+forked child process starts with empty records, so every process dumps
+its own files; merge_traces() joins the traces of several processes.
+
+With enable(memory=True) every scope also records the memory of the
+process: 'peak' is the highest resident set size reached inside the scope
+above the size at its start, i.e. the transient arrays of the stage, and
+'allocated' what the scope left resident. They are read from VmRSS and
+VmHWM of /proc/self/status, the high-water mark being reset through
+/proc/self/clear_refs when a scope opens, so the mode needs Linux. It
+also makes glibc mmap every allocation of MMAP_THRESHOLD bytes or more
+and releases the free heap pages, so that the large NumPy arrays show up
+in the resident size as soon as they are written and leave it when they
+are freed; otherwise glibc raises its threshold as large blocks are freed
+and serves later arrays from heap pages that are already resident.
+Smaller arrays come from the malloc arenas and may not register. As the
+resident size is per process, memory is meant to be profiled with a
+single thread running scopes. budget_violations() checks the peaks
+against per-stage budgets.
+"""
+
+import os
+import ctypes
+import json
+import threading
+import time
+import numpy as np
+
+# maximum number of events kept for the trace
+MAX_EVENTS = 1000000
+# allocations of at least this many bytes are mmapped while memory is recorded
+MMAP_THRESHOLD = 64 * 1024
+# upper edges of the histogram bins, 4 per octave from 1us to ~36min
+_BIN_EDGES = 1e-6 * 2.0 ** (np.arange(128) / 4.0)
+
+_enabled = False
+_memory = False
+_lock = threading.Lock()
+_local = threading.local()
+_pid = None
+_stats = {}
+_events = []
+
+class _NullScope(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope(object):
+    __slots__ = ('name', 'path', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = _stack()
+        self.path = stack[-1].path + '/' + self.name if stack else self.name
+        stack.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        duration = time.time() - self.start
+        _stack().pop()
+        _record(self.name, self.path, self.start, duration)
+        return False
+
+
+class _MemoryScope(_Scope):
+    __slots__ = ('rss', 'peak')
+
+    def __enter__(self):
+        rss, hwm = _read_memory()
+        # the parents keep the high-water mark up to here before it is reset
+        for parent in _stack():
+            parent.peak = max(parent.peak, hwm)
+        _reset_peak()
+        self.rss = self.peak = rss
+        return _Scope.__enter__(self)
+
+    def __exit__(self, *args):
+        duration = time.time() - self.start
+        rss, hwm = _read_memory()
+        stack = _stack()
+        stack.pop()
+        self.peak = max(self.peak, hwm)
+        for parent in stack:
+            parent.peak = max(parent.peak, self.peak)
+        _record(self.name, self.path, self.start, duration, self.peak - self.rss, rss - self.rss)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _read_memory():
+    """Resident set size and its high-water mark in bytes."""
+    rss = hwm = 0
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = 1024 * int(line.split()[1])
+            elif line.startswith('VmHWM:'):
+                hwm = 1024 * int(line.split()[1])
+    return rss, max(rss, hwm)
+
+
+def _reset_peak():
+    """Set the high-water mark of the resident set size to its current size."""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def _prepare_malloc():
+    """Make glibc mmap every allocation of MMAP_THRESHOLD bytes or more,
+    which also stops it from raising the threshold, and release the free
+    heap pages, which it would otherwise hand out again without them
+    showing up in the resident size. Returns whether that worked."""
+    # M_MMAP_THRESHOLD of malloc.h
+    M_MMAP_THRESHOLD = -3
+    try:
+        libc = ctypes.CDLL(None)
+        if libc.mallopt(M_MMAP_THRESHOLD, MMAP_THRESHOLD) != 1:
+            return False
+        libc.malloc_trim(0)
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+def _reset():
+    global _pid, _stats, _events
+    _pid = os.getpid()
+    _stats = {}
+    _events = []
+
+
+def _record(name, path, start, duration, peak=None, allocated=None):
+    with _lock:
+        if os.getpid() != _pid:
+            # the records of the parent process before a fork
+            _reset()
+        stats = _stats.get(path)
+        if stats is None:
+            stats = _stats[path] = {'calls': 0, 'total': 0.0, 'max': 0.0,
+                                    'hist': np.zeros(len(_BIN_EDGES), dtype=np.int64)}
+        stats['calls'] += 1
+        stats['total'] += duration
+        stats['max'] = max(stats['max'], duration)
+        stats['hist'][min(np.searchsorted(_BIN_EDGES, duration), len(_BIN_EDGES) - 1)] += 1
+        if peak is not None:
+            stats['peak'] = max(stats.get('peak', 0), peak)
+            stats['allocated'] = stats.get('allocated', 0) + allocated
+        if len(_events) < MAX_EVENTS:
+            _events.append((name, path, threading.current_thread().ident, start, duration, peak, allocated))
+
+
+def enable(memory=False):
+    """Start recording scopes, and their memory if memory is set."""
+    global _enabled, _memory
+    if memory:
+        try:
+            _read_memory()
+            _reset_peak()
+        except (IOError, OSError) as e:
+            print 'profiler: memory is not recorded, /proc/self is not usable: {}'.format(e)
+            memory = False
+        if memory and not _prepare_malloc():
+            print 'profiler: mallopt is not available, arrays allocated from resident heap pages are not counted'
+    with _lock:
+        _reset()
+    _memory = memory
+    _enabled = True
+
+
+def disable():
+    global _enabled, _memory
+    _enabled = False
+    _memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def scope(name):
+    """A context manager timing the code it encloses as a stage called name."""
+    if not _enabled:
+        return _NULL_SCOPE
+    if _memory:
+        return _MemoryScope(name)
+    return _Scope(name)
+
+
+def _percentile(stats, q):
+    """Upper bin edge below which a fraction q of the durations fall."""
+    cumulative = np.cumsum(stats['hist'])
+    return min(_BIN_EDGES[np.searchsorted(cumulative, q * cumulative[-1])], stats['max'])
+
+
+def _copy_stats():
+    with _lock:
+        return dict((path, dict(s, hist=s['hist'].copy())) for path, s in _stats.iteritems())
+
+
+def memory_stats():
+    """{path: (peak, allocated)} in bytes of the stages recorded with memory.
+
+    peak is the largest over the calls, allocated the sum over them.
+    """
+    return dict((path, (s['peak'], s['allocated'])) for path, s in _copy_stats().iteritems() if 'peak' in s)
+
+
+def _budget(path, budgets):
+    """The budget of the longest key of budgets that path ends with."""
+    best = None
+    for key, value in budgets:
+        if (path == key or path.endswith('/' + key)) and (best is None or len(key) > len(best[0])):
+            best = (key, value)
+    return best
+
+
+def budget_violations(budgets, stats=None):
+    """The stages whose peak exceeds their budget.
+
+    budgets is a list of (stage, MB) pairs as cfg.MEMORY_BUDGETS; a stage
+    is a scope name or the end of a path, e.g. 'minibatch' or
+    'minibatch/normals', and the longest one that matches a path applies.
+    stats defaults to memory_stats(). Returns (path, peak MB, budget MB)
+    tuples.
+    """
+    if stats is None:
+        stats = memory_stats()
+    violations = []
+    for path in sorted(stats.keys()):
+        budget = _budget(path, budgets)
+        peak = stats[path][0] / float(1 << 20)
+        if budget is not None and peak > budget[1]:
+            violations.append((path, peak, budget[1]))
+    return violations
+
+
+def summary():
+    """A table of the stages and the histogram of each, slowest first."""
+    stats = _copy_stats()
+    memory = any('peak' in s for s in stats.itervalues())
+    header = '{:50s} {:>8s} {:>10s} {:>9s} {:>9s} {:>9s} {:>9s}'.format(
+        'stage', 'calls', 'total s', 'mean ms', 'p50 ms', 'p90 ms', 'max ms')
+    if memory:
+        header += ' {:>9s} {:>9s}'.format('peak MB', 'alloc MB')
+    lines = [header]
+    paths = sorted(stats.keys(), key=lambda path: -stats[path]['total'])
+    for path in paths:
+        s = stats[path]
+        line = '{:50s} {:8d} {:10.3f} {:9.3f} {:9.3f} {:9.3f} {:9.3f}'.format(
+            path, s['calls'], s['total'], 1000 * s['total'] / s['calls'],
+            1000 * _percentile(s, 0.5), 1000 * _percentile(s, 0.9), 1000 * s['max'])
+        if 'peak' in s:
+            line += ' {:9.1f} {:9.1f}'.format(s['peak'] / float(1 << 20), s['allocated'] / float(1 << 20))
+        lines.append(line)
+    for path in paths:
+        hist = stats[path]['hist']
+        used = np.nonzero(hist)[0]
+        lines.append('')
+        lines.append(path)
+        for i in xrange(used[0], used[-1] + 1):
+            bar = '#' * int(np.ceil(40.0 * hist[i] / hist.max()))
+            lines.append('  < {:10.3f} ms {:8d} {}'.format(1000 * _BIN_EDGES[i], hist[i], bar))
+    return '\n'.join(lines)
+
+
+def trace_events():
+    """The recorded scopes as Chrome trace events."""
+    with _lock:
+        events = list(_events)
+    pid = os.getpid()
+    trace = []
+    for name, path, tid, start, duration, peak, allocated in events:
+        args = {'path': path}
+        if peak is not None:
+            args['peak_bytes'] = peak
+            args['allocated_bytes'] = allocated
+        trace.append({'name': name, 'cat': 'ism', 'ph': 'X', 'pid': pid, 'tid': tid,
+                      'ts': start * 1e6, 'dur': duration * 1e6, 'args': args})
+    return trace
+
+
+def format_violations(violations):
+    return ['{} peak {:.1f}MB over its budget of {:.1f}MB'.format(path, peak, budget)
+            for path, peak, budget in violations]
+
+
+def dump(output_dir, prefix='profile', budgets=None):
+    """Write <prefix>_<pid>.json for chrome://tracing and <prefix>_<pid>.txt with the summary
+    and the stages over their memory budgets."""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    filename = os.path.join(output_dir, '{}_{:d}'.format(prefix, os.getpid()))
+    with open(filename + '.json', 'w') as f:
+        json.dump({'traceEvents': trace_events(), 'displayTimeUnit': 'ms'}, f)
+    text = summary()
+    violations = budget_violations(budgets) if budgets else []
+    if violations:
+        text += '\n\n' + '\n'.join(format_violations(violations))
+    with open(filename + '.txt', 'w') as f:
+        f.write(text + '\n')
+    print text
+    print 'Wrote profile to {}.json and .txt'.format(filename)
+
+
+def merge_traces(filenames, output_file):
+    """Join the Chrome traces of several processes into one file."""
+    events = []
+    for filename in filenames:
+        with open(filename) as f:
+            events.extend(json.load(f)['traceEvents'])
+    with open(output_file, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+if __name__ == '__main__':
+    # the cost of a scope while disabled and while enabled
+    num = 200000
+    t = time.time()
+    for _ in xrange(num):
+        pass
+    t_loop = time.time() - t
+
+    t = time.time()
+    for _ in xrange(num):
+        with scope('stage'):
+            pass
+    t_disabled = (time.time() - t - t_loop) / num
+
+    enable()
+    t = time.time()
+    for _ in xrange(num):
+        with scope('stage'):
+            pass
+    t_enabled = (time.time() - t - t_loop) / num
+
+    num_memory = num / 20
+    enable(memory=True)
+    t = time.time()
+    for _ in xrange(num_memory):
+        with scope('stage'):
+            pass
+    t_memory = (time.time() - t - t_loop / 20) / num_memory
+    print 'scope overhead: {:.2f}us disabled, {:.2f}us enabled, {:.2f}us with memory'.format(
+        t_disabled * 1e6, t_enabled * 1e6, t_memory * 1e6)
@@ -0,0 +1,199 @@
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Minibatch samplers for the training data layers.
+
+By default the data layers draw random permutations of the roidb. The
+samplers here replace that when cfg.TRAIN.SAMPLER is set:
+    bucket: draw every minibatch from images with the same padded shape,
+            so that im_list_to_blob does not pad images to the largest
+            height and width in the batch
+    class_balanced: oversample frames that contain classes which appear in
+            few frames, using the per-frame class histograms
+    hard_example: oversample frames with a high recent training loss, which
+            the data layer feeds back through update_losses
+
+The module does not read the config; get_sampler takes the TRAIN section.
+"""
+
+import numpy as np
+import PIL.Image
+
+def padded_shape(height, width, factor):
+    """Shape of an image after pad_im(im, factor)."""
+    return (int(np.ceil(height / float(factor)) * factor),
+            int(np.ceil(width / float(factor)) * factor))
+
+
+def padding_fraction(shapes):
+    """Fraction of a blob built from images of these shapes that is padding."""
+    shapes = np.array(shapes, dtype=np.float64).reshape((-1, 2))
+    area = shapes[:, 0] * shapes[:, 1]
+    blob_area = len(shapes) * shapes[:, 0].max() * shapes[:, 1].max()
+    return 1.0 - area.sum() / blob_area
+
+
+def get_minibatch_db(roidb, db_inds, random_flip=False):
+    """Return the roidb entries of a minibatch.
+
+    With random_flip, the entries are shallow copies that are each flipped
+    with probability 0.5; get_minibatch flips the images with views.
+    """
+    minibatch_db = [roidb[i] for i in db_inds]
+    if random_flip:
+        minibatch_db = [dict(entry, flipped=(np.random.rand() < 0.5)) for entry in minibatch_db]
+    return minibatch_db
+
+
+class BucketSampler(object):
+    """Draw each minibatch from roidb entries with the same padded image shape."""
+
+    def __init__(self, roidb, ims_per_batch, factor=16):
+        self._ims_per_batch = ims_per_batch
+
+        # read the image sizes from the file headers
+        self._shapes = []
+        for entry in roidb:
+            width, height = PIL.Image.open(entry['image']).size
+            self._shapes.append(padded_shape(height, width, factor))
+
+        buckets = {}
+        for i, shape in enumerate(self._shapes):
+            buckets.setdefault(shape, []).append(i)
+        self._buckets = [np.array(inds) for inds in buckets.itervalues()]
+        self._shuffle_batches()
+
+        # padding of random batches, for comparison
+        num = len(self._shapes)
+        random_padding = np.mean([padding_fraction([self._shapes[i] for i in np.random.randint(num, size=ims_per_batch)])
+                                  for _ in xrange(1000)])
+        print 'bucket sampler: {:d} buckets, padding fraction {:.3f} (random batches {:.3f})' \
+            .format(len(self._buckets), self.padding_fraction(), random_padding)
+
+    def _shuffle_batches(self):
+        """Split every shuffled bucket into whole minibatches and shuffle the minibatches."""
+        n = self._ims_per_batch
+        batches = []
+        for inds in self._buckets:
+            perm = np.random.permutation(inds)
+            if len(perm) < n:
+                batches.append(perm)
+            for start in xrange(0, len(perm) - n + 1, n):
+                batches.append(perm[start:start + n])
+        self._batches = [batches[i] for i in np.random.permutation(len(batches))]
+        self._cur = 0
+
+    def padding_fraction(self):
+        """Average padding fraction of the minibatches of one epoch."""
+        return np.mean([padding_fraction([self._shapes[i] for i in inds]) for inds in self._batches])
+
+    def next_minibatch_inds(self):
+        """Return the roidb indices for the next minibatch."""
+        if self._cur >= len(self._batches):
+            self._shuffle_batches()
+
+        db_inds = self._batches[self._cur]
+        self._cur += 1
+        return db_inds
+
+
+class WeightedSampler(object):
+    """Draw minibatches with replacement according to per-entry weights."""
+
+    def __init__(self, weights, ims_per_batch):
+        self._ims_per_batch = ims_per_batch
+        self._set_weights(weights)
+
+    def _set_weights(self, weights):
+        self._cdf = np.cumsum(weights, dtype=np.float64)
+        self._cdf /= self._cdf[-1]
+
+    def next_minibatch_inds(self):
+        """Return the roidb indices for the next minibatch."""
+        db_inds = np.searchsorted(self._cdf, np.random.rand(self._ims_per_batch), side='right')
+        return np.minimum(db_inds, len(self._cdf) - 1)
+
+
+class ClassBalancedSampler(WeightedSampler):
+    """Oversample frames that contain under-represented classes.
+
+    A class that appears in a fraction f of the frames gets a repeat factor
+    max(1, sqrt(thresh / f)), and every frame is weighted by the largest
+    repeat factor among the classes in it.
+    """
+
+    def __init__(self, class_histograms, ims_per_batch, thresh):
+        present = class_histograms > 0
+        frame_fraction = present.mean(axis=0)
+        # classes in no frame get the repeat factor of a class in one frame
+        repeat = np.maximum(1.0, np.sqrt(thresh / np.maximum(frame_fraction, 1.0 / len(present))))
+        weights = (present * repeat[np.newaxis, :]).max(axis=1)
+        # frames without any labeled pixel are still sampled
+        weights = np.maximum(weights, 1.0)
+        WeightedSampler.__init__(self, weights, ims_per_batch)
+        print 'class balanced sampler: repeat factors {}'.format(np.round(repeat, 2))
+
+
+class HardExampleSampler(WeightedSampler):
+    """Oversample frames with a high recent training loss.
+
+    The loss of every frame is a running average of the losses of the
+    minibatches it was in. Frames not seen yet use the mean loss of the seen
+    ones. A fraction of the probability mass is kept uniform so that every
+    frame keeps being visited. Rebuilding the distribution takes O(N), so it
+    is done once every rebuild_iters loss updates.
+    """
+
+    def __init__(self, num_entries, ims_per_batch, momentum, uniform_fraction, rebuild_iters=1):
+        self._losses = np.zeros((num_entries,), dtype=np.float64)
+        self._seen = np.zeros((num_entries,), dtype=np.bool)
+        self._momentum = momentum
+        self._uniform_fraction = uniform_fraction
+        self._rebuild_iters = rebuild_iters
+        self._num_updates = 0
+        WeightedSampler.__init__(self, np.ones((num_entries,)), ims_per_batch)
+
+    def update_losses(self, db_inds, loss):
+        """Record the loss of the minibatch built from db_inds."""
+        seen = self._seen[db_inds]
+        old = self._losses[db_inds]
+        self._losses[db_inds] = np.where(seen, self._momentum * old + (1 - self._momentum) * loss, loss)
+        self._seen[db_inds] = True
+
+        self._num_updates += 1
+        if self._num_updates >= self._rebuild_iters:
+            self._rebuild()
+
+    def _rebuild(self):
+        """Set the sampling distribution from the running losses."""
+        self._num_updates = 0
+        losses = np.where(self._seen, self._losses, self._losses[self._seen].mean())
+        total = losses.sum()
+        if total <= 0:
+            return
+        u = self._uniform_fraction
+        self._set_weights((1 - u) * losses / total + u / float(len(losses)))
+
+
+def get_sampler(roidb, train_cfg):
+    """Return the sampler selected by train_cfg.SAMPLER, or None for random permutations.
+
+    train_cfg is the TRAIN section of the config of the tree.
+    """
+    if train_cfg.SAMPLER == 'random':
+        return None
+    elif train_cfg.SAMPLER == 'bucket':
+        return BucketSampler(roidb, train_cfg.IMS_PER_BATCH)
+    elif train_cfg.SAMPLER == 'class_balanced':
+        class_histograms = np.array([entry['class_histogram'] for entry in roidb])
+        return ClassBalancedSampler(class_histograms, train_cfg.IMS_PER_BATCH, train_cfg.SAMPLER_REPEAT_THRESH)
+    elif train_cfg.SAMPLER == 'hard_example':
+        return HardExampleSampler(len(roidb), train_cfg.IMS_PER_BATCH,
+                                  train_cfg.SAMPLER_LOSS_MOMENTUM, train_cfg.SAMPLER_UNIFORM_FRACTION,
+                                  train_cfg.SAMPLER_REBUILD_ITERS)
+    else:
+        raise ValueError('Unknown sampler: {}'.format(train_cfg.SAMPLER))
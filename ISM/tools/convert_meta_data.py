@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Convert the -meta.mat files of a dataset to binary -meta.bin files."""
+
+import _init_paths
+from utils.meta_data import binary_path, save_meta_data, load_meta_data
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+import scipy.io
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Convert meta data files to the binary format')
+    parser.add_argument('--dir', dest='data_dir',
+                        help='directory searched recursively for meta .mat files',
+                        default=None, type=str)
+    parser.add_argument('--workers', dest='num_workers',
+                        help='number of conversion processes',
+                        default=multiprocessing.cpu_count(), type=int)
+    parser.add_argument('--force', dest='force',
+                        help='convert files that already have a .bin file',
+                        action='store_true')
+    parser.add_argument('--benchmark', dest='benchmark',
+                        help='time loading this many converted files in both formats',
+                        default=0, type=int)
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    return args
+
+
+def convert(filename):
+    """Convert one file, checking that both formats hold the same arrays."""
+    meta_data = scipy.io.loadmat(filename)
+    path = binary_path(filename)
+    skipped = save_meta_data(path + '.tmp', meta_data)
+    converted = load_meta_data(path + '.tmp')
+    for key, value in meta_data.iteritems():
+        if key.startswith('__') or key in skipped:
+            continue
+        if not np.array_equal(np.asarray(value).reshape(converted[key].shape), converted[key]):
+            os.remove(path + '.tmp')
+            raise ValueError('{}: {} differs after conversion'.format(filename, key))
+    del converted
+    os.rename(path + '.tmp', path)
+    return filename, skipped
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    filenames = []
+    for root, dirs, files in os.walk(args.data_dir):
+        for name in files:
+            if name.endswith('meta.mat'):
+                filenames.append(os.path.join(root, name))
+    filenames.sort()
+    todo = [filename for filename in filenames if args.force or not os.path.exists(binary_path(filename))]
+    print '{:d} meta data files, converting {:d}'.format(len(filenames), len(todo))
+
+    t = time.time()
+    pool = multiprocessing.Pool(args.num_workers)
+    for i, (filename, skipped) in enumerate(pool.imap_unordered(convert, todo, chunksize=16)):
+        if skipped:
+            print '{}: skipped {}'.format(filename, ', '.join(skipped))
+        if (i + 1) % 1000 == 0:
+            print '{:d} / {:d} files converted'.format(i + 1, len(todo))
+    pool.close()
+    pool.join()
+    print 'converted {:d} files in {:.1f}s'.format(len(todo), time.time() - t)
+
+    if args.benchmark > 0:
+        sample = filenames[:args.benchmark]
+        t = time.time()
+        for filename in sample:
+            scipy.io.loadmat(filename)
+        t_mat = (time.time() - t) / len(sample)
+        t = time.time()
+        for filename in sample:
+            load_meta_data(filename)
+        t_bin = (time.time() - t) / len(sample)
+        print '.mat: {:.3f}ms per file, .bin: {:.3f}ms per file'.format(t_mat * 1000, t_bin * 1000)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------
+# Deep ISM
+# Copyright (c) 2016
+# Licensed under The MIT License [see LICENSE for details]
+# Written by Yu Xiang
+# --------------------------------------------------------
+
+"""Time the data layers and their hot paths on synthetic LOV frames."""
+
+import _init_paths
+from ism.config import cfg, cfg_from_file
+from benchmark import suite
+from benchmark.fixtures import make_lov_fixture
+import benchmark.cases
+import argparse
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import cv2
+
+def parse_args():
+    """
+    Parse input arguments
+    """
+    parser = argparse.ArgumentParser(description='Run the Deep ISM benchmarks')
+    parser.add_argument('--output', dest='output',
+                        help='JSON file the results are written to',
+                        default='benchmark.json', type=str)
+    parser.add_argument('--compare', dest='compare',
+                        help='JSON results of an earlier run to compare with',
+                        default=None, type=str)
+    parser.add_argument('--threshold', dest='threshold',
+                        help='fraction by which a case may get slower in the comparison',
+                        default=0.1, type=float)
+    parser.add_argument('--cases', dest='cases',
+                        help='regular expression selecting the cases to run',
+                        default=None, type=str)
+    parser.add_argument('--repeats', dest='repeats',
+                        help='timed runs of every case',
+                        default=5, type=int)
+    parser.add_argument('--warmup', dest='warmup',
+                        help='untimed runs of every case before timing it',
+                        default=1, type=int)
+    parser.add_argument('--frames', dest='num_frames',
+                        help='number of synthetic frames',
+                        default=4, type=int)
+    parser.add_argument('--size', dest='size',
+                        help='height and width of the synthetic frames',
+                        default=[480, 640], nargs=2, type=int)
+    parser.add_argument('--classes', dest='num_classes',
+                        help='number of classes, with the background',
+                        default=4, type=int)
+    parser.add_argument('--fixture_dir', dest='fixture_dir',
+                        help='directory the fixture is written to and kept in [a temporary one]',
+                        default=None, type=str)
+    parser.add_argument('--memory', dest='memory',
+                        help='also record the peak memory of the cases and their stages '
+                             'and fail when one exceeds its budget in cfg.MEMORY_BUDGETS',
+                        action='store_true')
+    parser.add_argument('--budget', dest='budgets',
+                        help='memory budget in MB of a stage, adds to cfg.MEMORY_BUDGETS',
+                        default=[], nargs=2, action='append', metavar=('STAGE', 'MB'))
+    parser.add_argument('--gpu', dest='gpu_id',
+                        help='also run the GPU cases on this device',
+                        default=None, type=int)
+    parser.add_argument('--cfg', dest='cfg_file',
+                        help='optional config file',
+                        default=None, type=str)
+
+    args = parser.parse_args()
+    return args
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.cfg_file is not None:
+        cfg_from_file(args.cfg_file)
+    # one scale, so that every run builds blobs of the same size
+    cfg.TRAIN.SCALES_BASE = (1.0,)
+    gpu = args.gpu_id is not None
+    cfg.USE_GPU_NORMALS = gpu
+    cfg.USE_GPU_NMS = gpu
+    if gpu:
+        cfg.GPU_ID = args.gpu_id
+    budgets = list(cfg.MEMORY_BUDGETS) + [(stage, float(mb)) for stage, mb in args.budgets]
+
+    root = args.fixture_dir if args.fixture_dir is not None else tempfile.mkdtemp()
+    try:
+        t = time.time()
+        fixture = make_lov_fixture(root, args.num_frames, args.size[0], args.size[1], args.num_classes)
+        print 'wrote {:d} synthetic frames to {} in {:.1f}s'.format(args.num_frames, root, time.time() - t)
+
+        results = suite.run(suite.Context(fixture, gpu), args.cases, args.repeats, args.warmup,
+                            args.memory, budgets)
+    finally:
+        if args.fixture_dir is None:
+            shutil.rmtree(root)
+
+    meta = {'commit': _git_commit(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'args': vars(args),
+            'memory_budgets': budgets}
+    suite.save_results(args.output, results, meta)
+    print 'results written to {}'.format(args.output)
+
+    failed = False
+    if args.compare is not None:
+        lines, regressions = suite.compare(suite.load_results(args.compare), suite.load_results(args.output),
+                                           args.threshold)
+        print '\n'.join(lines)
+        if regressions:
+            print '{:d} cases slower by more than {:.0f}%: {}'.format(
+                len(regressions), 100 * args.threshold, ', '.join(regressions))
+            failed = True
+
+    violations = suite.budget_violations(results)
+    if violations:
+        print '{:d} stages over their memory budget:'.format(len(violations))
+        for name, path, peak, budget in violations:
+            print '    {}: {} peak {:.1f}MB over its budget of {:.1f}MB'.format(name, path, peak, budget)
+        failed = True
+    if failed:
+        sys.exit(1)
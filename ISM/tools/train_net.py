@@ -11,6 +11,7 @@
 
 import _init_paths
 from ism.train import get_training_roidb, train_net
+from ism.parallel import train_net_parallel
 from ism.config import cfg, cfg_from_file, get_output_dir
 from datasets.factory import get_imdb
 import caffe
@@ -42,6 +43,12 @@ def parse_args():
     parser.add_argument('--imdb', dest='imdb_name',
                         help='dataset to train on',
                         default='kitti_train', type=str)
+    parser.add_argument('--gpus', dest='gpus',
+                        help='comma separated GPU ids for data-parallel training',
+                        default=None, type=str)
+    parser.add_argument('--workers', dest='num_workers',
+                        help='number of data-parallel CPU workers',
+                        default=None, type=int)
     parser.add_argument('--rand', dest='randomize',
                         help='randomize (do not use a fixed seed)',
                         action='store_true')
@@ -70,10 +77,12 @@ if __name__ == '__main__':
         np.random.seed(cfg.RNG_SEED)
         caffe.set_random_seed(cfg.RNG_SEED)
 
-    # set up caffe
-    caffe.set_mode_gpu()
-    if args.gpu_id is not None:
-        caffe.set_device(args.gpu_id)
+    # set up caffe, the data-parallel workers set up their own device
+    parallel = args.gpus is not None or args.num_workers is not None
+    if not parallel:
+        caffe.set_mode_gpu()
+        if args.gpu_id is not None:
+            caffe.set_device(args.gpu_id)
 
     imdb = get_imdb(args.imdb_name)
     print 'Loaded dataset `{:s}` for training'.format(imdb.name)
@@ -82,6 +91,13 @@ if __name__ == '__main__':
     output_dir = get_output_dir(imdb, None)
     print 'Output will be saved to `{:s}`'.format(output_dir)
 
-    train_net(args.solver, roidb, output_dir,
-              pretrained_model=args.pretrained_model,
-              max_iters=args.max_iters)
+    if parallel:
+        gpus = [int(x) for x in args.gpus.split(',')] if args.gpus is not None else None
+        train_net_parallel(args.solver, roidb, output_dir,
+                           pretrained_model=args.pretrained_model,
+                           max_iters=args.max_iters,
+                           num_workers=args.num_workers, gpus=gpus)
+    else:
+        train_net(args.solver, roidb, output_dir,
+                  pretrained_model=args.pretrained_model,
+                  max_iters=args.max_iters)
@@ -2,6 +2,7 @@
 
 import os
 import random
+import argparse
 import bpy
 import bpy_extras
 from mathutils import Matrix, Vector
@@ -9,7 +10,12 @@ import math
 import numpy as np
 import scipy.io
 import pickle
-import png
+
+# the layout math lives next to this script, the depth codecs in the ISM library
+os.sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ISM', 'lib'))
+import scene_layout
+from utils.depth_io import write_depth
 
 RENDERING_PATH = './'
 MAX_CAMERA_DIST = 2
@@ -238,7 +244,6 @@ class BlenderRenderer(object):
         self.render_context.resolution_x = viewport_size_x
         self.render_context.resolution_y = viewport_size_y
         self.render_context.use_antialiasing = False
-        self.pngWriter = png.Writer(viewport_size_x, viewport_size_y, greyscale=True, alpha=False, bitdepth=16)
 
     def _set_lighting(self):
         # clear default lights
@@ -354,8 +359,6 @@ class BlenderRenderer(object):
         mesh = dict()
 
         num = len(file_paths)
-        height_max = -np.inf * np.ones((num,), dtype=np.float32)
-        height_min = np.inf * np.ones((num,), dtype=np.float32)
         for i in range(num):
             file_path = file_paths[i]
             try:
@@ -376,191 +379,36 @@ class BlenderRenderer(object):
                     if item.type == 'MESH':
                         if item.name not in mesh:
                             mesh[item.name] = i
-                            for vertex in item.data.vertices:
-                                height_max[i] = max(height_max[i], scales[i] * vertex.co[1])
-                                height_min[i] = min(height_min[i], scales[i] * vertex.co[1])
 
             except Exception:
                 self.model_loaded = False
         self.mesh = mesh
-        print(height_max)
-        print(height_min)
-
-        # rotate the objects
-        thetas = np.zeros((num,), dtype=np.float32)
-        for i in range(1, num):
-            # sample a rotation angle
-            thetas[i] = (2 * np.random.rand(1) - 1) * math.pi
-
-        for item in bpy.data.objects:
-            if item.type == 'MESH':
-                ind = mesh[item.name]
-                theta = thetas[ind]
-                R = np.array([[math.cos(theta), 0, math.sin(theta)], [0, 1, 0], [-math.sin(theta), 0, math.cos(theta)]])
-                for vertex in item.data.vertices:
-                    rv = np.dot(R, np.array(vertex.co).reshape((3,1)))
-                    vertex.co[0] = rv[0]
-                    vertex.co[1] = rv[1]
-                    vertex.co[2] = rv[2]
-                    # os.sys.exit(1)
-
-        # rescale the meshes
-        for item in bpy.data.objects:
-            if item.type == 'MESH':
-                ind = mesh[item.name]
-                for vertex in item.data.vertices:
-                    vertex.co *= scales[ind]
-
-        # make sure table, chair and sofa are on the ground
-        table_height_min = height_min[0]
-        for item in bpy.data.objects:
-            if item.type == 'MESH':
-                ind = mesh[item.name]
-                if classes[ind] == 'chair' or classes[ind] == 'sofa':
-                    for vertex in item.data.vertices:
-                        vertex.co[1] += table_height_min - height_min[ind]
 
-        # move objects on the table
-        table_height_max = height_max[0]
-        for item in bpy.data.objects:
-            if item.type == 'MESH':
-                ind = mesh[item.name]
-                if classes[ind] != 'chair' and classes[ind] != 'sofa' and classes[ind] != 'table':
-                    for vertex in item.data.vertices:
-                        vertex.co[1] += table_height_max - height_min[ind]
-
-        # move all the objects down
-        for item in bpy.data.objects:
-            if item.type == 'MESH':
-                ind = mesh[item.name]
-                for vertex in item.data.vertices:
-                    vertex.co[1] -= 0.2
-
-        # collect the vertices
+        # read the vertices of every mesh once, grouped by model
+        items = [item for item in bpy.data.objects if item.type == 'MESH']
+        coords = []
+        for item in items:
+            co = np.empty((len(item.data.vertices) * 3,), dtype=np.float32)
+            item.data.vertices.foreach_get('co', co)
+            coords.append(co.reshape((-1, 3)))
         vertices = []
         for i in range(num):
-            vertices.append(np.zeros((0, 3), dtype=np.float32))
-        for item in bpy.data.objects:
-            if item.type == 'MESH':
-                ind = mesh[item.name]
-                for vertex in item.data.vertices:
-                    vertices[ind] = np.append(vertices[ind], np.array(vertex.co).reshape((1,3)), axis = 0)
-
-        # compute the boundary of objects
-        Xlim = np.zeros((num, 2), dtype=np.float32)
-        Ylim = np.zeros((num, 2), dtype=np.float32)
-        Zlim = np.zeros((num, 2), dtype=np.float32)
-        for i in range(num):
-            Xlim[i, 0] = vertices[i][:, 0].min()
-            Xlim[i, 1] = vertices[i][:, 0].max()
-            Ylim[i, 0] = vertices[i][:, 1].min()
-            Ylim[i, 1] = vertices[i][:, 1].max()
-            Zlim[i, 0] = vertices[i][:, 2].min()
-            Zlim[i, 1] = vertices[i][:, 2].max()
-
-        # sampling locations of objects
-        locations = np.zeros((num, 2), dtype=np.float32)
-        success = True
-        for i in range(1, num):
-            if classes[i] == 'chair' or classes[i] == 'sofa':
-                table_top = False
-            else:
-                table_top = True
-            count = 0
-            while 1:
-                count += 1
-                if table_top:
-                    lx = Xlim[0, 1] - Xlim[0, 0]
-                    lz = Zlim[0, 1] - Zlim[0, 0]
-                    x = Xlim[0, 0] + np.random.rand(1) * lx
-                    z = Zlim[0, 0] + np.random.rand(1) * lz
-                    # check if object is inside the table or not
-                    a = [x-(Xlim[i,1]-Xlim[i,0])/2, z-(Zlim[i,1]-Zlim[i,0])/2, x+(Xlim[i,1]-Xlim[i,0])/2, z+(Zlim[i,1]-Zlim[i,0])/2]
-                    if a[2] < Xlim[0, 1] - 0.02 and \
-                       a[0] > Xlim[0, 0] + 0.02 and \
-                       a[3] < Zlim[0, 1] - 0.02 and \
-                       a[1] > Zlim[0, 0] + 0.02:
-                        flag = 1
-                    else:
-                        flag = 0
-                else:
-                    lx = Xlim[0, 1] - Xlim[0, 0]
-                    lz = Zlim[0, 1] - Zlim[0, 0]
-                    if i == 1:
-                        x = Xlim[0, 0] - 0.5
-                        z = Zlim[0, 0] + np.random.rand(1) * lz
-                    elif i == 2:
-                        x = Xlim[0, 1] + 0.5
-                        z = Zlim[0, 0] + np.random.rand(1) * lz
-                    elif i == 3:
-                        x = Xlim[0, 0] + np.random.rand(1) * lx
-                        z = Zlim[0, 0] - 0.5
-                    elif i == 4:
-                        x = Xlim[0, 0] + np.random.rand(1) * lx
-                        z = Zlim[0, 1] + 0.5
-                    a = [x-(Xlim[i,1]-Xlim[i,0])/2, z-(Zlim[i,1]-Zlim[i,0])/2, x+(Xlim[i,1]-Xlim[i,0])/2, z+(Zlim[i,1]-Zlim[i,0])/2]
-                    flag = 1
-
-                if flag == 1:
-                    # check collision with other objects
-                    if table_top:
-                        r = range(1, i)
-                    else:
-                        r = range(0, i)
-                    for j in r:
-                        b = [locations[j,0]-(Xlim[j,1]-Xlim[j,0])/2, locations[j,1]-(Zlim[j,1]-Zlim[j,0])/2, \
-                             locations[j,0]+(Xlim[j,1]-Xlim[j,0])/2, locations[j,1]+(Zlim[j,1]-Zlim[j,0])/2]
-                        x1 = max(a[0], b[0])
-                        y1 = max(a[1], b[1]);
-                        x2 = min(a[2], b[2]);
-                        y2 = min(a[3], b[3]);
-                        w = x2 - x1;
-                        h = y2 - y1;
-                        inter = w * h
-                        if w > 0 and h > 0 and inter > 0:
-                            print('object {:d} collision with object {:d}'.format(i, j))
-                            flag = 0
-
-                if flag == 1:
-                    print('Sampled location for object %d' % i)
-                    break
-                else:
-                    if count > 1000:
-                        print('Fail: cannot find location for object %d' % i)
-                        break
+            parts = [co for item, co in zip(items, coords) if mesh[item.name] == i]
+            vertices.append(np.concatenate(parts) if parts else np.zeros((0, 3), dtype=np.float32))
 
-            if flag == 1:
-                locations[i, 0] = x
-                locations[i, 1] = z
-            else:
-                success = False
-                break
-        
-        if success:
-            # move the meshes
-            for item in bpy.data.objects:
-                if item.type == 'MESH':
-                    ind = mesh[item.name]
-                    if ind > 0:
-                        for vertex in item.data.vertices:
-                            vertex.co[0] += locations[ind, 0]
-                            vertex.co[2] += locations[ind, 1]
+        vertices, success = scene_layout.layout_models(vertices, classes, scales)
 
-        # add a transparent plane
-        V = np.zeros((0, 3), dtype=np.float32)
-        for item in bpy.data.objects:
-            if item.type == 'MESH':
-                for vertex in item.data.vertices:
-                    V = np.append(V, np.array(vertex.co).reshape((1,3)), axis = 0)
+        # write the placed vertices back
+        offsets = np.zeros((num,), dtype=np.int64)
+        for item, co in zip(items, coords):
+            ind = mesh[item.name]
+            placed = vertices[ind][offsets[ind]:offsets[ind] + len(co)]
+            offsets[ind] += len(co)
+            item.data.vertices.foreach_set('co', np.ascontiguousarray(placed).ravel())
+            item.data.update()
 
-        factor = 3
-        x1 = factor * np.min(V[:,0])
-        x2 = factor * np.max(V[:,0])
-        y1 = factor * np.min(V[:,2])
-        y2 = factor * np.max(V[:,2])
-        z = np.min(V[:,1])
-
-        verts = [(x1, y1, z), (x2, y1, z), (x2, y2, z), (x1, y2, z)]
+        # add a transparent plane
+        verts = scene_layout.ground_plane(vertices)
         faces = [(0, 1, 2, 3)]
 
         mesh_data = bpy.data.meshes.new("cube_mesh_data")
@@ -837,9 +685,26 @@ def render_all():
     os.sys.exit(1)
 
 
+def parse_args(argv):
+    # the arguments of the script follow '--' on the blender command line
+    argv = argv[argv.index('--') + 1:] if '--' in argv else []
+    parser = argparse.ArgumentParser(description='Render synthetic table top scenes')
+    parser.add_argument('--scenes', dest='scenes', help='range of scenes, first:end',
+                        default='80:100', type=str)
+    parser.add_argument('--views', dest='views', help='range of views of every scene, first:end',
+                        default='0:100', type=str)
+    parser.add_argument('--results_root', dest='results_root', help='output directory',
+                        default='/var/Projects/Deep_ISM/Rendering/data', type=str)
+    return parser.parse_args(argv)
+
+
 def main():
     '''Test function'''
 
+    args = parse_args(os.sys.argv)
+    scenes = range(*[int(x) for x in args.scenes.split(':')])
+    view_start, view_end = [int(x) for x in args.views.split(':')]
+
     synsets = ['04379243', '03211117', '02876657', '03797390', '02946921', '03085013', '02954340']
     synset_names = ['table', 'tvmonitor', 'bottle', 'mug', 'can', 'keyboard', 'cap']
     synset_scales = [1.0, 0.4, 0.2, 0.2, 0.2, 0.4, 0.3]
@@ -852,7 +717,7 @@ def main():
     shapenet_root = '/var/Projects/ShapeNetCore.v1'
     models_root = '/var/Projects/Deep_ISM/Rendering/images_selected'
     view_dists_root = '/var/Projects/Deep_ISM/ObjectNet3D/view_distributions'
-    results_root = '/var/Projects/Deep_ISM/Rendering/data'
+    results_root = args.results_root
     if not os.path.exists(results_root):
         os.makedirs(results_root)
 
@@ -879,8 +744,12 @@ def main():
     renderer = BlenderRenderer(640, 480)
 
     # for each scene
-    # for k in range(num_scene):
-    for k in range(80, 100):
+    for k in scenes:
+
+        # the layout and the viewpoints of a scene only depend on its index,
+        # so its views can be rendered in several processes
+        random.seed(k)
+        np.random.seed(k)
 
         renderer._set_lighting()
 
@@ -899,7 +768,11 @@ def main():
         dirname = os.path.join(results_root, '%04d' % k)
         print(dirname)
         if not os.path.exists(dirname):
-            os.makedirs(dirname)
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created by the process rendering other views of the scene
+                pass
 
         # sample objects
         while 1:
@@ -934,8 +807,8 @@ def main():
                 paths.append(model_id[index])
             print(classes)
 
-            # load model
-            filename = dirname + '/model.obj'
+            # load model, exported once by the process rendering the first view
+            filename = dirname + '/model.obj' if view_start == 0 else None
             success = renderer.loadModels(paths, scales, classes, filename)
 
             if success:
@@ -977,7 +850,7 @@ def main():
             viewpoints[i, 2] = tilt
 
         # render rgb images
-        for i in range(view_num):
+        for i in range(view_start, min(view_end, view_num)):
             azimuth = viewpoints[i, 0]
             elevation = viewpoints[i, 1]
             tilt = viewpoints[i, 2]
@@ -995,8 +868,7 @@ def main():
 
             # save depth image
             filename = dirname + '/%04d_depth.png' % i
-            pngfile = open(filename, 'wb')
-            renderer.pngWriter.write(pngfile, depth)
+            write_depth(filename, depth)
 
             # save meta data
             filename = dirname + '/%04d_meta' % i
@@ -1029,7 +901,7 @@ def main():
                     item.data.materials.append(mat)
 
         # render label image
-        for i in range(view_num):
+        for i in range(view_start, min(view_end, view_num)):
             azimuth = viewpoints[i][0]
             elevation = viewpoints[i][1]
             tilt = viewpoints[i][2]
@@ -1047,7 +919,7 @@ def main():
 
 
         renderer.clearModel()
-    os.sys.exit(1)
+    os.sys.exit(0)
 
 
 if __name__ == "__main__":
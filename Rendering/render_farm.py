@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+"""Render synthetic scenes with a local pool of headless Blender workers.
+
+The work is split into tasks of (scene, first view, end view). Every task
+runs in its own background Blender process:
+    blender --background --python blender_renderer.py -- --scenes k:k+1 --views a:b
+blender_renderer seeds the random generators with the scene index, so
+every task of a scene builds the same layout and viewpoints. Only the task
+with the first view exports model.obj.
+
+Tasks are handed out one at a time to the free workers, so scenes that
+render slower do not hold up the rest. Every finished task is appended to
+a checkpoint file in the results directory, and a restarted farm skips the
+tasks listed there.
+
+Use --stub to run the scheduler with a renderer that only sleeps and
+writes empty output files, e.g. to check the scenes / hour scaling.
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import multiprocessing
+
+RENDERING_PATH = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT = 'tasks_done.txt'
+
+def parse_range(text):
+    """'a:b' to range(a, b)."""
+    start, end = text.split(':')
+    return range(int(start), int(end))
+
+
+def make_tasks(scenes, view_num, views_per_task):
+    """Split the views of every scene into tasks of views_per_task views."""
+    return [(k, start, min(start + views_per_task, view_num))
+            for k in scenes for start in range(0, view_num, views_per_task)]
+
+
+class Checkpoint(object):
+    """The tasks finished so far, one 'scene start end' line per task."""
+
+    def __init__(self, filename):
+        self._filename = filename
+        self.done = set()
+        if os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    fields = line.split()
+                    # a line cut short by a crash is not a finished task
+                    if len(fields) == 3:
+                        self.done.add(tuple(int(x) for x in fields))
+
+    def mark(self, task):
+        with open(self._filename, 'a') as f:
+            f.write('%d %d %d\n' % task)
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.add(task)
+
+
+class BlenderTask(object):
+    """Render a task in a background Blender process."""
+
+    def __init__(self, blender, results_root):
+        self.blender = blender
+        self.results_root = results_root
+
+    def __call__(self, task):
+        k, start, end = task
+        command = [self.blender, '--background', '--python',
+                   os.path.join(RENDERING_PATH, 'blender_renderer.py'), '--',
+                   '--scenes', '%d:%d' % (k, k + 1), '--views', '%d:%d' % (start, end),
+                   '--results_root', self.results_root]
+        with open(os.path.join(self.results_root, 'log_%04d_%04d.txt' % (k, start)), 'w') as log:
+            returncode = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT)
+        if returncode != 0:
+            raise RuntimeError('blender exited with %d' % returncode)
+
+
+class StubTask(object):
+    """Sleep view_time per view and write empty outputs, in place of Blender."""
+
+    def __init__(self, results_root, view_time=0.05):
+        self.results_root = results_root
+        self.view_time = view_time
+
+    def __call__(self, task):
+        k, start, end = task
+        dirname = os.path.join(self.results_root, '%04d' % k)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created by the worker of another task of the scene
+                pass
+        for i in range(start, end):
+            time.sleep(self.view_time)
+            for suffix in ('_rgba.png', '_depth.png', '_meta.mat', '_label.png'):
+                open(os.path.join(dirname, '%04d%s' % (i, suffix)), 'w').close()
+
+
+# the renderer of the pool workers, inherited by fork
+_pool_render = None
+
+def _run_task(task):
+    try:
+        _pool_render(task)
+    except Exception as e:
+        return task, '%s: %s' % (type(e).__name__, e)
+    return task, None
+
+
+def run_farm(tasks, render, checkpoint, num_workers, views_per_scene):
+    """Render the tasks not in the checkpoint with num_workers processes.
+
+    Returns the tasks that failed.
+    """
+    global _pool_render
+    _pool_render = render
+    todo = [task for task in tasks if task not in checkpoint.done]
+    print('{:d} of {:d} tasks done, rendering {:d} with {:d} workers'.format(
+        len(tasks) - len(todo), len(tasks), len(todo), num_workers))
+
+    failed = []
+    num_views = 0
+    t = time.time()
+    pool = multiprocessing.Pool(num_workers)
+    try:
+        for task, error in pool.imap_unordered(_run_task, todo):
+            if error is None:
+                checkpoint.mark(task)
+                num_views += task[2] - task[1]
+            else:
+                print('task {} failed: {}'.format(task, error))
+                failed.append(task)
+    finally:
+        pool.close()
+        pool.join()
+    _pool_render = None
+
+    t = time.time() - t
+    scenes = float(num_views) / views_per_scene
+    print('{:d} workers: {:.2f} scenes in {:.1f}s, {:.1f} scenes / hour'.format(
+        num_workers, scenes, t, scenes / t * 3600 if t > 0 else 0))
+    return failed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Render synthetic scenes with a pool of Blender workers')
+    parser.add_argument('--scenes', dest='scenes', help='range of scenes, first:end',
+                        default='80:100', type=str)
+    parser.add_argument('--views', dest='view_num', help='number of views per scene',
+                        default=100, type=int)
+    parser.add_argument('--views_per_task', dest='views_per_task', help='number of views rendered per task',
+                        default=25, type=int)
+    parser.add_argument('--workers', dest='num_workers', help='number of worker processes',
+                        default=multiprocessing.cpu_count(), type=int)
+    parser.add_argument('--results_root', dest='results_root', help='output directory',
+                        default='/var/Projects/Deep_ISM/Rendering/data', type=str)
+    parser.add_argument('--blender', dest='blender', help='blender executable',
+                        default='blender', type=str)
+    parser.add_argument('--stub', dest='stub', help='sleep for this many seconds per view instead of rendering',
+                        default=None, type=float)
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if not os.path.exists(args.results_root):
+        os.makedirs(args.results_root)
+
+    if args.stub is None:
+        render = BlenderTask(args.blender, args.results_root)
+    else:
+        render = StubTask(args.results_root, args.stub)
+
+    tasks = make_tasks(parse_range(args.scenes), args.view_num, args.views_per_task)
+    checkpoint = Checkpoint(os.path.join(args.results_root, CHECKPOINT))
+    failed = run_farm(tasks, render, checkpoint, args.num_workers, args.view_num)
+    if failed:
+        sys.exit(1)
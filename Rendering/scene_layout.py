@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""Layout of the table top scenes built by BlenderRenderer.loadModels.
+
+The first model is the table. Chairs and sofas stand on the ground around
+it, and every other model stands on the table top. The math here works on
+plain float32 arrays of vertices, one (N, 3) array per model with y up, so
+it runs without Blender. BlenderRenderer reads the vertices of all meshes
+with foreach_get, calls layout_models once and writes them back with
+foreach_set.
+"""
+
+import numpy as np
+
+# classes standing on the ground next to the table
+GROUND_CLASSES = ('chair', 'sofa')
+# distance of the ground models from the table
+GROUND_OFFSET = 0.5
+# margin between the table top models and the table edges
+TABLE_MARGIN = 0.02
+# the whole scene is moved down by this much
+DROP = 0.2
+# maximum number of sampled locations per model
+MAX_TRIALS = 1000
+
+def rotation_y(theta):
+    """Rotation matrix about the y axis."""
+    c, s = np.cos(theta), np.sin(theta)
+    return np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]], dtype=np.float32)
+
+
+def sample_thetas(num):
+    """Random rotation angles in [-pi, pi), 0 for the table."""
+    thetas = np.zeros((num,), dtype=np.float32)
+    thetas[1:] = (2 * np.random.rand(num - 1) - 1) * np.pi
+    return thetas
+
+
+def _overlaps(box, boxes):
+    """Whether the (x1, z1, x2, z2) box intersects any of boxes."""
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=bool)
+    w = np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])
+    h = np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])
+    return (w > 0) & (h > 0)
+
+
+def sample_locations(lims, classes):
+    """Sample the (x, z) location of every model but the table.
+
+    lims is a (num, 3, 2) array with the [min, max] of x, y and z of every
+    model. Returns the locations and whether all models were placed.
+    """
+    num = len(classes)
+    sizes = lims[:, [0, 2], 1] - lims[:, [0, 2], 0]
+    table = lims[0, [0, 2], :]
+    locations = np.zeros((num, 2), dtype=np.float32)
+    boxes = np.zeros((num, 4), dtype=np.float32)
+    # the ground models are kept clear of the table footprint around the origin
+    boxes[0] = -sizes[0, 0] / 2, -sizes[0, 1] / 2, sizes[0, 0] / 2, sizes[0, 1] / 2
+
+    for i in range(1, num):
+        table_top = classes[i] not in GROUND_CLASSES
+        placed = False
+        for count in range(MAX_TRIALS):
+            x, z = table[:, 0] + np.random.rand(2) * (table[:, 1] - table[:, 0])
+            if table_top:
+                x1, z1 = x - sizes[i, 0] / 2, z - sizes[i, 1] / 2
+                x2, z2 = x + sizes[i, 0] / 2, z + sizes[i, 1] / 2
+                # the model has to be inside the table
+                if not (x2 < table[0, 1] - TABLE_MARGIN and x1 > table[0, 0] + TABLE_MARGIN and
+                        z2 < table[1, 1] - TABLE_MARGIN and z1 > table[1, 0] + TABLE_MARGIN):
+                    continue
+                others = boxes[1:i]
+            else:
+                # one ground model on each side of the table
+                if i == 1:
+                    x = table[0, 0] - GROUND_OFFSET
+                elif i == 2:
+                    x = table[0, 1] + GROUND_OFFSET
+                elif i == 3:
+                    z = table[1, 0] - GROUND_OFFSET
+                elif i == 4:
+                    z = table[1, 1] + GROUND_OFFSET
+                others = boxes[:i]
+            box = np.array([x - sizes[i, 0] / 2, z - sizes[i, 1] / 2,
+                            x + sizes[i, 0] / 2, z + sizes[i, 1] / 2], dtype=np.float32)
+
+            collisions = np.nonzero(_overlaps(box, others))[0]
+            if len(collisions) > 0:
+                for j in collisions:
+                    print('object {:d} collision with object {:d}'.format(i, j + (1 if table_top else 0)))
+                continue
+            placed = True
+            break
+
+        if not placed:
+            print('Fail: cannot find location for object %d' % i)
+            return locations, False
+        print('Sampled location for object %d' % i)
+        locations[i] = x, z
+        boxes[i] = box
+    return locations, True
+
+
+def layout_models(vertices, classes, scales, thetas=None):
+    """Place the models of a scene.
+
+    vertices is a list with the (N, 3) float32 vertices of every model, the
+    table first. The models are rotated by thetas about the y axis, scaled,
+    stood on the ground or on the table, moved down by DROP and moved to
+    sampled locations. If no valid location is found for some model the
+    models are not moved in x and z.
+
+    Returns the new list of vertices and whether all models were placed.
+    """
+    num = len(vertices)
+    if thetas is None:
+        thetas = sample_thetas(num)
+    scales = np.asarray(scales, dtype=np.float32)
+
+    # the y axis is fixed by the rotation, so the height bounds of the
+    # scaled models are those of the scaled input
+    height_min = np.array([v[:, 1].min() for v in vertices], dtype=np.float32) * scales
+    height_max = np.array([v[:, 1].max() for v in vertices], dtype=np.float32) * scales
+
+    # per model translation in y
+    shift = np.full((num,), -DROP, dtype=np.float32)
+    for i in range(num):
+        if classes[i] in GROUND_CLASSES:
+            shift[i] += height_min[0] - height_min[i]
+        elif classes[i] != 'table':
+            shift[i] += height_max[0] - height_min[i]
+
+    # rotate and scale with one matrix per model
+    result = []
+    for i in range(num):
+        M = scales[i] * rotation_y(thetas[i])
+        v = np.dot(vertices[i], M.T)
+        v[:, 1] += shift[i]
+        result.append(v)
+
+    lims = np.array([[v.min(axis=0), v.max(axis=0)] for v in result]).transpose((0, 2, 1))
+    locations, success = sample_locations(lims, classes)
+    if success:
+        for i in range(1, num):
+            result[i][:, 0] += locations[i, 0]
+            result[i][:, 2] += locations[i, 1]
+    return result, success
+
+
+def ground_plane(vertices, factor=3):
+    """Corners of the ground plane under the models, factor times their extent."""
+    V = np.concatenate(vertices)
+    x1, x2 = factor * V[:, 0].min(), factor * V[:, 0].max()
+    z1, z2 = factor * V[:, 2].min(), factor * V[:, 2].max()
+    y = V[:, 1].min()
+    return [(x1, z1, y), (x2, z1, y), (x2, z2, y), (x1, z2, y)]
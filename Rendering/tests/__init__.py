@@ -0,0 +1,4 @@
+"""Tests of the renderers that run without Blender. Run from Rendering with
+
+    python -m unittest discover -s tests -t .
+"""
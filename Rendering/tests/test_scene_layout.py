@@ -0,0 +1,85 @@
+import math
+import unittest
+import numpy as np
+import scene_layout
+
+def _box(size, num=200):
+    """The corners and random vertices of a box of the given (x, y, z) size, standing on y = 0."""
+    corners = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=np.float64)
+    v = (np.vstack((corners, np.random.rand(num, 3))) - 0.5) * np.array(size)
+    v[:, 1] += size[1] / 2.0
+    return v.astype(np.float32)
+
+
+def _old_transforms(vertices, classes, scales, thetas):
+    """The per-vertex transforms of the former BlenderRenderer.loadModels,
+    before the locations are sampled."""
+    num = len(vertices)
+    height_max = np.array([max(scales[i] * co[1] for co in vertices[i]) for i in range(num)], dtype=np.float32)
+    height_min = np.array([min(scales[i] * co[1] for co in vertices[i]) for i in range(num)], dtype=np.float32)
+    result = []
+    for i in range(num):
+        theta = thetas[i]
+        R = np.array([[math.cos(theta), 0, math.sin(theta)], [0, 1, 0], [-math.sin(theta), 0, math.cos(theta)]])
+        placed = []
+        for co in vertices[i]:
+            co = np.dot(R, np.array(co).reshape((3, 1))).ravel() * scales[i]
+            if classes[i] == 'chair' or classes[i] == 'sofa':
+                co[1] += height_min[0] - height_min[i]
+            elif classes[i] != 'table':
+                co[1] += height_max[0] - height_min[i]
+            co[1] -= 0.2
+            placed.append(co)
+        result.append(np.array(placed, dtype=np.float32))
+    return result
+
+
+class SceneLayoutTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+        self.classes = ['table', 'chair', 'mug', 'bowl', 'cracker_box']
+        self.scales = [1.0, 0.9, 0.5, 0.6, 0.4]
+        self.vertices = [_box((1.6, 0.7, 1.0)), _box((0.5, 0.9, 0.5)),
+                         _box((0.1, 0.1, 0.1)), _box((0.15, 0.05, 0.15)), _box((0.2, 0.3, 0.1))]
+
+    def test_matches_the_per_vertex_transforms(self):
+        thetas = scene_layout.sample_thetas(len(self.vertices))
+        placed, success = scene_layout.layout_models(self.vertices, self.classes, self.scales, thetas)
+        self.assertTrue(success)
+        expected = _old_transforms(self.vertices, self.classes, self.scales, thetas)
+        np.testing.assert_allclose(placed[0], expected[0], atol=1e-6)
+        for i in range(1, len(placed)):
+            # the models only differ by their sampled location in x and z
+            offset = placed[i] - expected[i]
+            np.testing.assert_allclose(offset, np.tile(offset[0], (len(offset), 1)), atol=1e-5)
+            self.assertAlmostEqual(offset[0, 1], 0, places=5)
+
+    def test_table_top_models_are_on_the_table(self):
+        placed, success = scene_layout.layout_models(self.vertices, self.classes, self.scales)
+        self.assertTrue(success)
+        table_min, table_max = placed[0].min(axis=0), placed[0].max(axis=0)
+        for i, cls in enumerate(self.classes):
+            model_min, model_max = placed[i].min(axis=0), placed[i].max(axis=0)
+            if cls in scene_layout.GROUND_CLASSES:
+                self.assertAlmostEqual(model_min[1], table_min[1], places=5)
+            elif cls != 'table':
+                self.assertAlmostEqual(model_min[1], table_max[1], places=5)
+                for axis in (0, 2):
+                    self.assertGreater(model_min[axis], table_min[axis] + scene_layout.TABLE_MARGIN)
+                    self.assertLess(model_max[axis], table_max[axis] - scene_layout.TABLE_MARGIN)
+        self.assertAlmostEqual(table_min[1], -scene_layout.DROP, places=5)
+
+    def test_ground_plane_corners(self):
+        placed, _ = scene_layout.layout_models(self.vertices, self.classes, self.scales)
+        corners = scene_layout.ground_plane(placed)
+        V = np.concatenate(placed)
+        x1, x2 = 3 * V[:, 0].min(), 3 * V[:, 0].max()
+        z1, z2 = 3 * V[:, 2].min(), 3 * V[:, 2].max()
+        y = V[:, 1].min()
+        # the loop of the face (0, 1, 2, 3) of loadModels
+        self.assertEqual(corners, [(x1, z1, y), (x2, z1, y), (x2, z2, y), (x1, z2, y)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+from zbuffer_renderer import Mesh, render
+
+def _rays(K, width, height):
+    """The (height, width, 3) rays Kinv * (x, y, 1) of the pixels."""
+    y, x = np.mgrid[:height, :width].astype(np.float64)
+    pixels = np.stack((x, y, np.ones_like(x)), axis=2)
+    return pixels.dot(np.linalg.inv(K).T)
+
+
+def _look_at(eye, forward):
+    """World to camera RT of a camera at eye looking along forward, z up in the world."""
+    forward = np.asarray(forward, dtype=np.float64)
+    forward /= np.linalg.norm(forward)
+    right = np.cross(forward, (0, 0, 1))
+    right /= np.linalg.norm(right)
+    down = np.cross(forward, right)
+    R = np.stack((right, down, forward))
+    return np.hstack((R, -R.dot(eye)[:, None]))
+
+
+class ZBufferRendererTest(unittest.TestCase):
+
+    def setUp(self):
+        self.width, self.height = 160, 120
+        self.K = np.array([[100.0, 0, 80], [0, 100, 60], [0, 0, 1]])
+        self.RT = np.hstack((np.eye(3), np.zeros((3, 1))))
+
+    def test_slanted_plane(self):
+        # the plane z = 2 + 0.3 x in front of the camera, covering the image
+        corners = np.array([[-3.0, -3, 0], [3, -3, 0], [3, 3, 0], [-3, 3, 0]])
+        corners[:, 2] = 2 + 0.3 * corners[:, 0]
+        mesh = Mesh(corners, [(0, 1, 2), (0, 2, 3)], 1)
+        depth, label, vertmap = render([mesh], self.K, self.RT, self.width, self.height)
+
+        rays = _rays(self.K, self.width, self.height)
+        t = 2 / (1 - 0.3 * rays[:, :, 0])
+        self.assertTrue((label == 1).all())
+        np.testing.assert_allclose(depth, t, rtol=1e-12)
+        np.testing.assert_allclose(vertmap, rays * t[:, :, None], rtol=1e-5, atol=1e-6)
+
+    def test_square_coverage(self):
+        # a square at z = 1 whose corners project to the pixels (10, 10) and (110, 110)
+        K = np.array([[100.0, 0, 0], [0, 100, 0], [0, 0, 1]])
+        corners = [[0.1, 0.1, 1], [1.1, 0.1, 1], [1.1, 1.1, 1], [0.1, 1.1, 1]]
+        mesh = Mesh(corners, [(0, 1, 2), (0, 2, 3)], 3)
+        depth, label, vertmap = render([mesh], K, self.RT, 128, 128)
+        self.assertTrue((label[10:111, 10:111] == 3).all())
+        self.assertEqual(int((label > 0).sum()), 101 * 101)
+        np.testing.assert_allclose(depth[10:111, 10:111], 1.0)
+
+    def test_near_plane_clipping(self):
+        # a 40m ground plane around a camera 0.5m above it looking 30 degrees down
+        eye = np.array([0, 0, 0.5])
+        angle = np.radians(30)
+        RT = _look_at(eye, (0, np.cos(angle), -np.sin(angle)))
+        corners = [[-20.0, -20, 0], [20, -20, 0], [20, 20, 0], [-20, 20, 0]]
+        mesh = Mesh(corners, [(0, 1, 2), (0, 2, 3)], 1)
+        depth, label, vertmap = render([mesh], self.K, RT, self.width, self.height)
+
+        # the rays in the world, with a camera depth of 1
+        rays = _rays(self.K, self.width, self.height).dot(RT[:, :3])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(rays[:, :, 2] < 0, -eye[2] / rays[:, :, 2], np.inf)
+            points = eye + rays * t[:, :, None]
+            extent = np.abs(points[:, :, :2]).max(axis=2)
+            inside = np.isfinite(t) & (extent < 19.9)
+            outside = ~np.isfinite(t) | (extent > 20.1)
+        self.assertGreater(inside.sum(), 0)
+        self.assertTrue((label[inside] == 1).all())
+        self.assertTrue((label[outside] == 0).all())
+        np.testing.assert_allclose(depth[inside], t[inside], rtol=1e-10)
+        np.testing.assert_allclose(vertmap[inside], points[inside], atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
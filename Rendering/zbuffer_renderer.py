@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+
+"""Headless z-buffer renderer for depth, label and vertmap ground truth.
+
+BlenderRenderer renders a full image with bpy.ops.render.render for every
+view and reads the depth back from the Viewer Node. For the ground truth
+used in training only geometry is needed, which this module rasterizes
+with NumPy on the CPU:
+    depth    uint16 camera z times FACTOR_DEPTH, 0 for background
+    label    uint8 class index of every pixel, 0 for background
+    vertmap  float32 (height, width, 3) coordinates of the visible surface
+             point in the frame of its model, as in the LOV meta data
+
+The camera is given by the intrinsic matrix K and the 3x4 world to camera
+matrix RT, as returned by BlenderRenderer.compute_intrinsic and
+compute_rotation_translation. Pixel (x, y) samples the ray through
+Kinv * (x, y, 1), which is the convention of the backprojection in the
+training code.
+
+Triangles are rasterized in chunks: every (triangle, pixel) pair in the
+bounding boxes of a chunk is tested with edge functions at once, depth and
+vertex coordinates are interpolated perspective-correct, and the nearest
+fragment of every pixel wins. Triangles crossing the near plane, as the
+large table and ground planes of the scenes do, are clipped against it.
+render_views() renders many views of one scene across a process pool.
+"""
+
+import os
+import time
+import sys
+import multiprocessing
+import numpy as np
+
+# the depth codecs are in the ISM library
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ISM', 'lib'))
+from utils.depth_io import write_depth
+
+FACTOR_DEPTH = 10000
+# maximum number of (triangle, pixel) pairs tested at once
+CHUNK_PAIRS = 1 << 22
+# barycentric tolerance of the inside test
+EDGE_EPS = 1e-9
+
+class Mesh(object):
+    """Triangles of one object with its class and model coordinates.
+
+    vertices are in world coordinates; model_vertices are the coordinates
+    written to the vertmap, the vertices themselves by default.
+    """
+
+    def __init__(self, vertices, faces, label, model_vertices=None):
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.faces = np.asarray(faces, dtype=np.int64)
+        self.label = label
+        if model_vertices is None:
+            model_vertices = self.vertices
+        self.model_vertices = np.asarray(model_vertices, dtype=np.float32)
+
+
+def load_obj(filename):
+    """Read the vertices and the triangulated faces of every object in an OBJ file.
+
+    Returns a list of (name, vertices, faces) with faces indexing into the
+    vertices of the object. Polygons are split into triangle fans.
+    """
+    vertices = []
+    objects = []
+    name = None
+    faces = []
+    with open(filename) as f:
+        for line in f:
+            if line.startswith('v '):
+                vertices.append([float(x) for x in line.split()[1:4]])
+            elif line.startswith('f '):
+                face = [int(x.split('/')[0]) for x in line.split()[1:]]
+                for i in range(1, len(face) - 1):
+                    faces.append((face[0], face[i], face[i + 1]))
+            elif line.startswith('o ') or line.startswith('g '):
+                if faces:
+                    objects.append((name, faces))
+                name = line.split(None, 1)[1].strip()
+                faces = []
+    if faces:
+        objects.append((name, faces))
+
+    vertices = np.array(vertices, dtype=np.float64)
+    result = []
+    for name, faces in objects:
+        faces = np.array(faces, dtype=np.int64)
+        # negative indices count from the last vertex read, positive ones are 1-based
+        faces = np.where(faces < 0, faces + len(vertices), faces - 1)
+        used, faces = np.unique(faces, return_inverse=True)
+        result.append((name, vertices[used], faces.reshape((-1, 3))))
+    return result
+
+
+def _clip_near(cam, model, near):
+    """Clip triangles crossing the plane z = near in front of the camera.
+
+    cam and model are (T, 3, 3) corner coordinates in the camera and model
+    frames. A triangle with one corner in front of the plane becomes one
+    triangle, one with two corners in front becomes two.
+    """
+    front = cam[:, :, 2] > near
+    count = front.sum(axis=1)
+    cams = []
+    models = []
+    for num_front in (1, 2):
+        sel = np.nonzero(count == num_front)[0]
+        if len(sel) == 0:
+            continue
+        # rotate the corners, keeping the winding, so that the one corner on
+        # its own side of the plane comes first
+        lone = np.argmax(front[sel] if num_front == 1 else ~front[sel], axis=1)
+        order = (lone[:, None] + np.arange(3)) % 3
+        c = cam[sel[:, None], order]
+        m = model[sel[:, None], order]
+
+        def cut(j):
+            # the point at z = near on the edge from corner 0 to corner j
+            t = ((near - c[:, 0, 2]) / (c[:, j, 2] - c[:, 0, 2]))[:, None]
+            return c[:, 0] + t * (c[:, j] - c[:, 0]), m[:, 0] + t * (m[:, j] - m[:, 0])
+
+        (c1, m1), (c2, m2) = cut(1), cut(2)
+        if num_front == 1:
+            cams.append(np.stack((c[:, 0], c1, c2), axis=1))
+            models.append(np.stack((m[:, 0], m1, m2), axis=1))
+        else:
+            # the quad of the corners 1, 2 and the two cuts
+            cams.append(np.stack((c[:, 1], c[:, 2], c2), axis=1))
+            cams.append(np.stack((c[:, 1], c2, c1), axis=1))
+            models.append(np.stack((m[:, 1], m[:, 2], m2), axis=1))
+            models.append(np.stack((m[:, 1], m2, m1), axis=1))
+    return np.concatenate(cams), np.concatenate(models).astype(np.float32)
+
+
+def render(meshes, K, RT, width, height, near=0.01):
+    """Render the depth in meters, the labels and the vertmap of one view."""
+    K = np.asarray(K, dtype=np.float64)
+    RT = np.asarray(RT, dtype=np.float64)
+    depth = np.full(height * width, np.inf)
+    label = np.zeros(height * width, dtype=np.uint8)
+    vertmap = np.zeros((height * width, 3), dtype=np.float32)
+
+    for mesh in meshes:
+        # project the vertices
+        cam = mesh.vertices.dot(RT[:, :3].T) + RT[:, 3]
+        z = cam[:, 2]
+        proj = cam.dot(K.T)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u = proj[:, 0] / z
+            v = proj[:, 1] / z
+
+        # triangles in front of the camera, and those crossing the near plane clipped against it
+        count = (z[mesh.faces] > near).sum(axis=1)
+        faces = mesh.faces[count == 3]
+        tri_z = z[faces]
+        tri_u = u[faces]
+        tri_v = v[faces]
+        tri_model = mesh.model_vertices[faces]
+        crossing = (count > 0) & (count < 3)
+        if crossing.any():
+            faces = mesh.faces[crossing]
+            clip_cam, clip_model = _clip_near(cam[faces], mesh.model_vertices[faces], near)
+            clip_proj = clip_cam.dot(K.T)
+            tri_z = np.concatenate((tri_z, clip_cam[:, :, 2]))
+            tri_u = np.concatenate((tri_u, clip_proj[:, :, 0] / clip_cam[:, :, 2]))
+            tri_v = np.concatenate((tri_v, clip_proj[:, :, 1] / clip_cam[:, :, 2]))
+            tri_model = np.concatenate((tri_model, clip_model))
+
+        # triangles that overlap the image
+        xmin = np.maximum(np.ceil(tri_u.min(axis=1)), 0).astype(np.int64)
+        xmax = np.minimum(np.floor(tri_u.max(axis=1)), width - 1).astype(np.int64)
+        ymin = np.maximum(np.ceil(tri_v.min(axis=1)), 0).astype(np.int64)
+        ymax = np.minimum(np.floor(tri_v.max(axis=1)), height - 1).astype(np.int64)
+        box_w = xmax - xmin + 1
+        box_h = ymax - ymin + 1
+        visible = (box_w > 0) & (box_h > 0)
+        tris = np.nonzero(visible)[0]
+        xmin, ymin, box_w, box_h = xmin[visible], ymin[visible], box_w[visible], box_h[visible]
+        area = box_w * box_h
+
+        # split the triangles into chunks of at most CHUNK_PAIRS pixels
+        ends = np.cumsum(area)
+        start = 0
+        while start < len(tris):
+            stop = max(np.searchsorted(ends, ends[start] - area[start] + CHUNK_PAIRS, side='right'), start + 1)
+            s = slice(start, stop)
+            _rasterize(mesh.label, tris[s], xmin[s], ymin[s], box_w[s], area[s],
+                       tri_u, tri_v, tri_z, tri_model, width, depth, label, vertmap)
+            start = stop
+
+    background = np.isinf(depth)
+    depth[background] = 0
+    vertmap[background] = 0
+    return depth.reshape((height, width)), label.reshape((height, width)), vertmap.reshape((height, width, 3))
+
+
+def _rasterize(mesh_label, tris, xmin, ymin, box_w, area, tri_u, tri_v, tri_z, tri_model, width,
+               depth, label, vertmap):
+    """Z-test the pixels in the bounding boxes of tris against the buffers."""
+    # one row per (triangle, pixel) pair
+    pair_tri = np.repeat(np.arange(len(tris)), area)
+    offset = np.arange(len(pair_tri)) - np.repeat(np.cumsum(area) - area, area)
+    px = xmin[pair_tri] + offset % box_w[pair_tri]
+    py = ymin[pair_tri] + offset // box_w[pair_tri]
+    t = tris[pair_tri]
+
+    # barycentric coordinates from the edge functions
+    u0, u1, u2 = tri_u[t, 0], tri_u[t, 1], tri_u[t, 2]
+    v0, v1, v2 = tri_v[t, 0], tri_v[t, 1], tri_v[t, 2]
+    det = (u1 - u0) * (v2 - v0) - (u2 - u0) * (v1 - v0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        l1 = ((px - u0) * (v2 - v0) - (u2 - u0) * (py - v0)) / det
+        l2 = ((u1 - u0) * (py - v0) - (px - u0) * (v1 - v0)) / det
+        l0 = 1 - l1 - l2
+        # the tolerance closes cracks along shared edges, the z-test picks one of the two fragments
+        inside = (l0 >= -EDGE_EPS) & (l1 >= -EDGE_EPS) & (l2 >= -EDGE_EPS) & (det != 0)
+    if not inside.any():
+        return
+    l0, l1, l2, t, pixel = l0[inside], l1[inside], l2[inside], t[inside], (py * width + px)[inside]
+
+    # perspective-correct depth
+    w0 = l0 / tri_z[t, 0]
+    w1 = l1 / tri_z[t, 1]
+    w2 = l2 / tri_z[t, 2]
+    z = 1 / (w0 + w1 + w2)
+
+    # nearest fragment of every pixel in this chunk, kept if it is nearer than the buffer
+    order = np.lexsort((z, pixel))
+    pixel, z = pixel[order], z[order]
+    first = np.ones(len(pixel), dtype=bool)
+    first[1:] = pixel[1:] != pixel[:-1]
+    nearer = first.copy()
+    nearer[first] = z[first] < depth[pixel[first]]
+    if not nearer.any():
+        return
+    sel = order[nearer]
+    pixel = pixel[nearer]
+
+    depth[pixel] = z[nearer]
+    label[pixel] = mesh_label
+    model = tri_model[t[sel]]
+    vertmap[pixel] = ((w0[sel, None] * model[:, 0] +
+                       w1[sel, None] * model[:, 1] +
+                       w2[sel, None] * model[:, 2]) * z[nearer, None]).astype(np.float32)
+
+
+def depth_to_uint16(depth):
+    """Depth in meters to the uint16 depth images, as BlenderRenderer.render."""
+    return np.minimum(depth * FACTOR_DEPTH, np.iinfo(np.uint16).max).astype(np.uint16)
+
+
+def save_view(dirname, i, K, RT, depth, label, vertmap):
+    """Write %04d_depth.png, %04d_label.png and %04d_meta.mat of view i."""
+    import png
+    import scipy.io
+
+    height, width = depth.shape
+    write_depth(os.path.join(dirname, '%04d_depth.png' % i), depth)
+    with open(os.path.join(dirname, '%04d_label.png' % i), 'wb') as f:
+        png.Writer(width, height, greyscale=True, alpha=False, bitdepth=8).write(f, label)
+
+    meta_data = {'projection_matrix': np.dot(K, RT),
+                 'rotation_translation_matrix': np.array(RT),
+                 'intrinsic_matrix': np.array(K),
+                 'viewport_size_x': width,
+                 'viewport_size_y': height,
+                 'factor_depth': FACTOR_DEPTH,
+                 'vertmap': vertmap}
+    scipy.io.savemat(os.path.join(dirname, '%04d_meta.mat' % i), meta_data, do_compression=True)
+
+
+# the meshes of the scene rendered by the pool workers, inherited by fork
+_pool_meshes = None
+
+def _render_view(args):
+    i, K, RT, width, height, dirname = args
+    depth, label, vertmap = render(_pool_meshes, K, RT, width, height)
+    depth = depth_to_uint16(depth)
+    if dirname is None:
+        return depth, label, vertmap
+    save_view(dirname, i, K, RT, depth, label, vertmap)
+
+
+def render_views(meshes, views, width, height, dirname=None, num_workers=None):
+    """Render every (K, RT) view of the meshes across a process pool.
+
+    With dirname the views are written there by the workers, as
+    %04d_depth.png, %04d_label.png and %04d_meta.mat. Otherwise a list of
+    (depth, label, vertmap) is returned with the depth in uint16.
+    """
+    global _pool_meshes
+    _pool_meshes = meshes
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    tasks = [(i, K, RT, width, height, dirname) for i, (K, RT) in enumerate(views)]
+
+    t = time.time()
+    if num_workers == 1:
+        results = [_render_view(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            results = pool.map(_render_view, tasks, chunksize=max(1, len(tasks) // (4 * num_workers)))
+        finally:
+            pool.close()
+            pool.join()
+    t = time.time() - t
+    print('{:d} workers: rendered {:d} views in {:.2f}s, {:.1f} views / s'.format(num_workers, len(tasks), t,
+                                                                              len(tasks) / t))
+    _pool_meshes = None
+    if dirname is None:
+        return results
+
+
+if __name__ == '__main__':
+    # a table top with spheres seen from a ring of cameras, 640x480
+    def box(center, size, label):
+        corners = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=np.float64) - 0.5
+        faces = [(0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5), (0, 4, 5), (0, 5, 1),
+                 (2, 3, 7), (2, 7, 6), (0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3)]
+        model = corners * size
+        return Mesh(model + center, faces, label, model)
+
+    def sphere(center, radius, label, n=64):
+        theta, phi = np.meshgrid(np.linspace(0, np.pi, n), np.linspace(0, 2 * np.pi, 2 * n))
+        model = radius * np.stack((np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)), axis=2).reshape((-1, 3))
+        i = np.arange(2 * n - 1)[:, None] * n + np.arange(n - 1)[None, :]
+        faces = np.concatenate((np.stack((i, i + 1, i + n + 1), axis=2).reshape((-1, 3)),
+                                np.stack((i, i + n + 1, i + n), axis=2).reshape((-1, 3))))
+        return Mesh(model + center, faces, label, model)
+
+    np.random.seed(0)
+    meshes = [box((0, 0, -0.02), (1.2, 0.8, 0.04), 1)]
+    for i in range(5):
+        meshes.append(sphere((np.random.uniform(-0.4, 0.4), np.random.uniform(-0.3, 0.3), 0.06), 0.06, i + 2))
+    print('{:d} triangles'.format(sum(len(m.faces) for m in meshes)))
+
+    width, height = 640, 480
+    K = np.array([[572.4, 0, 320], [0, 573.6, 240], [0, 0, 1]])
+    views = []
+    for azimuth in np.linspace(0, 2 * np.pi, 32, endpoint=False):
+        eye = 1.2 * np.array([np.cos(azimuth), np.sin(azimuth), 0.8])
+        forward = -eye / np.linalg.norm(eye)
+        right = np.cross(forward, (0, 0, 1))
+        right /= np.linalg.norm(right)
+        down = np.cross(forward, right)
+        R = np.stack((right, down, forward))
+        views.append((K, np.hstack((R, -R.dot(eye)[:, None]))))
+
+    for num_workers in sorted(set((1, multiprocessing.cpu_count()))):
+        results = render_views(meshes, views, width, height, num_workers=num_workers)
+    depth, label, vertmap = results[0]
+    print('view 0: {:d} labeled pixels, depth {:d} to {:d}'.format(int((label > 0).sum()),
+                                                                  int(depth[depth > 0].min()), int(depth.max())))